@@ -0,0 +1,360 @@
+"""扫描到PDF流程的性能基准测试
+
+从 Web-UI/resources 中的样例报告生成合成语料：每个样例按几种分辨率渲染，
+再分别旋转 0/90/180/270 度、加轻微倾斜和噪声，保存为扫描仪式的图像PDF（外加一张JPG），
+并保留原始的数字PDF。随后用以下流程分别处理整个语料：
+    scanreport-full     ScanReport "批量处理"（batch_process，先校正方向）
+    scanreport-simple   ScanReport "简单批量处理"（simple_batch_process）
+    localscan           localscan "开始处理"（process_files）
+统计每秒页数、各阶段每页耗时（rasterize/orient/ocr/match/assemble）、峰值内存和每页输出字节数，
+结果写入JSON，可用 --compare 与之前的结果比较：
+
+    python benchmark.py -o bench.json
+    python benchmark.py -o new.json --compare bench.json --cases scanreport-full --repeat 3
+
+语料按 --seed 生成，相同参数下每次完全相同；已生成的语料会被复用。
+每个流程在独立的子进程中运行，峰值内存互不影响；不使用识别缓存、作业日志和本机OCR服务。
+--repeat 大于1时在同一进程中重复处理，第一次包含加载模型的时间，每秒页数按之后各次的中位数计算。
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import platform
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+
+import numpy as np
+from PIL import Image
+
+# 样例报告所在的文件夹
+SAMPLE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "Web-UI", "resources")
+
+# localscan 所在的文件夹
+LOCALSCAN_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "localscan")
+
+# 语料的默认保存位置
+DEFAULT_CORPUS = os.path.join(tempfile.gettempdir(), "scanreport-benchmark")
+
+# 语料说明文件名（位于语料文件夹中）
+MANIFEST_FILE_NAME = "corpus.json"
+
+# 渲染样例时使用的分辨率
+DEFAULT_DPIS = (150, 200, 300)
+
+# 扫描件的旋转角度（PIL 逆时针）
+ROTATIONS = (0, 90, 180, 270)
+
+# 噪声的标准差（灰度级）
+NOISE_SIGMA = 12.0
+
+# 随机倾斜的最大角度
+MAX_SKEW = 1.0
+
+# 生成语料的默认随机种子
+DEFAULT_SEED = 20240601
+
+# 可以测试的处理流程
+CASES = ("scanreport-full", "scanreport-simple", "localscan")
+
+
+def add_noise(image, rng):
+    """给页面加轻微倾斜和高斯噪声，模拟扫描件"""
+    skew = rng.uniform(-MAX_SKEW, MAX_SKEW)
+    image = image.rotate(skew, resample=Image.BICUBIC, fillcolor=(255, 255, 255))
+    pixels = np.asarray(image, dtype=np.float32)
+    pixels += rng.normal(0.0, NOISE_SIGMA, pixels.shape)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+def build_corpus(folder, dpis=DEFAULT_DPIS, seed=DEFAULT_SEED, log=print):
+    """在 folder 中生成合成语料，返回语料说明 {"settings": ..., "files": [{"path", "pages", "kind"}, ...]}
+
+    folder 中已有相同设置生成的语料时直接复用。
+    """
+    import fitz  # PyMuPDF
+    from render import render_page, pixmap_to_image
+    from pdf_writer import StreamingPdfWriter
+
+    samples = sorted(name for name in os.listdir(SAMPLE_FOLDER) if name.lower().endswith(".pdf"))
+    digest = hashlib.blake2b(digest_size=8)
+    for name in samples:
+        with open(os.path.join(SAMPLE_FOLDER, name), 'rb') as f:
+            digest.update(f.read())
+    settings = dict(samples=samples, samples_hash=digest.hexdigest(), dpis=list(dpis), seed=seed,
+                    rotations=list(ROTATIONS), noise_sigma=NOISE_SIGMA, max_skew=MAX_SKEW)
+
+    manifest_path = os.path.join(folder, MANIFEST_FILE_NAME)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get("settings") == settings and all(
+                os.path.exists(os.path.join(folder, item["path"])) for item in manifest["files"]):
+            log(f"复用已有语料: {folder}")
+            return manifest
+    shutil.rmtree(folder, ignore_errors=True)
+    os.makedirs(folder)
+
+    rng = np.random.default_rng(seed)
+    files = []
+    for name in samples:
+        base_name = os.path.splitext(name)[0]
+        # 原始的数字PDF
+        shutil.copyfile(os.path.join(SAMPLE_FOLDER, name), os.path.join(folder, name))
+        with fitz.open(os.path.join(folder, name)) as doc:
+            files.append(dict(path=name, pages=doc.page_count, kind="digital"))
+            for dpi in dpis:
+                pages = [pixmap_to_image(render_page(page, dpi)).convert('RGB') for page in doc]
+                for angle in ROTATIONS:
+                    file_name = f"{base_name}_{dpi}dpi_rot{angle}.pdf"
+                    writer = StreamingPdfWriter(os.path.join(folder, file_name))
+                    for page in pages:
+                        writer.add_image(add_noise(page.rotate(angle, expand=True), rng), dpi)
+                    writer.close()
+                    files.append(dict(path=file_name, pages=len(pages), kind="scan"))
+                # 拍照/扫描为图片的单页
+                file_name = f"{base_name}_{dpi}dpi.jpg"
+                add_noise(pages[0], rng).save(os.path.join(folder, file_name), quality=85, dpi=(dpi, dpi))
+                files.append(dict(path=file_name, pages=1, kind="image"))
+        log(f"已生成样例 {name} 的语料")
+
+    manifest = dict(settings=settings, files=files)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def peak_rss():
+    """返回 (本进程峰值内存, 已结束子进程中最大的峰值内存)，单位MB，无法获取时为 None"""
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        # Linux 以KB为单位，macOS 以字节为单位
+        scale = 1 if sys.platform == "darwin" else 1024
+        own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+        return round(own / 2 ** 20, 1), round(children / 2 ** 20, 1) if children else None
+    try:
+        import psutil
+    except ImportError:
+        return None, None
+    info = psutil.Process().memory_info()
+    # Windows 提供峰值工作集，其他平台只有当前值
+    return round(getattr(info, "peak_wset", info.rss) / 2 ** 20, 1), None
+
+
+def output_stats(folder):
+    """统计导出文件夹中PDF的 (文件数, 页数, 字节数)"""
+    import fitz  # PyMuPDF
+
+    files = pages = size = 0
+    for root, _, names in os.walk(folder):
+        for name in names:
+            if not name.lower().endswith(".pdf"):
+                continue
+            path = os.path.join(root, name)
+            files += 1
+            size += os.path.getsize(path)
+            with fitz.open(path) as doc:
+                pages += doc.page_count
+    return files, pages, size
+
+
+def run_case(case, files, workers, dpi, repeat):
+    """在当前进程中运行一个流程 repeat 次，返回测试结果"""
+    elapsed = []
+    stats = None
+    outputs = (0, 0, 0)
+    export_folder = tempfile.mkdtemp(prefix="scanreport-benchmark-")
+    try:
+        if case.startswith("scanreport"):
+            from engine import ReportEngine
+
+            engine = ReportEngine()
+            try:
+                for _ in range(repeat):
+                    shutil.rmtree(export_folder, ignore_errors=True)
+                    start = time.perf_counter()
+                    engine.run(files, export_folder, mode=case.split("-")[1], workers=workers, dpi=dpi,
+                               use_cache=False, resume=False, append=False)
+                    elapsed.append(time.perf_counter() - start)
+                    stats = engine.stats
+                    outputs = output_stats(export_folder)
+                # 等待识别进程退出，才能取得子进程的峰值内存
+                if engine.executor is not None:
+                    engine.executor.shutdown(wait=True)
+                    engine.executor = None
+            finally:
+                engine.close()
+        else:
+            sys.path.insert(0, LOCALSCAN_FOLDER)
+            from processor import BatchProcessor
+
+            processor = BatchProcessor()
+            processor.use_cache = False
+            try:
+                for _ in range(repeat):
+                    shutil.rmtree(export_folder, ignore_errors=True)
+                    os.makedirs(export_folder)
+                    start = time.perf_counter()
+                    processor.process(files, export_folder)
+                    elapsed.append(time.perf_counter() - start)
+                    stats = processor.stats
+                    outputs = output_stats(export_folder)
+            finally:
+                processor.close()
+    finally:
+        shutil.rmtree(export_folder, ignore_errors=True)
+
+    summary = stats.summary()
+    pages = summary["summary"]["pages"]
+    warm = sorted(elapsed[1:] or elapsed)
+    seconds = warm[len(warm) // 2]
+    own_rss, worker_rss = peak_rss()
+    output_files, output_pages, output_bytes = outputs
+    return dict(
+        case=case,
+        pages=pages,
+        elapsed_s=[round(value, 3) for value in elapsed],
+        pages_per_second=round(pages / seconds, 3) if seconds else None,
+        stages=summary["stages"],
+        counters=summary["counters"],
+        slowest_pages=summary["slowest_pages"],
+        peak_rss_mb=own_rss,
+        peak_worker_rss_mb=worker_rss,
+        output_files=output_files,
+        output_pages=output_pages,
+        output_bytes=output_bytes,
+        output_bytes_per_page=round(output_bytes / output_pages) if output_pages else None,
+    )
+
+
+def run_in_subprocess(case, args, files):
+    """在独立的子进程中运行一个流程，返回测试结果"""
+    result_path = os.path.join(tempfile.gettempdir(), f"scanreport-benchmark-{os.getpid()}-{case}.json")
+    command = [sys.executable, os.path.abspath(__file__), "--case", case, "--result", result_path,
+               "--workers", str(args.workers), "--dpi", str(args.dpi), "--repeat", str(args.repeat),
+               "--"] + files
+    env = dict(os.environ, SCANREPORT_OCR_SERVER="off")
+    try:
+        completed = subprocess.run(command, env=env)
+        if completed.returncode != 0:
+            raise RuntimeError(f"{case} 运行失败（退出码 {completed.returncode}）")
+        with open(result_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    finally:
+        if os.path.exists(result_path):
+            os.remove(result_path)
+
+
+def git_revision():
+    """返回当前代码的 git 提交，不在仓库中时返回 None"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    """与之前保存的结果比较每秒页数和各阶段中位耗时，返回比较说明的各行"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {run["case"]: run for run in json.load(f)["runs"]}
+    lines = [f"与 {baseline_path} 比较:"]
+    for run in results:
+        old = baseline.get(run["case"])
+        if old is None or not old["pages_per_second"] or not run["pages_per_second"]:
+            continue
+        change = run["pages_per_second"] / old["pages_per_second"] - 1
+        lines.append(f"  {run['case']}: {old['pages_per_second']} → {run['pages_per_second']} 页/秒 "
+                     f"({change:+.1%})")
+        for stage, stats in run["stages"].items():
+            old_stats = old["stages"].get(stage)
+            if old_stats and old_stats["p50_ms"]:
+                change = stats["p50_ms"] / old_stats["p50_ms"] - 1
+                lines.append(f"    {stage}: p50 {old_stats['p50_ms']} → {stats['p50_ms']} ms ({change:+.1%})")
+    return lines
+
+
+def parse_args(argv=None):
+    from pipeline import DEFAULT_WORKERS
+    from rasterize import DEFAULT_DPI
+
+    parser = argparse.ArgumentParser(description="扫描报告处理性能基准测试")
+    parser.add_argument("-o", "--output", help="结果JSON文件")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help=f"语料文件夹（默认 {DEFAULT_CORPUS}）")
+    parser.add_argument("--corpus-dpi", type=int, nargs="+", default=list(DEFAULT_DPIS),
+                        help="生成语料时渲染样例的分辨率")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="生成语料的随机种子")
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=list(CASES), help="要测试的处理流程")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"ScanReport 识别进程数（默认 {DEFAULT_WORKERS}）")
+    parser.add_argument("--dpi", type=int, default=DEFAULT_DPI, help=f"ScanReport 渲染分辨率（默认 {DEFAULT_DPI}）")
+    parser.add_argument("--repeat", type=int, default=1, help="每个流程重复处理的次数")
+    parser.add_argument("--compare", metavar="JSON", help="与之前保存的结果比较")
+    # 以下参数只在内部启动子进程时使用
+    parser.add_argument("--case", choices=CASES, help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    parser.add_argument("files", nargs="*", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if not args.case and not args.output:
+        parser.error("需要指定 -o 结果文件")
+    args.repeat = max(1, args.repeat)
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.case:
+        # 子进程：运行一个流程，把结果写入 --result
+        result = run_case(args.case, args.files, args.workers, args.dpi, args.repeat)
+        with open(args.result, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False)
+        return 0
+
+    manifest = build_corpus(args.corpus, args.corpus_dpi, args.seed)
+    files = [os.path.join(args.corpus, item["path"]) for item in manifest["files"]]
+    print(f"语料: {len(files)} 个文件，{sum(item['pages'] for item in manifest['files'])} 页")
+
+    results = []
+    for case in args.cases:
+        print(f"运行 {case} ...")
+        result = run_in_subprocess(case, args, files)
+        results.append(result)
+        print(f"  {result['pages']} 页，{result['pages_per_second']} 页/秒，"
+              f"峰值内存 {result['peak_rss_mb']} MB（识别进程 {result['peak_worker_rss_mb']} MB），"
+              f"每页输出 {result['output_bytes_per_page']} 字节")
+        for stage, stats in result["stages"].items():
+            print(f"    {stage}: p50 {stats['p50_ms']} ms, p95 {stats['p95_ms']} ms, 合计 {stats['total_s']} s")
+
+    report = dict(
+        created=time.strftime("%Y-%m-%d %H:%M:%S"),
+        revision=git_revision(),
+        python=platform.python_version(),
+        platform=platform.platform(),
+        cpu_count=os.cpu_count(),
+        options=dict(workers=args.workers, dpi=args.dpi, repeat=args.repeat),
+        corpus=dict(manifest["settings"], files=len(files),
+                    pages=sum(item["pages"] for item in manifest["files"])),
+        runs=results,
+    )
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到: {args.output}")
+
+    if args.compare:
+        print("\n".join(compare(results, args.compare)))
+    return 0
+
+
+if __name__ == "__main__":
+    # 打包后的程序启动识别进程需要
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -42,6 +42,7 @@ def build_executable():
         "--include-package=tkinter",      # 包含tkinter
         "--include-package=paddleocr",    # 包含paddleocr
         "--include-package=pdf2image",    # 包含pdf2image
+        "--include-package=fitz",         # 包含PyMuPDF
         "--include-package=PyPDF2",       # 包含PyPDF2
         "--include-package=PIL",          # 包含PIL (Pillow)
         "--include-data-dir=" + os.path.join(current_dir, "README.md") + "=.",  # 包含README文件
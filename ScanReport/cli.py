@@ -0,0 +1,157 @@
+"""扫描报告处理工具 - 命令行入口
+
+不加载图形界面，适合在服务器或计划任务中批量处理：
+
+    python cli.py -o 导出文件夹 "扫描件/*.pdf" 图片目录
+    python cli.py -o 导出文件夹 --watch 扫描仪共享文件夹
+
+--watch 时持续监视文件夹，新文件写入完成后立即处理（见 watcher.py），按 Ctrl+C 结束。
+
+处理进度以 JSON Lines 格式逐行输出到标准输出，每行一个事件：
+    {"event": "log", "message": ...}
+    {"event": "status", "message": ...}
+    {"event": "progress", "percent": ...}
+    {"event": "done", "reports": {"limis": [...], "association": [...], "other": [...]}}
+    {"event": "error", "message": ...}
+全部成功时退出码为0，出错时为1，被中断（Ctrl+C）时为130。
+"""
+import os
+import sys
+import json
+import glob
+import signal
+import argparse
+import threading
+import multiprocessing
+
+from engine import ReportEngine, ProcessingStopped, SUPPORTED_EXTENSIONS
+from watcher import HotFolderWatcher, POLL_INTERVAL, SETTLE_TIME
+from pipeline import DEFAULT_WORKERS, DEFAULT_BATCH_PAGES
+from rasterize import DEFAULT_DPI
+from instrument import PROFILE_MODES
+
+
+def emit(event, **fields):
+    """向标准输出写入一个JSON事件"""
+    sys.stdout.write(json.dumps(dict(event=event, **fields), ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+
+def expand_inputs(patterns):
+    """展开通配符和文件夹，返回按出现顺序去重后的支持文件列表"""
+    files = []
+    seen = set()
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) or [pattern]
+        for path in matches:
+            if os.path.isdir(path):
+                candidates = [os.path.join(path, name) for name in sorted(os.listdir(path))]
+            else:
+                candidates = [path]
+            for candidate in candidates:
+                if not os.path.isfile(candidate):
+                    continue
+                if os.path.splitext(candidate)[1].lower() not in SUPPORTED_EXTENSIONS:
+                    continue
+                key = os.path.abspath(candidate)
+                if key not in seen:
+                    seen.add(key)
+                    files.append(candidate)
+    return files
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="扫描报告处理工具（命令行）")
+    parser.add_argument("inputs", nargs="*", help="输入文件、文件夹或通配符（支持 **）")
+    parser.add_argument("-o", "--output", required=True, help="导出文件夹")
+    parser.add_argument("--watch", metavar="FOLDER", help="持续监视该文件夹并处理新到达的文件")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL,
+                        help=f"监视时扫描文件夹的间隔秒数（默认 {POLL_INTERVAL}）")
+    parser.add_argument("--settle-time", type=float, default=SETTLE_TIME,
+                        help=f"文件保持不变多少秒后视为写入完成（默认 {SETTLE_TIME}）")
+    parser.add_argument("--mode", choices=("full", "simple"), default="full",
+                        help="full: 先校正方向再识别（默认）；simple: 只使用OCR内置方向分类器")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"识别进程数（默认 {DEFAULT_WORKERS}）")
+    parser.add_argument("--batch-pages", type=int, default=DEFAULT_BATCH_PAGES,
+                        help=f"每批一起识别的页数（默认 {DEFAULT_BATCH_PAGES}）")
+    parser.add_argument("--dpi", type=int, default=DEFAULT_DPI, help=f"PDF渲染分辨率（默认 {DEFAULT_DPI}）")
+    parser.add_argument("--no-cache", action="store_true", help="不使用识别缓存")
+    parser.add_argument("--no-roi", action="store_true", help="不优先识别页眉区域")
+    parser.add_argument("--no-resume", action="store_true", help="不记录作业日志，也不从上次中断处恢复")
+    parser.add_argument("--no-early-exit", action="store_true", help="找到报告编号后仍识别整页")
+    parser.add_argument("--no-append", action="store_true", help="覆盖已有的报告PDF，而不是追加新页面")
+    parser.add_argument("--no-adaptive-dpi", action="store_true",
+                        help="PDF整页按 --dpi 渲染，不再低分辨率检测、按文本行区域渲染识别")
+    parser.add_argument("--no-text-layer", action="store_true", help="PDF带文本层时也进行OCR")
+    parser.add_argument("--segment", action="store_true",
+                        help="分段模式：未匹配到报告编号的页面归入同一文件中前面最近的报告，版式相似的续页只识别页眉")
+    parser.add_argument("--profile", choices=PROFILE_MODES,
+                        help="性能分析：cprofile 写入 .pstats，sample 按 py-spy 折叠栈格式采样（结果在导出文件夹中）")
+    args = parser.parse_args(argv)
+    if not args.inputs and not args.watch:
+        parser.error("需要指定输入文件或 --watch 文件夹")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    files = expand_inputs(args.inputs)
+    if not files and not args.watch:
+        emit("error", message="没有找到可处理的文件")
+        return 1
+
+    # Ctrl+C 时让流水线正常停止并删除未完成的PDF
+    stop_event = threading.Event()
+    signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+
+    engine = ReportEngine(
+        log=lambda message: emit("log", message=message),
+        status=lambda message: emit("status", message=message),
+        progress=lambda percent: emit("progress", percent=round(percent, 1)),
+        should_stop=stop_event.is_set,
+    )
+    run_options = dict(
+        mode=args.mode,
+        workers=args.workers,
+        dpi=args.dpi,
+        use_cache=not args.no_cache,
+        use_roi=not args.no_roi,
+        early_exit=not args.no_early_exit,
+        batch_pages=args.batch_pages,
+        resume=not args.no_resume,
+        append=not args.no_append,
+        adaptive_dpi=not args.no_adaptive_dpi,
+        use_text_layer=not args.no_text_layer,
+        profile=args.profile,
+        segment=args.segment,
+    )
+    try:
+        if args.watch:
+            if files:
+                engine.run(files, args.output, **run_options)
+            watcher = HotFolderWatcher(engine, args.watch, args.output, poll_interval=args.poll_interval,
+                                       settle_time=args.settle_time, should_stop=stop_event.is_set,
+                                       **run_options)
+            watcher.run()
+            emit("done", files=watcher.processed, failed=watcher.failed)
+            return 0
+        reports = engine.run(files, args.output, **run_options)
+    except ProcessingStopped as e:
+        emit("error", message=str(e))
+        return 130
+    except Exception as e:
+        emit("error", message=str(e))
+        return 1
+    finally:
+        engine.close()
+
+    emit("done", files=len(files), reports=reports)
+    return 0
+
+
+if __name__ == "__main__":
+    # 打包后的程序启动识别进程需要
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,621 @@
+"""报告处理引擎
+
+不依赖界面的批量处理入口：识别报告编号，按LIMIS/协会/其他分类并生成PDF。
+图形界面（main.py）和命令行（cli.py）都只是它的前端，
+通过 log / status / progress 回调接收处理进度，通过 should_stop 请求停止。
+"""
+import os
+
+from PIL import Image
+
+from orientation import detect_orientation, ORIENTATION_TIERS
+from pipeline import (BatchPipeline, DEFAULT_WORKERS, DEFAULT_BATCH_PAGES, OCR_OPTIONS, REPORT_CATEGORIES,
+                      create_ocr, create_executor)
+from rasterize import iter_pdf_pages, DEFAULT_DPI, MAX_PAGES_IN_MEMORY
+from render import iter_detect_pages, close_document, count_pages, DETECT_DPI
+from pdf_writer import StreamingPdfWriter
+from ocr_cache import OcrCache
+from roi import load_profiles
+from ocr_server import RemoteOCR, connect_ocr_server
+from journal import JobJournal
+from output_index import OutputIndex, page_hash, stream_hash, objects_hash
+from instrument import RunStats, CountingOCR
+from segment import DocumentSegmenter
+from report_numbers import load_matcher
+
+# 支持的输入文件扩展名
+SUPPORTED_EXTENSIONS = ('.pdf', '.png', '.jpg', '.jpeg')
+
+# 预计页数不超过该值的批次在本机OCR服务可用时通过服务识别，不启动加载模型的识别进程
+# （每个识别进程加载模型需要数秒，相当于服务识别十几页的时间；更大的批次多进程并行识别更快）
+SERVER_JOB_MAX_PAGES = 16
+
+# 各类型报告的输出文件夹
+OUTPUT_FOLDERS = {
+    "limis": "Limis",
+    "association": "协会",
+    "other": "其他",
+}
+
+
+class ProcessingStopped(Exception):
+    """处理被停止"""
+
+    def __init__(self):
+        super().__init__("处理已停止")
+
+
+class ReportOutput:
+    """一个报告PDF在本次处理中的写入状态"""
+
+    def __init__(self, writer, file_type, known_pages, merge_into=None):
+        self.writer = writer
+        self.file_type = file_type
+        self.known_pages = known_pages    # 已写入的页面哈希（含之前批次的）
+        self.new_pages = []               # 本次写入的页面哈希
+        self.skipped = 0                  # 跳过的重复页数
+        self.merge_into = merge_into      # 已有PDF无法增量追加时，写完后合并到该文件
+
+
+def merge_into_existing(existing_path, new_path):
+    """把 new_path 的页面合并到 existing_path 末尾（整份重写，只用于无法增量追加的PDF）"""
+    from PyPDF2 import PdfReader, PdfWriter
+
+    merged = PdfWriter()
+    for path in (existing_path, new_path):
+        for pdf_page in PdfReader(path).pages:
+            merged.add_page(pdf_page)
+    part_path = existing_path + ".part"
+    with open(part_path, 'wb') as f:
+        merged.write(f)
+    os.replace(part_path, existing_path)
+    os.remove(new_path)
+
+
+class ReportEngine:
+    """批量处理扫描报告
+
+    OCR模型、识别进程池和识别缓存在多次 run() 之间复用，
+    连续处理多个文件时不会重复加载模型。
+    """
+
+    def __init__(self, log=None, status=None, progress=None, should_stop=None):
+        self.log = log or (lambda message: None)              # 日志回调
+        self.status = status or (lambda message: None)        # 当前状态回调
+        self.progress = progress or (lambda percent: None)    # 进度回调（0~100）
+        self.should_stop = should_stop or (lambda: False)     # 是否请求停止
+
+        # 主进程的OCR引擎只用于方向检测，识别在工作进程中进行
+        self.ocr = None
+
+        # 识别进程池（第一次使用时创建，进程数变化时重建）
+        self.executor = None
+        self.executor_key = None
+
+        # OCR结果缓存（第一次使用时打开）
+        self.ocr_cache = None
+
+        # 最近一次 run() 的各阶段耗时和计数器（instrument.RunStats）
+        self.stats = RunStats()
+
+        # 报告编号匹配器（每次 run() 时按注册表重新创建，见 report_numbers.py）
+        self.matcher = load_matcher(REPORT_CATEGORIES)
+
+    def get_ocr_cache(self):
+        """打开OCR结果缓存，缓存不可用时返回 None"""
+        if self.ocr_cache is None:
+            try:
+                self.ocr_cache = OcrCache(settings=OCR_OPTIONS)
+            except Exception as e:
+                self.log(f"无法打开OCR缓存: {str(e)}")
+                return None
+        return self.ocr_cache
+
+    def get_executor(self, workers, use_server=False):
+        """返回已加载模型（use_server 时为连接OCR服务）的识别进程池"""
+        key = (1 if use_server else max(1, int(workers)), use_server)
+        if self.executor is not None and self.executor_key != key:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        if self.executor is None:
+            self.executor = create_executor(key[0], use_server)
+            self.executor_key = key
+        return self.executor
+
+    def use_server(self, files):
+        """小批量且本机OCR服务可用时通过服务识别，返回是否使用服务
+
+        已有加载了模型的识别进程池（之前的批次创建）时继续使用进程池。
+        """
+        if self.executor is not None and not self.executor_key[1]:
+            return False
+        pages = sum(count_pages(path) if path.lower().endswith('.pdf') else 1 for path in files)
+        if pages > SERVER_JOB_MAX_PAGES:
+            return False
+        if isinstance(self.ocr, RemoteOCR):
+            return True
+        remote = connect_ocr_server(OCR_OPTIONS)
+        if remote is None:
+            return False
+        remote.close()
+        return True
+
+    def close(self):
+        """关闭识别进程池并释放识别缓存"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        if self.ocr_cache is not None:
+            self.ocr_cache.close()
+            self.ocr_cache = None
+
+    def classify_text(self, text, fallback_name):
+        """按报告编号注册表中LIMIS/协会类型的格式匹配文本，返回 (新名称, 类型)"""
+        # 检查是否获取到文本
+        if not text.strip():
+            self.log(f"未能从图像中提取到文本，使用原文件名")
+            self.log(f"使用原文件名: {fallback_name}")
+            return fallback_name, "other"
+
+        # 所有格式一次扫描，按优先级取最佳匹配（LIMIS优先于协会）
+        match = self.matcher.search(text)
+        if match is not None:
+            if match.corrections:
+                self.log(f"匹配到{match.label}格式: {match.value}"
+                         f"（纠正 {match.corrections} 个易混字符，置信度 {match.confidence:.2f}）")
+            else:
+                self.log(f"匹配到{match.label}格式: {match.value}")
+            return match.value, match.category
+
+        # 如果没有匹配到，使用原文件名
+        self.log(f"未匹配到格式，使用原文件名: {fallback_name}")
+        return fallback_name, "other"
+
+    def run(self, files, export_folder, mode="full", workers=DEFAULT_WORKERS, dpi=DEFAULT_DPI,
+            use_cache=True, use_roi=True, early_exit=True, batch_pages=DEFAULT_BATCH_PAGES, resume=True,
+            append=True, adaptive_dpi=True, use_text_layer=True, profile=None, segment=False):
+        """处理一批文件，返回 {类型: [报告名称, ...]}
+
+        mode 为 "full" 时先在主进程中检测并校正方向，再交给识别进程；
+        为 "simple" 时只在识别时使用OCR内置方向分类器。
+        batch_pages 页的文本行合并成批交给识别模型。
+        resume 为 True 时在导出文件夹中记录作业日志（见 journal.py），每个文件处理完后即补全已打开的报告PDF，
+        用相同的输入和设置重新处理时跳过已完成的页面和已写入报告的页面，之后的页面追加到已生成的报告。
+        append 为 True 时，报告PDF已存在（之前的批次生成）则只在末尾追加新页面，
+        按输出索引（见 output_index.py）跳过已包含的重复页面；为 False 时覆盖已有文件。
+        adaptive_dpi 为 True 时PDF页面只以低分辨率渲染用于检测，识别时按 dpi 只渲染文本行区域，
+        输出时使用页面中的原始扫描图像（见 render.py）；为 False 时整页按 dpi 渲染。
+        use_text_layer 为 True 时带文本层的PDF页面（数字生成的报告）直接用文本层匹配报告编号，
+        不渲染也不OCR（只在 adaptive_dpi 时生效）。
+        segment 为 True 时（分段模式）匹配到报告编号的页面作为报告的开始，同一文件中其后未匹配到编号的页面
+        归入该报告；与上一页版式相似的页面只识别页眉和模板区域，不识别整页（见 segment.py）。
+        每页各阶段的耗时和计数器记录在 self.stats 中，结束时（包括出错和停止）在导出文件夹中写入运行报告；
+        profile 为 "cprofile" 或 "sample" 时同时写入性能分析结果（见 instrument.py）。
+        被停止时删除未完成的PDF并抛出 ProcessingStopped。
+        """
+        files = list(files)
+        # 正在写入的PDF {新名称: ReportOutput}
+        writers = {}
+        # 本次运行中已补全的报告，再次出现时追加写入
+        finished = set()
+        # 上一页的来源文件，用于在文件之间补全报告
+        last_source = None
+        # 各类型的报告名称，用于最终输出
+        reports = {file_type: [] for file_type in OUTPUT_FOLDERS}
+        listed = set()
+
+        def note_report(new_name, file_type):
+            if new_name not in listed:
+                listed.add(new_name)
+                reports[file_type].append(new_name)
+
+        def save_index():
+            try:
+                index.save()
+            except OSError as e:
+                self.log(f"无法保存输出索引: {str(e)}")
+
+        journal = None
+        index = None
+        stats = self.stats = RunStats(profile)
+        stats.start_profiling()
+        try:
+            self.matcher = load_matcher(REPORT_CATEGORIES)
+            index = OutputIndex(export_folder)
+            if resume:
+                journal = JobJournal(export_folder, files, dict(mode=mode, dpi=dpi, use_roi=use_roi,
+                                                                early_exit=early_exit, append=append,
+                                                                adaptive_dpi=adaptive_dpi,
+                                                                use_text_layer=use_text_layer,
+                                                                segment=segment))
+                if journal.resumed_pages:
+                    self.log(f"从作业日志恢复: {journal.resumed_pages} 页已完成，"
+                             f"{len(journal.reports)} 个报告已生成")
+
+            if mode == "full" and self.ocr is None:
+                self.log("初始化OCR引擎...")
+                self.ocr = create_ocr()
+                if isinstance(self.ocr, RemoteOCR):
+                    self.log(f"使用本机OCR服务: {self.ocr.address[0]}:{self.ocr.address[1]}")
+                self.log("OCR引擎初始化完成")
+
+            use_server = self.use_server(files)
+            if use_server:
+                self.log(f"小批量（不超过 {SERVER_JOB_MAX_PAGES} 页），通过本机OCR服务识别，识别进程不加载模型")
+                workers = 1
+
+            total_files = len(files)
+
+            def rasterize(file_path):
+                file_name = os.path.basename(file_path)
+                file_ext = os.path.splitext(file_name)[1].lower()
+
+                # 所有页面都已完成、所属报告都已生成的文件不必再光栅化
+                if journal is not None and journal.file_done(file_path):
+                    self.log(f"跳过已完成的文件: {file_name}")
+                    for record in journal.file_pages(file_path):
+                        note_report(record["report"], record["category"])
+                    return []
+
+                self.log(f"处理: {file_name}")
+                self.status(f"处理: {file_name}")
+
+                # 如果是PDF，逐页转为内存中的图像
+                if file_ext == '.pdf' and adaptive_dpi:
+                    pages = self.pdf_to_detect_pages(file_path, dpi, use_text_layer)
+                elif file_ext == '.pdf':
+                    pages = self.pdf_to_images(file_path, dpi)
+                # 如果是图片，直接解码后加入处理列表
+                elif file_ext in ['.png', '.jpg', '.jpeg']:
+                    base_name = os.path.splitext(file_name)[0]
+                    img = Image.open(file_path)
+                    img_dpi = img.info.get('dpi', (DEFAULT_DPI,))[0] or DEFAULT_DPI
+                    pages = [(base_name, img.convert('RGB'), img_dpi)]
+                else:
+                    return []
+                if journal is None:
+                    return pages
+                return journal_file(file_path, pages)
+
+            def journal_file(file_path, pages):
+                # 文件的所有页面都光栅化完成后记录页数
+                count = 0
+                for item in pages:
+                    count += 1
+                    yield item
+                if not self.should_stop():
+                    journal.record_file(file_path, count)
+
+            def resume_page(page):
+                record = journal.page(page.source, page.name)
+                if record is None:
+                    return None
+                return record["angle"], record["text"]
+
+            segmenter = DocumentSegmenter() if segment else None
+
+            def finish_reports():
+                # 补全已打开的报告PDF并记入作业日志和输出索引
+                for new_name in list(writers):
+                    self.finish_report(new_name, writers.pop(new_name), index, journal)
+                    finished.add(new_name)
+
+            def assemble(page):
+                nonlocal last_source
+                if journal is not None and page.source != last_source:
+                    # 上一个文件的页面都已写入：补全其报告，中断后不必重新生成
+                    if writers:
+                        finish_reports()
+                        save_index()
+                    last_source = page.source
+
+                if page.renderer is not None and page.renderer.text:
+                    self.log(f"使用PDF文本层: {page.name}")
+                elif page.header_only:
+                    self.log(f"续页检查（版式与上一页相似，只识别页眉）: {page.name}")
+                else:
+                    self.log(f"OCR识别: {page.name}")
+                self.status(f"OCR识别: {page.name}")
+
+                if page.roi is not None:
+                    self.log(f"在区域[{page.roi}]中识别到报告编号")
+
+                with stats.span("match", page.name):
+                    if page.error is not None:
+                        # OCR错误处理
+                        self.log(f"处理图片时出错: {page.error}")
+                        new_name, file_type = page.name, "other"
+                    else:
+                        new_name, file_type = self.classify_text(page.text, page.name)
+                    if segmenter is not None:
+                        new_name, file_type, attached = segmenter.assign(page, new_name, file_type)
+                        if attached:
+                            self.log(f"作为续页归入: {new_name}")
+                            stats.count("attached_pages")
+                with stats.span("assemble", page.name):
+                    write_page(page, new_name, file_type)
+
+                # 光栅化占前30%，识别和生成PDF占30%~95%
+                raster_progress = pipeline.files_done / total_files
+                ocr_progress = (pipeline.pages_done + 1) / max(pipeline.pages_produced, 1)
+                self.progress(raster_progress * 30 + raster_progress * ocr_progress * 65)
+
+            def write_page(page, new_name, file_type):
+                # 把页面写入所属报告的PDF（重复页面和已写入报告的页面跳过）
+                if journal is not None and journal.page_done(page.source, page.name):
+                    # 该页已在之前的运行中写入生成的报告
+                    note_report(new_name, file_type)
+                    page.image = None
+                # 每个报告编号第一次出现时创建（或打开已有的）对应PDF
+                else:
+                    if new_name not in writers:
+                        self.log(f"处理文件: {new_name} (类型: {file_type})")
+                        note_report(new_name, file_type)
+                        # 本次或之前的运行中已补全的报告追加写入，不能覆盖
+                        reopen = new_name in finished or (journal is not None and journal.report_done(new_name))
+                        writers[new_name] = self.open_report(export_folder, new_name, file_type,
+                                                             index if append or reopen else None)
+
+                    output = writers[new_name]
+                    if page.renderer is not None and page.renderer.text:
+                        # 带文本层的页面（数字生成的报告）原样复制，保留矢量内容和可搜索的文本
+                        page.copied = page.renderer.page_objects()
+                    elif page.renderer is not None:
+                        # 低分辨率页面只用于检测，输出时原样复制原始扫描图像，
+                        # 不能复制时解码原始扫描图像（或按输出分辨率渲染）
+                        page.native = page.renderer.native_output()
+                        if page.native is not None:
+                            page.image = None
+                        else:
+                            page.image, page.dpi = page.renderer.output_image(dpi)
+                    if page.copied is not None:
+                        digest = objects_hash(page.copied[0])
+                    elif page.native is not None:
+                        digest = stream_hash(page.native[0], page.native[2])
+                    else:
+                        digest = page_hash(page.image)
+                    if digest in output.known_pages:
+                        # 之前的批次或本批次中已经写入过的页面
+                        self.log(f"跳过重复页面: {page.name}")
+                        output.skipped += 1
+                        stats.count("duplicate_pages")
+                        page.image = page.native = page.copied = None
+                    else:
+                        output.known_pages.add(digest)
+                        output.new_pages.append(digest)
+                        # 将转正后的页面直接追加到PDF，随后释放像素
+                        self.images_to_pdf(page, output.writer)
+
+                if journal is not None:
+                    journal.record_page(page, new_name, file_type)
+
+            if mode == "full":
+                self.log("进行图像方向检测和矫正...")
+            else:
+                self.log("进行简单图像方向校正...")
+
+            # 本批次的缓存命中统计
+            cache = self.get_ocr_cache() if use_cache else None
+            if cache is not None:
+                cache.hits = cache.misses = 0
+
+            pipeline = BatchPipeline(
+                rasterize=rasterize,
+                orient=self.correct_image_orientation if mode == "full" else None,
+                assemble=assemble,
+                mode=mode,
+                workers=workers,
+                queue_size=MAX_PAGES_IN_MEMORY,
+                log=self.log,
+                should_stop=self.should_stop,
+                cache=cache,
+                roi_profiles=load_profiles() if use_roi else None,
+                early_exit=early_exit,
+                executor=self.get_executor(workers, use_server),
+                batch_pages=batch_pages,
+                resume=resume_page if journal is not None else None,
+                stats=stats,
+                segment=segment,
+                matcher=self.matcher,
+            )
+            pipeline.run(files)
+            if cache is not None and cache.hits:
+                self.log(f"OCR缓存命中 {cache.hits} 页")
+
+            if self.should_stop():
+                raise ProcessingStopped()
+
+            # 所有页面都已写入，补全各PDF的文件尾
+            finish_reports()
+        finally:
+            # 释放为输出打开的PDF句柄（监视模式下处理完的文件还要移走）
+            for file_path in files:
+                close_document(file_path)
+            # 删除未完成的PDF（增量追加的文件截断回原样）
+            for output in writers.values():
+                output.writer.abort()
+            if index is not None:
+                save_index()
+            if journal is not None:
+                journal.close()
+            self.write_run_report(export_folder)
+
+        self.progress(100)
+        self.status(f"处理完成! 文件已保存到: {export_folder}")
+        self.log(f"处理完成! 文件已保存到: {export_folder}")
+
+        # 显示文件夹及其中的文件列表
+        titles = {"limis": ("LIMIS文件", "Limis报告："),
+                  "association": ("协会文件", "协会报告："),
+                  "other": ("其他文件", "其他：")}
+        for file_type, names in reports.items():
+            if names:
+                folder_title, list_title = titles[file_type]
+                output_folder = os.path.join(export_folder, OUTPUT_FOLDERS[file_type])
+                self.log(f"{folder_title}: {output_folder} ({len(names)}个文件)")
+                self.log(list_title)
+                for file_name in sorted(names):
+                    self.log(file_name)
+
+        return reports
+
+    def write_run_report(self, export_folder):
+        """在导出文件夹中写入本次运行的报告，并在日志中列出各阶段耗时"""
+        stats = self.stats
+        try:
+            path = stats.write_report(export_folder)
+        except OSError as e:
+            self.log(f"无法保存运行报告: {str(e)}")
+            return
+        if stats.spans:
+            self.log(f"各阶段每页耗时: {stats.describe()}")
+        checks = stats.counters.get("orient_checks", 0)
+        if checks:
+            self.log("方向检测级别: " + "，".join(
+                f"{label} {stats.counters.get(f'orient_{tier}', 0)} 页"
+                f"（{stats.counters.get(f'orient_{tier}', 0) / checks:.0%}）"
+                for tier, label in ORIENTATION_TIERS.items()))
+        self.log(f"运行报告: {path}")
+
+    def open_report(self, export_folder, new_name, file_type, index=None):
+        """打开报告PDF的写入器
+
+        index 不为 None（追加模式）且PDF已存在时在原文件末尾增量追加，
+        否则新建（覆盖已有文件）。
+        """
+        # 只在实际有文件时创建输出目录
+        output_folder = os.path.join(export_folder, OUTPUT_FOLDERS[file_type])
+        os.makedirs(output_folder, exist_ok=True)
+        output_pdf_path = os.path.join(output_folder, f"{new_name}.pdf")
+
+        if index is None or not os.path.exists(output_pdf_path):
+            return ReportOutput(StreamingPdfWriter(output_pdf_path), file_type, set())
+
+        known_pages = index.pages(new_name, output_pdf_path)
+        try:
+            writer = StreamingPdfWriter(output_pdf_path, append=True)
+            self.log(f"追加到已有PDF: {output_pdf_path} (已有 {writer.existing_pages} 页)")
+            return ReportOutput(writer, file_type, known_pages)
+        except (OSError, ValueError) as e:
+            # 不是本程序生成的PDF，先写入新文件，完成后整份合并
+            self.log(f"无法增量追加 {output_pdf_path}: {str(e)}，将在完成后合并")
+            writer = StreamingPdfWriter(output_pdf_path + ".new")
+            return ReportOutput(writer, file_type, known_pages, merge_into=output_pdf_path)
+
+    def finish_report(self, new_name, output, index, journal):
+        """补全报告PDF的文件尾，并更新输出索引和作业日志"""
+        writer = output.writer
+        if output.skipped:
+            self.log(f"{new_name}: 跳过 {output.skipped} 个重复页面")
+        if writer.page_count == 0:
+            # 所有页面都已包含在已有PDF中
+            writer.abort()
+            self.log(f"没有新页面: {new_name}")
+            path = output.merge_into or writer.path
+        else:
+            writer.close()
+            path = writer.path
+            if output.merge_into is not None:
+                merge_into_existing(output.merge_into, writer.path)
+                path = output.merge_into
+                self.log(f"合并PDF: {path} (新增 {writer.page_count} 页)")
+            elif writer.append:
+                self.log(f"追加PDF: {path} (新增 {writer.page_count} 页，"
+                         f"共 {writer.existing_pages + writer.page_count} 页)")
+            else:
+                self.log(f"生成PDF: {path} (包含 {writer.page_count} 页)")
+        if index is not None:
+            index.update(new_name, output.file_type, path, output.new_pages,
+                         append=writer.append or output.merge_into is not None)
+        if journal is not None:
+            journal.record_report(new_name, output.file_type, path,
+                                  writer.existing_pages + writer.page_count)
+
+    def pdf_to_images(self, pdf_path, dpi=DEFAULT_DPI):
+        """将PDF文件逐页转换为内存中的图像，每转换完一页立即返回 (页面名称, 图像, DPI)"""
+        count = 0
+        try:
+            base_name = os.path.splitext(os.path.basename(pdf_path))[0]
+
+            for page_number, img in iter_pdf_pages(pdf_path, dpi=dpi, max_pages=MAX_PAGES_IN_MEMORY):
+                if self.should_stop():
+                    break
+
+                count += 1
+                yield f"{base_name}_page_{page_number}", img.convert('RGB'), dpi  # 确保图像是RGB模式
+
+            self.log(f"PDF转换为 {count} 张图片: {os.path.basename(pdf_path)}")
+        except Exception as e:
+            self.log(f"PDF转图片出错: {str(e)}")
+            raise
+
+    def pdf_to_detect_pages(self, pdf_path, dpi=DEFAULT_DPI, use_text_layer=True):
+        """将PDF文件逐页以检测分辨率渲染，每渲染完一页立即返回 (页面名称, 图像, DPI, ClipRenderer)
+
+        识别时文本行按 dpi 从PDF中重新渲染；use_text_layer 时带文本层的页面不渲染（图像为 None）。
+        """
+        count = 0
+        text_pages = 0
+        try:
+            base_name = os.path.splitext(os.path.basename(pdf_path))[0]
+            detect_dpi = min(DETECT_DPI, dpi)
+            for page_number, img, renderer in iter_detect_pages(pdf_path, detect_dpi, dpi, use_text_layer):
+                if self.should_stop():
+                    break
+
+                count += 1
+                if renderer.text:
+                    text_pages += 1
+                yield f"{base_name}_page_{page_number}", img, detect_dpi, renderer
+
+            self.log(f"PDF以 {detect_dpi} DPI 渲染 {count - text_pages} 页用于检测，"
+                     f"{text_pages} 页直接使用文本层: {os.path.basename(pdf_path)}")
+        except Exception as e:
+            self.log(f"PDF转图片出错: {str(e)}")
+            raise
+
+    def correct_image_orientation(self, page):
+        """在OCR前检测并校正页面方向（只在缩略图上检测，完整识别留给识别进程）"""
+        self.log(f"检测图像方向: {page.name}")
+        self.status(f"检测图像方向: {page.name}")
+        try:
+            # 获取原始图像尺寸
+            orig_width, orig_height = page.image.size
+            is_landscape = orig_width > orig_height
+            self.log(f"检测图像尺寸: {orig_width}x{orig_height}, {'横向' if is_landscape else '纵向'}")
+
+            ocr = CountingOCR(self.ocr)
+            try:
+                angle, tier, confidence = detect_orientation(ocr, page.image)
+            finally:
+                self.stats.count("ocr_calls", ocr.calls)
+                self.stats.count("orient_checks")
+            self.stats.count(f"orient_{tier}")
+            self.stats.note(page.name, orient_tier=tier, orient_angle=angle,
+                            orient_confidence=round(confidence, 3))
+            self.log(f"方向检测: {ORIENTATION_TIERS[tier]}，置信度 {confidence:.2f}")
+            if angle != 0:
+                self.stats.count("pages_rotated")
+                self.log(f"确定最佳旋转角度: {angle} 度")
+                page.rotate(angle)
+            else:
+                self.log("保持原始方向")
+
+        except Exception as e:
+            self.log(f"方向校正错误: {str(e)}")
+
+    def images_to_pdf(self, page, writer):
+        """将已转正的页面追加到PDF（原始扫描图像和带文本层的页面原样复制，方向写入页面的 /Rotate）"""
+        try:
+            if page.copied is not None:
+                writer.add_copied_page(page.source, *page.copied)
+            elif page.native is not None:
+                image, image_dpi, rotate = page.native
+                writer.add_encoded(image, image_dpi, rotate)
+            else:
+                writer.add_image(page.image, page.dpi)
+            # 页面写入后不再需要像素
+            page.image = page.native = page.copied = None
+        except Exception as e:
+            self.log(f"图片转PDF失败: {page.name}, 错误: {str(e)}")
+            raise
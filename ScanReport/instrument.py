@@ -0,0 +1,264 @@
+"""处理过程的计时、计数和性能分析
+
+RunStats 记录一次批处理中每页在各阶段的耗时（span）和计数器，处理结束后在导出文件夹中
+写入运行报告 RUN_REPORT_FILE_NAME：
+    {"summary": {"elapsed_s", "pages", "pages_per_second"},
+     "stages": {阶段: {"pages", "total_s", "mean_ms", "p50_ms", "p95_ms", "max_ms"}},
+     "counters": {名称: 数值},
+     "slowest_pages": [{"page", "total_ms", "stages": {阶段: 毫秒}}, ...],
+     "pages": {页面: {名称: 值}},                 （note() 记录的每页信息，如方向检测的级别）
+     "spans": [[阶段, 页面, 开始时间(秒), 耗时(毫秒)], ...]}
+可选的性能分析模式（profile）：
+    "cprofile"  用 cProfile 分析处理线程，结束后写入 PROFILE_FILE_NAME + ".pstats"
+                （用 python -m pstats 或 snakeviz 查看）；Python 3.12 起 cProfile 基于 sys.monitoring，
+                同一时间只能有一个分析器，由它覆盖所有线程，之前的版本每个线程各自分析后合并
+    "sample"    每隔 SAMPLE_INTERVAL 秒采样一次所有线程的调用栈，按 py-spy --format raw 的
+                折叠栈格式写入 PROFILE_FILE_NAME + ".txt"（可用 flamegraph.pl、speedscope 查看）
+两种模式都只分析本进程；识别进程可用 py-spy record --subprocesses 采样。
+ScanReport 和 localscan 共用本模块。
+"""
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import threading
+import contextlib
+import collections
+
+# 运行报告文件名（位于导出文件夹中）
+RUN_REPORT_FILE_NAME = ".scanreport_run.json"
+
+# 性能分析结果文件名（不含扩展名，位于导出文件夹中）
+PROFILE_FILE_NAME = ".scanreport_profile"
+
+# 支持的性能分析模式
+PROFILE_MODES = ("cprofile", "sample")
+
+# 采样模式的采样间隔（秒）
+SAMPLE_INTERVAL = 0.01
+
+# 运行报告中列出的最慢页数
+SLOWEST_PAGES = 10
+
+# cProfile 是否覆盖所有线程（Python 3.12 起基于 sys.monitoring）
+_PROCESS_WIDE_CPROFILE = sys.version_info >= (3, 12)
+
+# 报告中各阶段的顺序（其他阶段排在后面）
+STAGE_ORDER = ("rasterize", "orient", "ocr", "match", "assemble", "save")
+
+
+def percentile(values, percent):
+    """已排序列表的百分位数（最近秩）"""
+    if not values:
+        return 0.0
+    rank = max(1, -(-len(values) * percent // 100))
+    return values[int(rank) - 1]
+
+
+class CountingOCR:
+    """统计 ocr() 调用次数的OCR包装（PaddleOCR 和 RemoteOCR 都可以）"""
+
+    def __init__(self, ocr):
+        self._ocr = ocr
+        self.calls = 0
+        # 只有被包装的OCR支持一次提交多张图像（RemoteOCR）时才提供 ocr_batch()
+        if hasattr(ocr, "ocr_batch"):
+            self.ocr_batch = self._ocr_batch
+
+    def ocr(self, *args, **kwargs):
+        self.calls += 1
+        return self._ocr.ocr(*args, **kwargs)
+
+    def _ocr_batch(self, *args, **kwargs):
+        self.calls += 1
+        return self._ocr.ocr_batch(*args, **kwargs)
+
+
+class RunStats:
+    """一次批处理的各阶段耗时和计数器
+
+    span() / add() / count() / note() 可以在任意线程中调用。
+    profile 为 PROFILE_MODES 之一时启用性能分析：处理开始时调用 start_profiling()，
+    各处理线程通过 profiled() 运行，write_report() 时结束分析。
+    """
+
+    def __init__(self, profile=None):
+        if profile not in (None,) + PROFILE_MODES:
+            raise ValueError(f"不支持的性能分析模式: {profile}")
+        self.profile = profile
+        self.started = time.perf_counter()
+        self.finished = None
+        self.spans = []                               # [(阶段, 页面, 开始时间, 耗时), ...]
+        self.counters = collections.Counter()
+        self.notes = {}                               # {页面: {名称: 值}}
+        self._lock = threading.Lock()
+
+        # cProfile 模式下各线程的分析结果
+        self._profiles = []
+        # 采样模式下的折叠调用栈 {栈: 次数}
+        self._samples = collections.Counter()
+        self._sampler = None
+        self._sampling = threading.Event()
+
+    @contextlib.contextmanager
+    def span(self, stage, page=None):
+        """记录 with 块的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(stage, page, start, time.perf_counter() - start)
+
+    def add(self, stage, seconds, page=None):
+        """记录在别处（如识别进程中）测得的耗时，视为刚刚结束"""
+        self._record(stage, page, time.perf_counter() - seconds, seconds)
+
+    def _record(self, stage, page, start, seconds):
+        with self._lock:
+            self.spans.append((stage, page, start - self.started, seconds))
+
+    def count(self, name, value=1):
+        """累加计数器"""
+        if value:
+            with self._lock:
+                self.counters[name] += value
+
+    def note(self, page, **fields):
+        """记录某页的附加信息（写入报告的 pages 中）"""
+        with self._lock:
+            self.notes.setdefault(page, {}).update(fields)
+
+    def durations(self):
+        """各阶段每次记录的耗时 {阶段: [秒, ...]}"""
+        result = {}
+        with self._lock:
+            for stage, _, _, seconds in self.spans:
+                result.setdefault(stage, []).append(seconds)
+        return result
+
+    def stop(self):
+        """结束计时（写报告前调用）"""
+        if self.finished is None:
+            self.finished = time.perf_counter()
+        self._stop_profiling()
+
+    def summary(self, slowest=SLOWEST_PAGES):
+        """汇总各阶段耗时分布、计数器和最慢的页面"""
+        durations = self.durations()
+        order = [stage for stage in STAGE_ORDER if stage in durations]
+        order += sorted(stage for stage in durations if stage not in STAGE_ORDER)
+        stages = {}
+        for stage in order:
+            values = sorted(durations[stage])
+            stages[stage] = dict(
+                pages=len(values),
+                total_s=round(sum(values), 3),
+                mean_ms=round(sum(values) / len(values) * 1000, 2),
+                p50_ms=round(percentile(values, 50) * 1000, 2),
+                p95_ms=round(percentile(values, 95) * 1000, 2),
+                max_ms=round(values[-1] * 1000, 2),
+            )
+
+        pages = collections.defaultdict(dict)
+        with self._lock:
+            for stage, page, _, seconds in self.spans:
+                if page is not None:
+                    pages[page][stage] = pages[page].get(stage, 0.0) + seconds
+        slowest_pages = sorted(pages.items(), key=lambda item: sum(item[1].values()), reverse=True)[:slowest]
+
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        page_count = self.counters.get("pages", 0)
+        return dict(
+            summary=dict(elapsed_s=round(elapsed, 3), pages=page_count,
+                         pages_per_second=round(page_count / elapsed, 3) if elapsed else None),
+            stages=stages,
+            counters=dict(self.counters),
+            slowest_pages=[dict(page=page, total_ms=round(sum(times.values()) * 1000, 1),
+                                stages={stage: round(seconds * 1000, 1) for stage, seconds in times.items()})
+                           for page, times in slowest_pages],
+        )
+
+    def describe(self):
+        """各阶段耗时的简短说明（用于日志）"""
+        stages = self.summary(slowest=0)["stages"]
+        return "，".join(f"{stage} p50 {stats['p50_ms']:.0f}ms/p95 {stats['p95_ms']:.0f}ms"
+                        for stage, stats in stages.items())
+
+    def write_report(self, folder):
+        """在 folder 中写入运行报告（和性能分析结果），返回报告路径"""
+        self.stop()
+        report = self.summary()
+        with self._lock:
+            if self.notes:
+                report["pages"] = dict(self.notes)
+            report["spans"] = [[stage, page, round(start, 4), round(seconds * 1000, 2)]
+                               for stage, page, start, seconds in self.spans]
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, RUN_REPORT_FILE_NAME)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False)
+        self._write_profile(os.path.join(folder, PROFILE_FILE_NAME))
+        return path
+
+    def profiled(self, func):
+        """返回在 cProfile 模式下被分析的 func（每个线程一个 cProfile.Profile）"""
+        if self.profile != "cprofile" or _PROCESS_WIDE_CPROFILE:
+            return func
+
+        def wrapper(*args, **kwargs):
+            profile = cProfile.Profile()
+            try:
+                return profile.runcall(func, *args, **kwargs)
+            finally:
+                with self._lock:
+                    self._profiles.append(profile)
+        return wrapper
+
+    def start_profiling(self):
+        """开始性能分析：采样模式下启动采样线程，cProfile 覆盖所有线程时启用唯一的分析器"""
+        if self.profile == "sample" and self._sampler is None:
+            self._sampler = threading.Thread(target=self._sample_loop, daemon=True)
+            self._sampler.start()
+        elif self.profile == "cprofile" and _PROCESS_WIDE_CPROFILE and not self._profiles:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # 已有其他分析器（如外部的 python -m cProfile）在运行
+                return
+            self._profiles.append(profile)
+
+    def _stop_profiling(self):
+        if self._sampler is not None:
+            self._sampling.set()
+            self._sampler.join()
+            self._sampler = None
+        if self.profile == "cprofile" and _PROCESS_WIDE_CPROFILE:
+            for profile in self._profiles:
+                profile.disable()
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while not self._sampling.wait(SAMPLE_INTERVAL):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self._samples[";".join(reversed(stack))] += 1
+
+    def _write_profile(self, base_path):
+        if self.profile == "cprofile" and self._profiles:
+            stats = pstats.Stats(*self._profiles)
+            stats.dump_stats(base_path + ".pstats")
+        elif self.profile == "sample" and self._samples:
+            with open(base_path + ".txt", 'w', encoding='utf-8') as f:
+                for stack, count in self._samples.most_common():
+                    f.write(f"{stack} {count}\n")
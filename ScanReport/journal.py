@@ -0,0 +1,162 @@
+"""批处理作业日志
+
+在导出文件夹中以 JSON Lines 格式记录批处理进度，中断（出错、停止或程序崩溃）后
+用相同的输入重新处理时从日志恢复，已完成的页面不再做方向检测和OCR，
+已生成的报告PDF不再重新生成。记录类型：
+    {"type": "job", "key": ...}                                   作业标识（输入文件和处理设置）
+    {"type": "page", "file": ..., "name": ..., "angle": ..., "text": ..., "report": ..., "category": ...}
+    {"type": "file", "file": ..., "pages": ...}                    文件的所有页面都已光栅化
+    {"type": "report", "name": ..., "category": ..., "path": ..., "pages": ...}   报告PDF已生成
+报告PDF在每个文件处理完后就补全并记录，之后的文件中再出现同一报告时追加写入并再次记录，
+因此一页已写入报告的条件是它的页面记录在该报告最近一次的报告记录之前。
+"""
+import os
+import json
+import hashlib
+import logging
+import threading
+
+# 日志文件名（位于导出文件夹中）
+JOURNAL_FILE_NAME = ".scanreport_journal.jsonl"
+
+
+def job_key(files, settings):
+    """按输入文件（路径、大小、修改时间）和处理设置计算作业标识"""
+    digest = hashlib.blake2b(json.dumps(settings, sort_keys=True, default=str).encode("utf-8"),
+                             digest_size=16)
+    for path in files:
+        try:
+            stat = os.stat(path)
+            identity = (os.path.abspath(path), stat.st_size, int(stat.st_mtime))
+        except OSError:
+            identity = (os.path.abspath(path), None, None)
+        digest.update(repr(identity).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class JobJournal:
+    """一次批处理的作业日志
+
+    日志中的作业标识与本次不同时（输入或设置变化）丢弃旧记录重新开始。
+    光栅化线程读取、汇总线程写入记录，对记录的修改和遍历都在锁内进行。
+    """
+
+    def __init__(self, export_folder, files, settings):
+        self.path = os.path.join(export_folder, JOURNAL_FILE_NAME)
+        self.key = job_key(files, settings)
+        self.pages = {}      # {(文件, 页面名称): 页面记录}
+        self.files = {}      # {文件: 页数}
+        self.reports = {}    # {报告名称: 报告记录}
+        self.done_pages = set()   # 已写入生成的报告PDF的页面 {(文件, 页面名称)}
+        self._report_pages = {}   # 各报告尚未写入生成的PDF的页面 {报告名称: [(文件, 页面名称), ...]}
+        self._lock = threading.Lock()
+
+        if self._load():
+            self._file = open(self.path, 'a', encoding='utf-8')
+        else:
+            os.makedirs(export_folder, exist_ok=True)
+            self._file = open(self.path, 'w', encoding='utf-8')
+            self._append({"type": "job", "key": self.key})
+
+    def _load(self):
+        """读取已有日志，作业标识一致时返回 True"""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                records = []
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # 崩溃时最后一行可能只写了一半
+                        break
+        except OSError as e:
+            logging.error(f"读取作业日志失败 {self.path}: {str(e)}")
+            return False
+        if not records or records[0].get("type") != "job" or records[0].get("key") != self.key:
+            return False
+
+        for record in records[1:]:
+            kind = record.get("type")
+            if kind == "page":
+                self._add_page(record)
+            elif kind == "file":
+                self.files[record["file"]] = record["pages"]
+            elif kind == "report":
+                self._add_report(record)
+        return True
+
+    def _add_page(self, record):
+        key = (record["file"], record["name"])
+        with self._lock:
+            self.pages[key] = record
+            self._report_pages.setdefault(record["report"], []).append(key)
+
+    def _add_report(self, record):
+        with self._lock:
+            self.reports[record["name"]] = record
+            self.done_pages.update(self._report_pages.pop(record["name"], ()))
+
+    @property
+    def resumed_pages(self):
+        return len(self.pages)
+
+    def _append(self, record):
+        with self._lock:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def page(self, file_path, name):
+        """返回页面记录，未完成时返回 None"""
+        return self.pages.get((os.path.abspath(file_path), name))
+
+    def file_pages(self, file_path):
+        """返回文件已完成页面的记录（在锁内取快照）"""
+        file_path = os.path.abspath(file_path)
+        with self._lock:
+            return [record for (path, _), record in self.pages.items() if path == file_path]
+
+    def record_page(self, page, report, category):
+        key = (os.path.abspath(page.source), page.name)
+        if key in self.pages:
+            return
+        record = {"type": "page", "file": key[0], "name": page.name, "angle": page.angle,
+                  "text": page.text, "report": report, "category": category}
+        self._add_page(record)
+        self._append(record)
+
+    def record_file(self, file_path, pages):
+        file_path = os.path.abspath(file_path)
+        if self.files.get(file_path) == pages:
+            return
+        self.files[file_path] = pages
+        self._append({"type": "file", "file": file_path, "pages": pages})
+
+    def record_report(self, name, category, path, pages):
+        record = {"type": "report", "name": name, "category": category, "path": path, "pages": pages}
+        self._add_report(record)
+        self._append(record)
+
+    def report_done(self, name):
+        """报告PDF是否已生成且仍然存在"""
+        record = self.reports.get(name)
+        return record is not None and os.path.exists(record["path"])
+
+    def page_done(self, file_path, name):
+        """页面是否已写入生成的报告PDF（不必再写入）"""
+        key = (os.path.abspath(file_path), name)
+        return key in self.done_pages and self.report_done(self.pages[key]["report"])
+
+    def file_done(self, file_path):
+        """文件的所有页面是否都已写入生成的报告PDF（可以整份跳过）"""
+        file_path = os.path.abspath(file_path)
+        if file_path not in self.files:
+            return False
+        records = self.file_pages(file_path)
+        return (len(records) == self.files[file_path]
+                and all(self.page_done(file_path, record["name"]) for record in records))
+
+    def close(self):
+        with self._lock:
+            self._file.close()
@@ -2,17 +2,18 @@ import os
 import re
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk, scrolledtext
-import pdf2image
-from paddleocr import PaddleOCR
-from PIL import Image
 import PyPDF2
-import tempfile
-import shutil
 import threading
+import multiprocessing
 from pathlib import Path
 import subprocess
 import sys
 
+from engine import ReportEngine, ProcessingStopped
+from pipeline import DEFAULT_WORKERS
+from rasterize import DEFAULT_DPI
+from ui_channel import UiChannel
+
 class ScanReportApp:
     def __init__(self, root):
         self.root = root
@@ -84,6 +85,111 @@ class ScanReportApp:
         self.folder_path_label = ttk.Label(export_frame, text="未选择导出文件夹")
         self.folder_path_label.pack(side=tk.LEFT, padx=10, fill=tk.X, expand=True)
         
+        # 处理选项（数值选项一行，开关每行4个）
+        options_frame = ttk.LabelFrame(main_frame, text="处理选项", padding=5)
+        options_frame.pack(fill=tk.X, pady=5)
+        
+        # 识别进程数
+        self.workers_var = tk.IntVar(value=DEFAULT_WORKERS)
+        workers_frame = ttk.Frame(options_frame)
+        workers_frame.grid(row=0, column=0, sticky=tk.W, padx=5, pady=2)
+        ttk.Label(workers_frame, text="识别进程数").pack(side=tk.LEFT)
+        self.workers_spinbox = ttk.Spinbox(
+            workers_frame,
+            from_=1,
+            to=os.cpu_count() or 1,
+            textvariable=self.workers_var,
+            width=4
+        )
+        self.workers_spinbox.pack(side=tk.LEFT, padx=5)
+        
+        # PDF渲染分辨率
+        self.dpi_var = tk.IntVar(value=DEFAULT_DPI)
+        dpi_frame = ttk.Frame(options_frame)
+        dpi_frame.grid(row=0, column=1, sticky=tk.W, padx=5, pady=2)
+        ttk.Label(dpi_frame, text="DPI").pack(side=tk.LEFT)
+        self.dpi_spinbox = ttk.Spinbox(
+            dpi_frame,
+            from_=72,
+            to=600,
+            increment=50,
+            textvariable=self.dpi_var,
+            width=4
+        )
+        self.dpi_spinbox.pack(side=tk.LEFT, padx=5)
+        
+        # 是否使用OCR结果缓存
+        self.use_cache_var = tk.BooleanVar(value=True)
+        self.use_cache_check = ttk.Checkbutton(
+            options_frame,
+            text="使用识别缓存",
+            variable=self.use_cache_var
+        )
+        self.use_cache_check.grid(row=1, column=0, sticky=tk.W, padx=5, pady=2)
+        
+        # 是否先只识别页眉区域
+        self.roi_var = tk.BooleanVar(value=True)
+        self.roi_check = ttk.Checkbutton(
+            options_frame,
+            text="优先识别页眉",
+            variable=self.roi_var
+        )
+        self.roi_check.grid(row=1, column=1, sticky=tk.W, padx=5, pady=2)
+        
+        # 是否找到报告编号后即停止识别该页
+        self.early_exit_var = tk.BooleanVar(value=True)
+        self.early_exit_check = ttk.Checkbutton(
+            options_frame,
+            text="找到编号即停止识别",
+            variable=self.early_exit_var
+        )
+        self.early_exit_check.grid(row=1, column=2, sticky=tk.W, padx=5, pady=2)
+        
+        # 是否记录作业日志，中断后从上次完成的页面继续
+        self.resume_var = tk.BooleanVar(value=True)
+        self.resume_check = ttk.Checkbutton(
+            options_frame,
+            text="断点续处理",
+            variable=self.resume_var
+        )
+        self.resume_check.grid(row=1, column=3, sticky=tk.W, padx=5, pady=2)
+        
+        # 报告PDF已存在时是否只追加新页面（否则覆盖）
+        self.append_var = tk.BooleanVar(value=True)
+        self.append_check = ttk.Checkbutton(
+            options_frame,
+            text="追加到已有报告",
+            variable=self.append_var
+        )
+        self.append_check.grid(row=2, column=0, sticky=tk.W, padx=5, pady=2)
+        
+        # 是否低分辨率检测、只按文本行区域以"DPI"渲染识别
+        self.adaptive_dpi_var = tk.BooleanVar(value=True)
+        self.adaptive_dpi_check = ttk.Checkbutton(
+            options_frame,
+            text="按需分辨率",
+            variable=self.adaptive_dpi_var
+        )
+        self.adaptive_dpi_check.grid(row=2, column=1, sticky=tk.W, padx=5, pady=2)
+        
+        # PDF带文本层（数字生成的报告）时是否直接使用文本层，不再OCR
+        self.text_layer_var = tk.BooleanVar(value=True)
+        self.text_layer_check = ttk.Checkbutton(
+            options_frame,
+            text="使用PDF文本",
+            variable=self.text_layer_var
+        )
+        self.text_layer_check.grid(row=2, column=2, sticky=tk.W, padx=5, pady=2)
+        
+        # 多页报告只在首页或页眉印有编号时，是否把续页归入前面的报告（续页只识别页眉）
+        self.segment_var = tk.BooleanVar(value=False)
+        self.segment_check = ttk.Checkbutton(
+            options_frame,
+            text="报告分段",
+            variable=self.segment_var
+        )
+        self.segment_check.grid(row=2, column=3, sticky=tk.W, padx=5, pady=2)
+        
         # 处理按钮框架
         process_frame = ttk.Frame(main_frame)
         process_frame.pack(fill=tk.X, pady=10)
@@ -127,12 +233,25 @@ class ScanReportApp:
         self.log_text.pack(fill=tk.BOTH, expand=True, pady=10)
         self.log_text.config(state=tk.DISABLED)
         
-        # 初始化OCR引擎
-        self.ocr = None
-        
         # 状态标签
         self.status_label = ttk.Label(main_frame, text="就绪")
         self.status_label.pack(anchor=tk.W)
+        
+        # 处理线程通过消息通道更新日志、状态和进度，由界面定时刷新
+        self.ui = UiChannel(
+            root,
+            self.log_text,
+            status=lambda message: self.status_label.config(text=message),
+            progress=self.progress_var.set,
+        )
+        
+        # 处理引擎（OCR模型和识别缓存在多次处理之间复用）
+        self.engine = ReportEngine(
+            log=self.ui.log,
+            status=self.ui.status,
+            progress=self.ui.progress,
+            should_stop=lambda: self.stop_processing,
+        )
     
     def load_readme(self):
         """加载README文件内容并格式化为优雅的文字描述"""
@@ -212,12 +331,8 @@ class ScanReportApp:
             line_number += 1
     
     def add_log(self, message):
-        """添加日志消息到日志文本框"""
-        self.log_text.config(state=tk.NORMAL)
-        self.log_text.insert(tk.END, message + "\n")
-        self.log_text.see(tk.END)
-        self.log_text.config(state=tk.DISABLED)
-        self.root.update_idletasks()
+        """添加日志消息到日志文本框（可在处理线程中调用）"""
+        self.ui.log(message)
     
     def select_files(self):
         """选择文件功能"""
@@ -282,9 +397,7 @@ class ScanReportApp:
         self.progress_var.set(0)
         
         # 清空日志
-        self.log_text.config(state=tk.NORMAL)
-        self.log_text.delete(1.0, tk.END)
-        self.log_text.config(state=tk.DISABLED)
+        self.ui.clear_log()
         
         # 创建线程
         thread = threading.Thread(target=self.batch_process)
@@ -299,472 +412,62 @@ class ScanReportApp:
             self.stop_btn.config(state=tk.DISABLED)
     
     def batch_process(self):
-        """批量处理功能"""
-        # 创建临时文件夹
-        temp_dir = tempfile.mkdtemp()
-        
+        """批量处理功能（带方向修正）"""
+        self.run_batch("full")
+    
+    def simple_batch_process(self):
+        """简单批量处理功能（只识别文字方向）"""
+        self.run_batch("simple")
+    
+    def run_batch(self, mode):
+        """运行批量处理
+
+        mode 为 "full" 时先检测并校正方向再识别；为 "simple" 时只在识别时使用OCR内置方向分类器。
+        """
         try:
-            # 初始化OCR引擎
-            if self.ocr is None:
-                self.add_log("初始化OCR引擎...")
-                self.ocr = PaddleOCR(
-                    use_angle_cls=True,      # 启用方向分类
-                    lang="ch",               # 中文识别
-                    show_log=False,          # 不显示详细日志
-                    use_gpu=False,           # 默认不使用GPU
-                    enable_mkldnn=True,      # 启用Intel MKL-DNN加速
-                    rec_model_dir=None,      # 使用默认模型路径
-                    rec_char_dict_path=None, # 使用默认字典
-                    det_db_box_thresh=0.5,   # 降低检测阈值，提高检出率
-                    det_db_thresh=0.3        # 降低文本区域检测阈值
-                )
-                self.add_log("OCR引擎初始化完成")
-            
-            total_files = len(self.selected_files)
-            processed = 0
-            temp_image_files = []  # 存储所有图片文件路径
-            
-            # 统计不同类型的文件计数
-            limis_count = 0
-            association_count = 0
-            other_count = 0
-            
-            # 存储文件名列表用于最终输出
-            limis_files = []
-            association_files = []
-            other_files = []
-            
-            # 定义输出文件夹路径（但不立即创建）
-            limis_folder = os.path.join(self.export_folder, "Limis")
-            association_folder = os.path.join(self.export_folder, "协会")
-            other_folder = os.path.join(self.export_folder, "其他")
-            
-            # 处理PDF文件和图片文件
-            for file_path in self.selected_files:
-                if self.stop_processing:
-                    break
-                
-                file_name = os.path.basename(file_path)
-                file_ext = os.path.splitext(file_name)[1].lower()
-                
-                self.add_log(f"处理: {file_name}")
-                self.status_label.config(text=f"处理: {file_name}")
-                
-                # 如果是PDF，先将每页转为图片
-                if file_ext == '.pdf':
-                    pdf_images = self.pdf_to_images(file_path, temp_dir)
-                    temp_image_files.extend(pdf_images)
-                # 如果是图片，直接添加到处理列表
-                elif file_ext in ['.png', '.jpg', '.jpeg']:
-                    temp_image_path = os.path.join(temp_dir, file_name)
-                    shutil.copy2(file_path, temp_image_path)
-                    temp_image_files.append(temp_image_path)
-                
-                processed += 1
-                self.progress_var.set((processed / total_files) * 30)
-            
-            if self.stop_processing:
-                raise Exception("处理已停止")
-            
-            # 对所有图像进行方向检测和矫正
-            self.add_log("进行图像方向检测和矫正...")
-            corrected_images = []
-            total_images = len(temp_image_files)
-            
-            for i, img_path in enumerate(temp_image_files):
-                if self.stop_processing:
-                    break
-                
-                img_name = os.path.basename(img_path)
-                self.add_log(f"检测图像方向: {img_name}")
-                self.status_label.config(text=f"检测图像方向: {img_name}")
-                
-                # 矫正图像方向并返回正确方向的图像路径
-                corrected_path = self.correct_image_orientation(img_path)
-                corrected_images.append(corrected_path)
-                
-                progress = 30 + ((i + 1) / total_images) * 20
-                self.progress_var.set(progress)
-            
-            if self.stop_processing:
-                raise Exception("处理已停止")
-            
-            # 对所有图片进行OCR并匹配重命名
-            renamed_files = {}  # 用于存储重命名后的文件 {新名称: [文件路径列表, 类型]}
-            total_images = len(corrected_images)
-            
-            for i, img_path in enumerate(corrected_images):
-                if self.stop_processing:
-                    break
-                
-                img_name = os.path.basename(img_path)
-                self.add_log(f"OCR识别: {img_name}")
-                self.status_label.config(text=f"OCR识别: {img_name}")
-                
-                # 提取文本并匹配
-                try:
-                    text = self.ocr_image(img_path)
-                    
-                    # 检查是否获取到文本
-                    if not text.strip():
-                        self.add_log(f"未能从图像中提取到文本，使用原文件名")
-                        base_name = os.path.splitext(os.path.basename(img_path))[0]
-                        new_name = base_name
-                        file_type = "other"
-                        self.add_log(f"使用原文件名: {base_name}")
-                    else:
-                        # 匹配LIMIS格式: XX000-000000
-                        limis_match = re.search(r'[a-zA-Z]{2}\d{3}[-_—]\d{6}', text)
-                        
-                        # 匹配协会格式: XX00-000000000
-                        association_match = re.search(r'[a-zA-Z]{2}\d{2}[-_—]\d{9}', text)
-                        
-                        if limis_match:
-                            new_name = limis_match.group(0)
-                            file_type = "limis"
-                            self.add_log(f"匹配到LIMIS格式: {new_name}")
-                        elif association_match:
-                            new_name = association_match.group(0)
-                            file_type = "association"
-                            self.add_log(f"匹配到协会格式: {new_name}")
-                        else:
-                            # 如果没有匹配到，使用原文件名
-                            base_name = os.path.splitext(os.path.basename(img_path))[0]
-                            new_name = base_name
-                            file_type = "other"
-                            self.add_log(f"未匹配到格式，使用原文件名: {base_name}")
-                    
-                    # 存储文件信息
-                    if new_name in renamed_files:
-                        renamed_files[new_name][0].append(img_path)
-                    else:
-                        renamed_files[new_name] = [[img_path], file_type]
-                    
-                except Exception as e:
-                    # OCR错误处理
-                    self.add_log(f"处理图片时出错: {str(e)}")
-                    base_name = os.path.splitext(os.path.basename(img_path))[0]
-                    if base_name in renamed_files:
-                        renamed_files[base_name][0].append(img_path)
-                    else:
-                        renamed_files[base_name] = [[img_path], "other"]
-                
-                progress = 50 + ((i + 1) / total_images) * 30
-                self.progress_var.set(progress)
-            
-            if self.stop_processing:
-                raise Exception("处理已停止")
-            
-            # 处理重命名后的文件并转换为PDF
-            processed_count = 0
-            total_renamed = len(renamed_files)
-            
-            for new_name, file_info in renamed_files.items():
-                if self.stop_processing:
-                    break
-                
-                file_paths = file_info[0]
-                file_type = file_info[1]
-                
-                self.add_log(f"处理文件: {new_name} (类型: {file_type})")
-                self.status_label.config(text=f"处理文件: {new_name}")
-                
-                # 根据文件类型选择输出目录并记录文件名
-                if file_type == "limis":
-                    output_folder = limis_folder
-                    limis_count += 1
-                    if new_name not in limis_files:
-                        limis_files.append(new_name)
-                elif file_type == "association":
-                    output_folder = association_folder
-                    association_count += 1
-                    if new_name not in association_files:
-                        association_files.append(new_name)
-                else:
-                    output_folder = other_folder
-                    other_count += 1
-                    if new_name not in other_files:
-                        other_files.append(new_name)
-                
-                # 确保输出目录存在
-                os.makedirs(output_folder, exist_ok=True)
-                
-                output_pdf_path = os.path.join(output_folder, f"{new_name}.pdf")
-                
-                # 将图片转换为PDF并合并（确保使用已经校正方向的图像）
-                self.images_to_pdf(file_paths, output_pdf_path)
-                self.add_log(f"生成PDF: {output_pdf_path}")
-                
-                processed_count += 1
-                progress = 80 + ((processed_count / total_renamed) * 20)
-                self.progress_var.set(progress)
-            
-            if self.stop_processing:
-                raise Exception("处理已停止")
-            
-            self.progress_var.set(100)
-            self.status_label.config(text=f"处理完成! 文件已保存到: {self.export_folder}")
-            self.add_log(f"处理完成! 文件已保存到: {self.export_folder}")
-            
-            # 显示文件夹及其中的文件列表
-            if limis_count > 0:
-                self.add_log(f"LIMIS文件: {limis_folder} ({limis_count}个文件)")
-                self.add_log("Limis报告：")
-                for file_name in sorted(limis_files):
-                    self.add_log(file_name)
-            
-            if association_count > 0:
-                self.add_log(f"协会文件: {association_folder} ({association_count}个文件)")
-                self.add_log("协会报告：")
-                for file_name in sorted(association_files):
-                    self.add_log(file_name)
-            
-            if other_count > 0:
-                self.add_log(f"其他文件: {other_folder} ({other_count}个文件)")
-                self.add_log("其他：")
-                for file_name in sorted(other_files):
-                    self.add_log(file_name)
-            
-            messagebox.showinfo("成功", f"成功处理 {len(self.selected_files)} 个文件，并输出到 {self.export_folder}")
+            self.engine.run(
+                self.selected_files,
+                self.export_folder,
+                mode=mode,
+                workers=self.workers_var.get(),
+                dpi=self.dpi_var.get(),
+                use_cache=self.use_cache_var.get(),
+                use_roi=self.roi_var.get(),
+                early_exit=self.early_exit_var.get(),
+                resume=self.resume_var.get(),
+                append=self.append_var.get(),
+                adaptive_dpi=self.adaptive_dpi_var.get(),
+                use_text_layer=self.text_layer_var.get(),
+                segment=self.segment_var.get(),
+            )
+            
+            self.ui.call(messagebox.showinfo, "成功",
+                         f"成功处理 {len(self.selected_files)} 个文件，并输出到 {self.export_folder}")
             
         except Exception as e:
             error_msg = str(e)
             self.add_log(f"错误: {error_msg}")
-            self.status_label.config(text=f"处理过程中发生错误")
+            self.ui.status("处理过程中发生错误")
             
-            if error_msg != "处理已停止":
-                messagebox.showerror("错误", f"处理过程中发生错误: {error_msg}")
+            if not isinstance(e, ProcessingStopped):
+                self.ui.call(messagebox.showerror, "错误", f"处理过程中发生错误: {error_msg}")
         finally:
-            # 清理临时文件夹
-            try:
-                shutil.rmtree(temp_dir, ignore_errors=True)
-            except:
-                pass
-            
-            # 恢复UI状态
-            self.processing = False
-            self.simple_process_btn.config(state=tk.NORMAL)
-            self.process_btn.config(state=tk.NORMAL)
-            self.stop_btn.config(state=tk.DISABLED)
-            
-            if self.stop_processing:
-                self.progress_var.set(0)
-                self.status_label.config(text="处理已停止")
-                self.add_log("处理已停止")
-            elif self.progress_var.get() == 100:
-                self.status_label.config(text="处理完成")
+            # 恢复UI状态（在界面线程中执行）
+            self.ui.call(self.finish_batch)
     
-    def pdf_to_images(self, pdf_path, output_dir):
-        """将PDF文件转换为图片"""
-        try:
-            images = pdf2image.convert_from_path(pdf_path)
-            image_paths = []
-            
-            for i, img in enumerate(images):
-                # 生成输出图片路径
-                base_name = os.path.basename(pdf_path)
-                base_name = os.path.splitext(base_name)[0]
-                img_path = os.path.join(output_dir, f"{base_name}_page_{i+1}.png")
-                
-                # 保存图片（移除ICC配置文件以避免libpng警告）
-                img = img.convert('RGB')  # 确保图像是RGB模式
-                img.save(img_path, 'PNG', icc_profile=None)  # 不包含ICC配置文件
-                image_paths.append(img_path)
-                
-                if self.stop_processing:
-                    break
-            
-            self.add_log(f"PDF转换为 {len(image_paths)} 张图片: {os.path.basename(pdf_path)}")
-            return image_paths
-        except Exception as e:
-            self.add_log(f"PDF转图片出错: {str(e)}")
-            raise
-    
-    def correct_image_orientation(self, image_path):
-        """在OCR前检测并校正图像方向"""
-        try:
-            # 打开图像
-            img = Image.open(image_path)
-            
-            # 获取原始图像尺寸
-            orig_width, orig_height = img.size
-            is_landscape = orig_width > orig_height
-            
-            # 尝试不同角度的旋转并检测文本
-            best_angle = 0
-            best_score = 0
-            best_image = None
-            
-            # 如果是横向图像，优先尝试旋转到纵向
-            angles_to_try = [0, 90, 180, 270] if is_landscape else [0, 180, 90, 270]
-            
-            self.add_log(f"检测图像尺寸: {orig_width}x{orig_height}, {'横向' if is_landscape else '纵向'}")
-            
-            # 尝试不同角度旋转
-            for angle in angles_to_try:
-                if angle == 0:
-                    rotated_img = img.copy()
-                else:
-                    rotated_img = img.rotate(angle, expand=True)
-                
-                # 保存临时旋转图像
-                temp_img = tempfile.NamedTemporaryFile(delete=False, suffix='.png')
-                temp_img.close()
-                
-                # 转换为RGB并移除ICC配置文件
-                rotated_img = rotated_img.convert('RGB')
-                rotated_img.save(temp_img.name, 'PNG', icc_profile=None)
-                
-                # 检测这个方向的文本
-                try:
-                    detect_result = self.ocr.ocr(temp_img.name, cls=False)
-                    
-                    # 计算这个方向检测到的文本量和置信度
-                    score = 0
-                    confidence_sum = 0
-                    
-                    if detect_result and detect_result[0]:
-                        score = len(detect_result[0])
-                        
-                        # 计算置信度总和
-                        for line in detect_result[0]:
-                            confidence_sum += line[1][1]  # 置信度值
-                        
-                        # 调整分数：文本区域数量 * 平均置信度
-                        if score > 0:
-                            avg_confidence = confidence_sum / score
-                            adjusted_score = score * avg_confidence
-                        else:
-                            adjusted_score = 0
-                            
-                        # 如果是纵向(portrait)，给予额外的分数提升
-                        rotated_width, rotated_height = rotated_img.size
-                        if rotated_height > rotated_width:
-                            adjusted_score *= 1.2  # 优先选择纵向图像
-                            
-                        self.add_log(f"旋转 {angle} 度: 检测到 {score} 个文本区域, 置信度: {avg_confidence:.2f}, 调整分数: {adjusted_score:.2f}")
-                        
-                        # 如果这个方向检测到更多文本或更高的调整分数，保存为最佳角度
-                        if adjusted_score > best_score:
-                            best_score = adjusted_score
-                            best_angle = angle
-                            best_image = rotated_img.copy()
-                    else:
-                        self.add_log(f"旋转 {angle} 度: 未检测到文本")
-                    
-                except Exception as e:
-                    self.add_log(f"旋转 {angle} 度检测失败: {str(e)}")
-                finally:
-                    # 删除临时文件
-                    try:
-                        os.unlink(temp_img.name)
-                    except:
-                        pass
-            
-            # 用最佳角度旋转图像并保存
-            if best_angle != 0 and best_image is not None:
-                self.add_log(f"确定最佳旋转角度: {best_angle} 度")
-                best_image.save(image_path, 'PNG', icc_profile=None)
-                return image_path
-            else:
-                self.add_log("保持原始方向")
-                # 确保原始图像也是RGB格式，以便后续处理
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                    img.save(image_path, 'PNG', icc_profile=None)
-                return image_path
-                
-        except Exception as e:
-            self.add_log(f"方向校正错误: {str(e)}")
-            # 尝试转换为RGB格式以确保后续处理正常
-            try:
-                img = Image.open(image_path).convert('RGB')
-                img.save(image_path, 'PNG', icc_profile=None)
-            except:
-                pass
-            return image_path  # 出错时返回原始路径
-    
-    def ocr_image(self, image_path):
-        """使用PaddleOCR识别已经校正方向的图片中的文本"""
-        try:
-            # 直接进行OCR识别
-            result = self.ocr.ocr(image_path, cls=True)
-            
-            # 提取所有识别到的文本
-            all_text = ""
-            
-            # 检查结果是否有效
-            if result and result[0]:
-                for line in result[0]:
-                    text = line[1][0]  # 提取识别文本
-                    all_text += text + " "
-                
-                if not all_text.strip():
-                    self.add_log("识别到了图像，但未提取到文本")
-            else:
-                self.add_log("未能检测到任何文本内容")
-            
-            return all_text
-        except Exception as e:
-            self.add_log(f"OCR识别失败: {str(e)}")
-            # 直接返回空字符串而不是抛出异常，让程序继续处理
-            return ""
-    
-    def images_to_pdf(self, image_paths, output_pdf_path):
-        """将图片转换为PDF并合并，确保正确方向"""
-        try:
-            if not image_paths:
-                self.add_log(f"警告: 没有图像可以转换为PDF: {output_pdf_path}")
-                return
-                
-            # 使用PIL直接创建PDF而不是经过临时PDF和PyPDF2
-            images = []
-            
-            # 首先检查所有图像是否可读取，并且转换为RGB格式
-            for img_path in image_paths:
-                if self.stop_processing:
-                    break
-                
-                try:
-                    # 使用PIL打开图片
-                    img = Image.open(img_path)
-                    
-                    # 确保图像是RGB模式
-                    if img.mode != 'RGB':
-                        img = img.convert('RGB')
-                    
-                    # 添加到图像列表
-                    images.append(img)
-                except Exception as e:
-                    self.add_log(f"打开图像失败: {img_path}, 错误: {str(e)}")
-            
-            if not images:
-                self.add_log(f"警告: 无法读取任何图像来创建PDF: {output_pdf_path}")
-                return
-            
-            # 确保输出目录存在
-            os.makedirs(os.path.dirname(output_pdf_path), exist_ok=True)
-            
-            # 保存第一张图像为PDF，并附加其余图像
-            first_image = images[0]
-            if len(images) == 1:
-                # 只有一张图像，直接保存
-                first_image.save(output_pdf_path, 'PDF', resolution=100.0, save_all=False)
-            else:
-                # 多张图像，使用save_all和append_images保存
-                first_image.save(
-                    output_pdf_path, 
-                    'PDF', 
-                    resolution=100.0, 
-                    save_all=True, 
-                    append_images=images[1:]
-                )
-            
-            self.add_log(f"成功创建PDF: {output_pdf_path} (包含 {len(images)} 页)")
-            
-        except Exception as e:
-            self.add_log(f"图片转PDF失败: {str(e)}")
-            raise
+    def finish_batch(self):
+        """批量处理结束后恢复UI状态"""
+        self.processing = False
+        self.simple_process_btn.config(state=tk.NORMAL)
+        self.process_btn.config(state=tk.NORMAL)
+        self.stop_btn.config(state=tk.DISABLED)
+        
+        if self.stop_processing:
+            self.progress_var.set(0)
+            self.status_label.config(text="处理已停止")
+            self.add_log("处理已停止")
+        elif self.progress_var.get() == 100:
+            self.status_label.config(text="处理完成")
     
     def start_simple_batch_process(self):
         """在新线程中启动简单批量处理（只识别文字方向）"""
@@ -789,325 +492,16 @@ class ScanReportApp:
         self.progress_var.set(0)
         
         # 清空日志
-        self.log_text.config(state=tk.NORMAL)
-        self.log_text.delete(1.0, tk.END)
-        self.log_text.config(state=tk.DISABLED)
+        self.ui.clear_log()
         
         # 创建线程
         thread = threading.Thread(target=self.simple_batch_process)
         thread.daemon = True
         thread.start()
-    
-    def simple_batch_process(self):
-        """简单批量处理功能（只识别文字方向）"""
-        # 创建临时文件夹
-        temp_dir = tempfile.mkdtemp()
-        
-        try:
-            # 初始化OCR引擎
-            if self.ocr is None:
-                self.add_log("初始化OCR引擎...")
-                self.ocr = PaddleOCR(
-                    use_angle_cls=True,      # 启用方向分类
-                    lang="ch",               # 中文识别
-                    show_log=False,          # 不显示详细日志
-                    use_gpu=False,           # 默认不使用GPU
-                    enable_mkldnn=True,      # 启用Intel MKL-DNN加速
-                    rec_model_dir=None,      # 使用默认模型路径
-                    rec_char_dict_path=None, # 使用默认字典
-                    det_db_box_thresh=0.5,   # 降低检测阈值，提高检出率
-                    det_db_thresh=0.3        # 降低文本区域检测阈值
-                )
-                self.add_log("OCR引擎初始化完成")
-            
-            total_files = len(self.selected_files)
-            processed = 0
-            temp_image_files = []  # 存储所有图片文件路径
-            
-            # 统计不同类型的文件计数
-            limis_count = 0
-            association_count = 0
-            other_count = 0
-            
-            # 存储文件名列表用于最终输出
-            limis_files = []
-            association_files = []
-            other_files = []
-            
-            # 定义输出文件夹路径（但不立即创建）
-            limis_folder = os.path.join(self.export_folder, "Limis")
-            association_folder = os.path.join(self.export_folder, "协会")
-            other_folder = os.path.join(self.export_folder, "其他")
-            
-            # 处理PDF文件和图片文件
-            for file_path in self.selected_files:
-                if self.stop_processing:
-                    break
-                
-                file_name = os.path.basename(file_path)
-                file_ext = os.path.splitext(file_name)[1].lower()
-                
-                self.add_log(f"处理: {file_name}")
-                self.status_label.config(text=f"处理: {file_name}")
-                
-                # 如果是PDF，先将每页转为图片
-                if file_ext == '.pdf':
-                    pdf_images = self.pdf_to_images(file_path, temp_dir)
-                    temp_image_files.extend(pdf_images)
-                # 如果是图片，直接添加到处理列表
-                elif file_ext in ['.png', '.jpg', '.jpeg']:
-                    temp_image_path = os.path.join(temp_dir, file_name)
-                    shutil.copy2(file_path, temp_image_path)
-                    temp_image_files.append(temp_image_path)
-                
-                processed += 1
-                self.progress_var.set((processed / total_files) * 30)
-            
-            if self.stop_processing:
-                raise Exception("处理已停止")
-            
-            # 简单方式：只识别文字方向并旋转
-            self.add_log("进行简单图像方向校正...")
-            corrected_images = []
-            total_images = len(temp_image_files)
-            
-            for i, img_path in enumerate(temp_image_files):
-                if self.stop_processing:
-                    break
-                
-                img_name = os.path.basename(img_path)
-                self.add_log(f"简单方向校正: {img_name}")
-                self.status_label.config(text=f"简单方向校正: {img_name}")
-                
-                # 使用简单方向校正
-                corrected_path = self.simple_correct_orientation(img_path)
-                corrected_images.append(corrected_path)
-                
-                progress = 30 + ((i + 1) / total_images) * 20
-                self.progress_var.set(progress)
-            
-            if self.stop_processing:
-                raise Exception("处理已停止")
-            
-            # 对所有图片进行OCR并匹配重命名
-            renamed_files = {}  # 用于存储重命名后的文件 {新名称: [文件路径列表, 类型]}
-            total_images = len(corrected_images)
-            
-            for i, img_path in enumerate(corrected_images):
-                if self.stop_processing:
-                    break
-                
-                img_name = os.path.basename(img_path)
-                self.add_log(f"OCR识别: {img_name}")
-                self.status_label.config(text=f"OCR识别: {img_name}")
-                
-                # 提取文本并匹配
-                try:
-                    text = self.ocr_image(img_path)
-                    
-                    # 检查是否获取到文本
-                    if not text.strip():
-                        self.add_log(f"未能从图像中提取到文本，使用原文件名")
-                        base_name = os.path.splitext(os.path.basename(img_path))[0]
-                        new_name = base_name
-                        file_type = "other"
-                        self.add_log(f"使用原文件名: {base_name}")
-                    else:
-                        # 匹配LIMIS格式: XX000-000000
-                        limis_match = re.search(r'[a-zA-Z]{2}\d{3}[-_—]\d{6}', text)
-                        
-                        # 匹配协会格式: XX00-000000000
-                        association_match = re.search(r'[a-zA-Z]{2}\d{2}[-_—]\d{9}', text)
-                        
-                        if limis_match:
-                            new_name = limis_match.group(0)
-                            file_type = "limis"
-                            self.add_log(f"匹配到LIMIS格式: {new_name}")
-                        elif association_match:
-                            new_name = association_match.group(0)
-                            file_type = "association"
-                            self.add_log(f"匹配到协会格式: {new_name}")
-                        else:
-                            # 如果没有匹配到，使用原文件名
-                            base_name = os.path.splitext(os.path.basename(img_path))[0]
-                            new_name = base_name
-                            file_type = "other"
-                            self.add_log(f"未匹配到格式，使用原文件名: {base_name}")
-                    
-                    # 存储文件信息
-                    if new_name in renamed_files:
-                        renamed_files[new_name][0].append(img_path)
-                    else:
-                        renamed_files[new_name] = [[img_path], file_type]
-                    
-                except Exception as e:
-                    # OCR错误处理
-                    self.add_log(f"处理图片时出错: {str(e)}")
-                    base_name = os.path.splitext(os.path.basename(img_path))[0]
-                    if base_name in renamed_files:
-                        renamed_files[base_name][0].append(img_path)
-                    else:
-                        renamed_files[base_name] = [[img_path], "other"]
-                
-                progress = 50 + ((i + 1) / total_images) * 30
-                self.progress_var.set(progress)
-            
-            if self.stop_processing:
-                raise Exception("处理已停止")
-            
-            # 处理重命名后的文件并转换为PDF
-            processed_count = 0
-            total_renamed = len(renamed_files)
-            
-            for new_name, file_info in renamed_files.items():
-                if self.stop_processing:
-                    break
-                
-                file_paths = file_info[0]
-                file_type = file_info[1]
-                
-                self.add_log(f"处理文件: {new_name} (类型: {file_type})")
-                self.status_label.config(text=f"处理文件: {new_name}")
-                
-                # 根据文件类型选择输出目录并记录文件名
-                if file_type == "limis":
-                    output_folder = limis_folder
-                    limis_count += 1
-                    if new_name not in limis_files:
-                        limis_files.append(new_name)
-                elif file_type == "association":
-                    output_folder = association_folder
-                    association_count += 1
-                    if new_name not in association_files:
-                        association_files.append(new_name)
-                else:
-                    output_folder = other_folder
-                    other_count += 1
-                    if new_name not in other_files:
-                        other_files.append(new_name)
-                
-                # 确保输出目录存在
-                os.makedirs(output_folder, exist_ok=True)
-                
-                output_pdf_path = os.path.join(output_folder, f"{new_name}.pdf")
-                
-                # 将图片转换为PDF并合并（确保使用已经校正方向的图像）
-                self.images_to_pdf(file_paths, output_pdf_path)
-                self.add_log(f"生成PDF: {output_pdf_path}")
-                
-                processed_count += 1
-                progress = 80 + ((processed_count / total_renamed) * 20)
-                self.progress_var.set(progress)
-            
-            if self.stop_processing:
-                raise Exception("处理已停止")
-            
-            self.progress_var.set(100)
-            self.status_label.config(text=f"处理完成! 文件已保存到: {self.export_folder}")
-            self.add_log(f"处理完成! 文件已保存到: {self.export_folder}")
-            
-            # 显示文件夹及其中的文件列表
-            if limis_count > 0:
-                self.add_log(f"LIMIS文件: {limis_folder} ({limis_count}个文件)")
-                self.add_log("Limis报告：")
-                for file_name in sorted(limis_files):
-                    self.add_log(file_name)
-            
-            if association_count > 0:
-                self.add_log(f"协会文件: {association_folder} ({association_count}个文件)")
-                self.add_log("协会报告：")
-                for file_name in sorted(association_files):
-                    self.add_log(file_name)
-            
-            if other_count > 0:
-                self.add_log(f"其他文件: {other_folder} ({other_count}个文件)")
-                self.add_log("其他：")
-                for file_name in sorted(other_files):
-                    self.add_log(file_name)
-            
-            messagebox.showinfo("成功", f"成功处理 {len(self.selected_files)} 个文件，并输出到 {self.export_folder}")
-            
-        except Exception as e:
-            error_msg = str(e)
-            self.add_log(f"错误: {error_msg}")
-            self.status_label.config(text=f"处理过程中发生错误")
-            
-            if error_msg != "处理已停止":
-                messagebox.showerror("错误", f"处理过程中发生错误: {error_msg}")
-        finally:
-            # 清理临时文件夹
-            try:
-                shutil.rmtree(temp_dir, ignore_errors=True)
-            except:
-                pass
-            
-            # 恢复UI状态
-            self.processing = False
-            self.simple_process_btn.config(state=tk.NORMAL)
-            self.process_btn.config(state=tk.NORMAL)
-            self.stop_btn.config(state=tk.DISABLED)
-            
-            if self.stop_processing:
-                self.progress_var.set(0)
-                self.status_label.config(text="处理已停止")
-                self.add_log("处理已停止")
-            elif self.progress_var.get() == 100:
-                self.status_label.config(text="处理完成")
-    
-    def simple_correct_orientation(self, image_path):
-        """简单图像方向校正，仅使用OCR的方向分类器"""
-        try:
-            # 打开图像
-            img = Image.open(image_path)
-            
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            # 保存为临时文件（确保是RGB格式）
-            temp_img = tempfile.NamedTemporaryFile(delete=False, suffix='.png')
-            temp_img.close()
-            img.save(temp_img.name, 'PNG', icc_profile=None)
-            
-            try:
-                # 使用OCR库的角度分类器对图像进行直接方向识别和校正
-                self.add_log("使用OCR内置方向分类器...")
-                
-                # 设置use_angle_cls=True让OCR自动检测方向
-                result = self.ocr.ocr(temp_img.name, cls=True)
-                
-                # 如果返回结果中包含了修正方向的图像，获取修正后的结果
-                if hasattr(result, 'get_rotated_img'):
-                    self.add_log("OCR检测到需要旋转图像")
-                    rotated_img = result.get_rotated_img()
-                    rotated_img.save(image_path, 'PNG', icc_profile=None)
-                    self.add_log("已自动旋转图像")
-                else:
-                    # OCR的方向分类器不需要旋转，保持原图
-                    self.add_log("OCR判断不需要旋转")
-                    img.save(image_path, 'PNG', icc_profile=None)
-            except Exception as e:
-                self.add_log(f"方向分类错误: {str(e)}，保持原图")
-                # 发生错误，保持原图
-                img.save(image_path, 'PNG', icc_profile=None)
-            finally:
-                # 删除临时文件
-                try:
-                    os.unlink(temp_img.name)
-                except:
-                    pass
-            
-            return image_path
-        except Exception as e:
-            self.add_log(f"方向校正错误: {str(e)}")
-            # 尝试确保图像是RGB格式
-            try:
-                img = Image.open(image_path).convert('RGB')
-                img.save(image_path, 'PNG', icc_profile=None)
-            except:
-                pass
-            return image_path
 
 if __name__ == "__main__":
+    # 打包后的程序启动识别进程需要
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = ScanReportApp(root)
     root.mainloop() 
\ No newline at end of file
@@ -0,0 +1,133 @@
+"""OCR结果持久缓存
+
+以页面像素（或原始图片文件内容）的哈希加上OCR设置作为键，
+在SQLite中保存识别出的文本行、置信度和选定的页面方向。
+缓存总大小超过上限时按最近使用时间淘汰，重复处理同一页面时可完全跳过OCR。
+本模块只依赖标准库，ScanReport 和 localscan 共用。
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+# 缓存数据库文件名
+CACHE_FILE_NAME = "ocr_cache.sqlite3"
+
+# 缓存大小上限（字节）
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# 淘汰时一次删除到上限的该比例以下，避免每次写入都触发淘汰
+_EVICT_TARGET = 0.9
+
+
+def default_cache_dir():
+    """用户缓存目录"""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+        return os.path.join(base, "ScanReport", "cache")
+    if sys.platform == "darwin":
+        return os.path.join(os.path.expanduser("~"), "Library", "Caches", "ScanReport")
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "scanreport")
+
+
+def _to_json(value):
+    # PaddleOCR结果中可能含有numpy数值
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+class OcrCache:
+    """SQLite OCR结果缓存，可在多个线程中共用"""
+
+    def __init__(self, path=None, settings=None, max_bytes=DEFAULT_MAX_BYTES):
+        if path is None:
+            path = os.path.join(default_cache_dir(), CACHE_FILE_NAME)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        # OCR设置不同的结果不能互相复用，设置序列化后参与计算键
+        self.settings = json.dumps(settings or {}, sort_keys=True, default=str).encode("utf-8")
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_results ("
+            " key TEXT PRIMARY KEY,"
+            " angle INTEGER NOT NULL,"
+            " lines TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON ocr_results (last_used)")
+        self._conn.commit()
+        # 当前缓存总大小，写入时增量维护
+        self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_results").fetchone()[0]
+
+    def key(self, data, *extra):
+        """计算缓存键
+
+        data 为页面像素或文件内容（bytes 或支持缓冲区协议的数组），
+        extra 为图像尺寸等附加信息。
+        """
+        digest = hashlib.blake2b(self.settings, digest_size=32)
+        for item in extra:
+            digest.update(repr(item).encode("utf-8"))
+        digest.update(memoryview(data).cast("B"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """返回 (角度, 识别结果) ，未命中时返回 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT angle, lines FROM ocr_results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE ocr_results SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            self.hits += 1
+        return row[0], json.loads(row[1])
+
+    def put(self, key, angle, lines):
+        """保存一页的识别结果"""
+        payload = json.dumps(lines, ensure_ascii=False, default=_to_json)
+        size = len(payload.encode("utf-8"))
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM ocr_results WHERE key = ?", (key,)).fetchone()
+            if old is not None:
+                self._total -= old[0]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_results (key, angle, lines, size, last_used)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, int(angle), payload, size, time.time()),
+            )
+            self._total += size
+            if self._total > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """删除最久未使用的记录，直到缓存大小降到上限的 _EVICT_TARGET 以下"""
+        target = self.max_bytes * _EVICT_TARGET
+        stale = []
+        for key, size in self._conn.execute("SELECT key, size FROM ocr_results ORDER BY last_used"):
+            if self._total <= target:
+                break
+            stale.append((key,))
+            self._total -= size
+        self._conn.executemany("DELETE FROM ocr_results WHERE key = ?", stale)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,237 @@
+"""本机OCR服务
+
+在一个常驻进程中加载一次检测、方向分类和识别模型，通过本机套接字
+（multiprocessing.connection，只监听 127.0.0.1）为多个前端提供识别。
+ScanReport、localscan 和命令行启动时如果发现服务正在运行且模型参数（OCR_OPTIONS，两个程序共用）相同，
+就直接使用服务，不再各自加载模型：
+
+    python ocr_server.py [--port 17863]
+
+multiprocessing.connection 会反序列化收到的任何数据，因此连接双方用本用户的随机密钥
+（KEY_FILE，仅本用户可读写，服务第一次启动时生成）互相认证，其他用户的进程既不能向服务发送请求，
+也不能冒充服务向客户端返回数据。
+
+客户端 RemoteOCR 提供与 PaddleOCR.ocr() 相同的调用方式，另有 ocr_batch()
+一次提交多张图像。环境变量 SCANREPORT_OCR_SERVER 可指定端口，设为 "off" 时不使用服务。
+本模块只依赖标准库，服务端加载模型时才需要 paddleocr。
+"""
+import os
+import sys
+import socket
+import logging
+import secrets
+import argparse
+import threading
+from multiprocessing.connection import Listener, Client
+
+# 监听地址（只监听本机）
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 17863
+
+# 连接认证密钥文件（每个用户一个，服务第一次启动时生成）
+KEY_FILE = os.path.join(os.path.expanduser("~"), ".scanreport", "ocr_server.key")
+
+# PaddleOCR初始化参数（ScanReport、localscan 和OCR服务共用，参数不同的服务不使用）
+OCR_OPTIONS = dict(
+    use_angle_cls=True,      # 启用方向分类
+    lang="ch",               # 中文识别
+    show_log=False,          # 不显示详细日志
+    use_gpu=False,           # 默认不使用GPU
+    enable_mkldnn=True,      # 启用Intel MKL-DNN加速
+    rec_model_dir=None,      # 使用默认模型路径
+    rec_char_dict_path=None, # 使用默认字典
+    det_db_box_thresh=0.5,   # 降低检测阈值，提高检出率
+    det_db_thresh=0.3,       # 降低文本区域检测阈值
+    rec_batch_num=16         # 识别模型每批处理的文本行数
+)
+
+# 探测服务是否在运行的超时时间（秒）
+CONNECT_TIMEOUT = 0.5
+
+
+def server_address():
+    """读取服务地址，禁用时返回 None"""
+    value = os.environ.get("SCANREPORT_OCR_SERVER", "").strip()
+    if value.lower() in ("off", "0", "no", "false"):
+        return None
+    if not value:
+        return DEFAULT_HOST, DEFAULT_PORT
+    try:
+        return DEFAULT_HOST, int(value)
+    except ValueError:
+        logging.error(f"SCANREPORT_OCR_SERVER 应为端口号: {value}，不使用OCR服务")
+        return None
+
+
+def load_authkey(create=False):
+    """读取本用户的连接密钥，不存在时返回 None；create 为 True 时（服务端）生成新密钥
+
+    密钥文件可被其他用户读写时拒绝使用。
+    """
+    try:
+        fd = os.open(KEY_FILE, os.O_RDONLY)
+    except FileNotFoundError:
+        if not create:
+            return None
+        os.makedirs(os.path.dirname(KEY_FILE), mode=0o700, exist_ok=True)
+        try:
+            fd = os.open(KEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            # 另一个服务同时生成了密钥
+            return load_authkey()
+        key = secrets.token_hex(32).encode("ascii")
+        with os.fdopen(fd, "wb") as f:
+            f.write(key)
+        return key
+    with os.fdopen(fd, "rb") as f:
+        if os.name == "posix" and os.fstat(f.fileno()).st_mode & 0o077:
+            raise PermissionError(f"密钥文件 {KEY_FILE} 可被其他用户访问，请将权限改为 600")
+        return f.read().strip()
+
+
+def same_options(served, options):
+    """服务的模型参数（ping 返回值）是否与 options 相同（忽略值为 None 的参数）"""
+    return served == {k: v for k, v in options.items() if v is not None}
+
+
+class RemoteOCR:
+    """连接本机OCR服务的客户端，可在多个线程中共用"""
+
+    def __init__(self, address, authkey):
+        self.address = address
+        self._conn = Client(address, authkey=authkey)
+        self._lock = threading.Lock()
+        self.options = self._call({"op": "ping"})
+
+    def _call(self, request):
+        with self._lock:
+            self._conn.send(request)
+            reply = self._conn.recv()
+        if not reply.get("ok"):
+            raise RuntimeError(f"OCR服务出错: {reply.get('error')}")
+        return reply.get("result")
+
+    def ocr(self, img, det=True, rec=True, cls=True):
+        """与 PaddleOCR.ocr() 相同"""
+        return self._call({"op": "ocr", "images": [img], "det": det, "rec": rec, "cls": cls})[0]
+
+    def ocr_batch(self, images, det=True, rec=True, cls=True):
+        """一次识别多张图像，返回与 images 一一对应的 PaddleOCR.ocr() 结果"""
+        return self._call({"op": "ocr", "images": list(images), "det": det, "rec": rec, "cls": cls})
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def connect_ocr_server(options):
+    """服务正在运行且模型参数与 options 相同时返回 RemoteOCR，否则返回 None
+
+    OCR缓存按客户端的参数计算缓存键，参数不同的服务识别结果不能混用。
+    """
+    address = server_address()
+    if address is None:
+        return None
+    try:
+        authkey = load_authkey()
+        if authkey is None:
+            return None
+        # 先用短超时探测端口，服务未启动时不必等待
+        socket.create_connection(address, timeout=CONNECT_TIMEOUT).close()
+        remote = RemoteOCR(address, authkey)
+    except Exception:
+        return None
+    if not same_options(remote.options, options):
+        logging.info("OCR服务的模型参数与本程序不同，不使用服务")
+        remote.close()
+        return None
+    return remote
+
+
+class OcrServer:
+    """加载一次模型并为所有连接提供识别
+
+    PaddleOCR实例不能并发调用，各连接的请求在锁内依次执行。
+    """
+
+    def __init__(self, options, port=DEFAULT_PORT):
+        from paddleocr import PaddleOCR
+
+        self.options = options
+        self.address = (DEFAULT_HOST, port)
+        self.authkey = load_authkey(create=True)
+        self.ocr = PaddleOCR(**options)
+        self._lock = threading.Lock()
+        self._listener = None
+        self._closed = False
+
+    def handle_request(self, request):
+        op = request.get("op")
+        if op == "ping":
+            return {k: v for k, v in self.options.items() if v is not None}
+        if op == "ocr":
+            kwargs = dict(det=request.get("det", True), rec=request.get("rec", True),
+                          cls=request.get("cls", True))
+            images = request["images"]
+            with self._lock:
+                return [self.ocr.ocr(image, **kwargs) for image in images]
+        raise ValueError(f"未知请求: {op}")
+
+    def serve_connection(self, conn):
+        with conn:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    reply = {"ok": True, "result": self.handle_request(request)}
+                except Exception as e:
+                    logging.error(f"OCR请求失败: {str(e)}")
+                    reply = {"ok": False, "error": str(e)}
+                try:
+                    conn.send(reply)
+                except (EOFError, OSError):
+                    return
+
+    def serve_forever(self):
+        self._listener = Listener(self.address, authkey=self.authkey)
+        logging.info(f"OCR服务已启动: {self.address[0]}:{self.address[1]}")
+        while True:
+            try:
+                conn = self._listener.accept()
+            except (EOFError, OSError):
+                if self._closed:
+                    break
+                # 客户端探测端口后立即断开
+                continue
+            except Exception as e:
+                # 认证失败等，继续等待下一个连接
+                logging.error(f"拒绝连接: {str(e)}")
+                continue
+            threading.Thread(target=self.serve_connection, args=(conn,), daemon=True).start()
+
+    def close(self):
+        self._closed = True
+        if self._listener is not None:
+            self._listener.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本机OCR服务")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"监听端口（默认 {DEFAULT_PORT}）")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    server = OcrServer(OCR_OPTIONS, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
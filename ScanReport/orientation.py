@@ -0,0 +1,352 @@
+"""页面方向检测与识别
+
+方向检测分三级，前一级足够确定时不再进行后一级（detect_orientation）：
+    1. 像素分析（pixel）：在缩略图上去掉表格线后，按行/列空白的投影判断横排/竖排，
+       再按文本行内墨迹的重心（汉字上重下轻）判断正向/倒置，不调用OCR
+    2. 方向分类（cls）：用像素分析切出的文本行，由方向分类器投票区分 0/180 度，不做文本检测
+    3. 多角度识别（vote）：文本检测后把几行文本按各候选角度识别，取平均置信度最高的角度
+转正后的页面只做一次识别：多页的文本行切片合并成批识别，
+也可以按从上到下的顺序分批识别文本行，找到报告编号后提前结束。
+"""
+import numpy as np
+from PIL import Image
+
+# 方向检测使用的缩略图最长边（像素）
+THUMBNAIL_SIZE = 960
+# 像素分析使用的缩略图最长边（像素）
+PIXEL_THUMBNAIL_SIZE = 1000
+# 像素分析时把页面分成几条分别统计，减小页面倾斜的影响
+PIXEL_STRIPS = 4
+# 长度超过缩略图短边该比例的连续墨迹视为表格线，不参与分析
+RULE_FRACTION = 1 / 12.0
+# 墨迹少于缩略图面积该比例的页面视为空白页
+BLANK_INK_FRACTION = 0.002
+# 横排/竖排两个方向上行间空白比例的相对差异达到该值，才认为文本行方向可信
+DIRECTION_MIN_CONFIDENCE = 0.25
+# 文本行内墨迹重心偏离中线达到行高的该比例时，视为完全确定正向/倒置
+CENTROID_FULL_CONFIDENCE = 0.02
+# 像素分析的置信度达到该值时直接采用（正向/倒置的判断偏弱：在样例报告的旋转页面和合成扫描件共70页上，
+# 判断错误的页面置信度最高为0.59，该阈值下采用的页面没有错误）
+PIXEL_MIN_CONFIDENCE = 0.75
+# 方向分类器投票的置信度达到该值时采用，否则进行多角度识别投票
+CLS_MIN_CONFIDENCE = 0.5
+# 多角度识别投票使用的文本行数量
+VOTE_LINES = 4
+# 各级方向检测的名称
+ORIENTATION_TIERS = {"pixel": "像素分析", "cls": "方向分类", "vote": "多角度识别"}
+# 参与方向分类投票的文本行数量
+CLS_SAMPLE_LINES = 8
+# 文本框长宽比超过该值才视为明确的横排/竖排文本行
+LINE_ASPECT_RATIO = 1.5
+# 提前结束模式下每页每轮识别的文本行数
+RECOGNIZE_BATCH_LINES = 6
+# 报告编号所在文本行的置信度达到该值才提前结束识别
+EARLY_EXIT_MIN_SCORE = 0.8
+# 低于该置信度的文本行丢弃（与PaddleOCR默认的 drop_score 一致）
+DROP_SCORE = 0.5
+
+
+def to_ocr_array(img):
+    """将PIL图像转换为PaddleOCR使用的BGR数组"""
+    if isinstance(img, np.ndarray):
+        return img
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    return np.ascontiguousarray(np.asarray(img)[:, :, ::-1])
+
+
+def make_thumbnail(img, max_side=THUMBNAIL_SIZE):
+    """生成方向检测用的缩略图，返回(缩略图, 缩放比例)"""
+    width, height = img.size
+    scale = min(1.0, max_side / float(max(width, height)))
+    if scale >= 1.0:
+        return img, 1.0
+    size = (max(1, int(width * scale)), max(1, int(height * scale)))
+    return img.resize(size, Image.BILINEAR), scale
+
+
+def box_bounds(box, scale=1.0):
+    """四点文本框转换为外接矩形 (x0, y0, x1, y1)，并按缩放比例还原到原图坐标"""
+    xs = [point[0] for point in box]
+    ys = [point[1] for point in box]
+    return (
+        int(min(xs) / scale), int(min(ys) / scale),
+        int(max(xs) / scale) + 1, int(max(ys) / scale) + 1,
+    )
+
+
+def detect_boxes(ocr, img):
+    """只运行文本检测，返回文本框列表"""
+    result = ocr.ocr(to_ocr_array(img), det=True, rec=False, cls=False)
+    if result and result[0]:
+        return result[0]
+    return []
+
+
+def detect_pages(ocr, pages):
+    """检测多页的文本框；OCR服务客户端（有 ocr_batch()）一次提交所有页面，减少往返"""
+    if hasattr(ocr, "ocr_batch"):
+        results = ocr.ocr_batch(pages, det=True, rec=False, cls=False)
+        return [result[0] if result and result[0] else [] for result in results]
+    return [detect_boxes(ocr, pixels) for pixels in pages]
+
+
+def classify_crops(ocr, crops):
+    """用方向分类器判断文本行切片是否倒置，返回(正向得分, 倒置得分)"""
+    if not crops:
+        return 0.0, 0.0
+    # 切片列表作为一个元素传入，一次分类所有切片，result[0] 与 crops 一一对应
+    result = ocr.ocr([[to_ocr_array(crop) for crop in crops]], det=False, rec=False, cls=True)
+    upright = 0.0
+    flipped = 0.0
+    for label, score in (result[0] if result else []) or []:
+        if label == '180':
+            flipped += score
+        else:
+            upright += score
+    return upright, flipped
+
+
+def long_runs(mask, length):
+    """返回 mask 中属于长度不小于 length 的水平连续墨迹的像素"""
+    height, width = mask.shape
+    if length > width:
+        return np.zeros_like(mask)
+    counts = np.zeros((height, width + 1), dtype=np.int32)
+    np.cumsum(mask, axis=1, out=counts[:, 1:])
+    # full[:, j] 表示从 j 开始的 length 个像素都是墨迹
+    full = (counts[:, length:] - counts[:, :-length]) == length
+    starts = np.zeros((height, full.shape[1] + 1), dtype=np.int32)
+    np.cumsum(full, axis=1, out=starts[:, 1:])
+    # 像素 j 被某个从 [j-length+1, j] 开始的连续段覆盖
+    columns = np.arange(width)
+    low = np.clip(columns - length + 1, 0, full.shape[1])
+    high = np.clip(columns + 1, 0, full.shape[1])
+    return (starts[:, high] - starts[:, low]) > 0
+
+
+def text_mask(img, max_side=PIXEL_THUMBNAIL_SIZE):
+    """在缩略图上提取文字墨迹（去掉表格线），返回 (布尔数组, 缩放比例)
+
+    按三个通道中的最大值二值化（Otsu阈值），红色印章和浅色水印不算墨迹。
+    """
+    thumb, scale = make_thumbnail(img, max_side)
+    pixels = np.asarray(thumb.convert('RGB')).max(axis=2)
+    histogram = np.bincount(pixels.ravel(), minlength=256).astype(np.float64)
+    weights = np.cumsum(histogram) / histogram.sum()
+    means = np.cumsum(histogram * np.arange(256)) / histogram.sum()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        between = (means[-1] * weights - means) ** 2 / (weights * (1 - weights))
+    mask = pixels <= int(np.nanargmax(between))
+
+    rule = max(8, int(min(mask.shape) * RULE_FRACTION))
+    mask &= ~long_runs(mask, rule)
+    mask &= ~long_runs(mask.T, rule).T
+    return mask, scale
+
+
+def _strips(mask):
+    """把 mask 按列分成 PIXEL_STRIPS 条，返回 [(起始列, 子数组), ...]"""
+    width = mask.shape[1]
+    bounds = [width * index // PIXEL_STRIPS for index in range(PIXEL_STRIPS + 1)]
+    return [(bounds[index], mask[:, bounds[index]:bounds[index + 1]]) for index in range(PIXEL_STRIPS)]
+
+
+def _runs(flags, min_length=3):
+    """返回布尔序列中长度不小于 min_length 的连续 True 段 [(起点, 终点), ...]"""
+    padded = np.concatenate(([False], flags, [False])).astype(np.int8)
+    changes = np.flatnonzero(np.diff(padded))
+    return [(start, end) for start, end in zip(changes[::2], changes[1::2]) if end - start >= min_length]
+
+
+def gap_fraction(mask):
+    """文本行为水平方向时行与行之间的空白行比例（各条的平均值）"""
+    fractions = []
+    for _, strip in _strips(mask):
+        rows = strip.sum(axis=1)
+        ink = np.flatnonzero(rows)
+        if len(ink) < 10:
+            continue
+        fractions.append(float((rows[ink[0]:ink[-1] + 1] == 0).mean()))
+    return sum(fractions) / len(fractions) if fractions else 0.0
+
+
+def text_lines(mask):
+    """按行投影切出水平文本行，返回 [(x0, y0, x1, y1), ...]（过高的行如印章、标志不计）"""
+    lines = []
+    for offset, strip in _strips(mask):
+        bands = _runs(strip.sum(axis=1) > 0)
+        if not bands:
+            continue
+        median = np.median([end - start for start, end in bands])
+        for start, end in bands:
+            if end - start > median * 2.5:
+                continue
+            columns = np.flatnonzero(strip[start:end].any(axis=0))
+            lines.append((offset + int(columns[0]), int(start), offset + int(columns[-1]) + 1, int(end)))
+    return lines
+
+
+def line_centroid(mask, lines):
+    """文本行内墨迹重心相对行中线的偏移（行高的比例，按墨迹量加权），负值表示偏上"""
+    total = 0.0
+    weight = 0.0
+    for x0, y0, x1, y1 in lines:
+        profile = mask[y0:y1, x0:x1].sum(axis=1).astype(np.float64)
+        ink = profile.sum()
+        if not ink:
+            continue
+        positions = (np.arange(y1 - y0) + 0.5) / (y1 - y0)
+        total += ((profile * positions).sum() / ink - 0.5) * ink
+        weight += ink
+    return total / weight if weight else 0.0
+
+
+def pixel_orientation(img):
+    """像素分析：返回 (角度, 置信度, 文本行方向的置信度, 转为横排后的 mask, 缩放比例)"""
+    mask, scale = text_mask(img)
+    if mask.mean() < BLANK_INK_FRACTION:
+        # 空白页不需要转正
+        return 0, 1.0, 1.0, mask, scale
+
+    # 横排文本在行方向上有规律的行间空白，竖排（页面转了90/270度）则在列方向上
+    horizontal, vertical = gap_fraction(mask), gap_fraction(mask.T)
+    direction_confidence = abs(horizontal - vertical) / max(horizontal, vertical, 1e-6)
+    base_angle = 0 if horizontal >= vertical else 90
+    # np.rot90 与 PIL 相同，正角度为逆时针
+    mask = np.rot90(mask, base_angle // 90)
+
+    # 汉字墨迹重心略偏上，倒置的页面偏下
+    centroid = line_centroid(mask, text_lines(mask))
+    angle = base_angle if centroid <= 0 else (base_angle + 180) % 360
+    confidence = min(direction_confidence, abs(centroid) / CENTROID_FULL_CONFIDENCE, 1.0)
+    return angle, confidence, direction_confidence, mask, scale
+
+
+def line_crops(img, mask, scale, base_angle, count=CLS_SAMPLE_LINES):
+    """按像素分析切出的文本行，从按 base_angle 旋转后的原图中切出最宽的几行"""
+    lines = [(x0, y0, x1, y1) for x0, y0, x1, y1 in text_lines(mask)
+             if x1 - x0 > (y1 - y0) * LINE_ASPECT_RATIO]
+    lines.sort(key=lambda line: line[2] - line[0], reverse=True)
+    if base_angle:
+        img = img.rotate(base_angle, expand=True)
+    crops = []
+    for x0, y0, x1, y1 in lines[:count]:
+        pad = 2
+        crops.append(img.crop((max(0, int((x0 - pad) / scale)), max(0, int((y0 - pad) / scale)),
+                               min(img.width, int((x1 + pad) / scale) + 1),
+                               min(img.height, int((y1 + pad) / scale) + 1))))
+    return crops
+
+
+def vote_orientation(ocr, img, angles):
+    """多角度识别投票：把面积最大的几行文本按各候选角度识别，返回 (角度, 置信度)"""
+    thumb, scale = make_thumbnail(img)
+    bounds = [box_bounds(box, scale) for box in detect_boxes(ocr, thumb)]
+    if not bounds:
+        return 0, 0.0
+    largest = sorted(bounds, key=lambda b: (b[2] - b[0]) * (b[3] - b[1]), reverse=True)[:VOTE_LINES]
+    crops = [img.crop(bound) for bound in largest]
+    # 所有角度的切片一起识别
+    images = [crop.rotate(angle, expand=True) if angle else crop for angle in angles for crop in crops]
+    # 切片列表作为一个元素传入，一次识别所有切片，result[0] 与 images 一一对应
+    result = ocr.ocr([[to_ocr_array(image) for image in images]], det=False, rec=True, cls=False)
+    scores = [score for _, score in (result[0] if result else []) or []]
+    if len(scores) != len(images):
+        return 0, 0.0
+    means = [sum(scores[index:index + len(crops)]) / len(crops)
+             for index in range(0, len(scores), len(crops))]
+    ranked = sorted(zip(means, angles), reverse=True)
+    best, angle = ranked[0]
+    runner_up = ranked[1][0] if len(ranked) > 1 else 0.0
+    return angle, (best - runner_up) / best if best else 0.0
+
+
+def detect_orientation(ocr, img):
+    """分级检测页面方向
+
+    返回 (角度, 级别, 置信度)。角度为需要对图像执行的 PIL 逆时针旋转角度，
+    级别为 ORIENTATION_TIERS 中的名称，表示在哪一级确定了方向。
+    """
+    angle, confidence, direction_confidence, mask, scale = pixel_orientation(img)
+    if confidence >= PIXEL_MIN_CONFIDENCE:
+        return angle, "pixel", confidence
+
+    base_angle = angle % 180
+    if direction_confidence >= DIRECTION_MIN_CONFIDENCE:
+        # 横排/竖排已确定，由方向分类器对像素分析切出的文本行投票区分正向/倒置
+        upright, flipped = classify_crops(ocr, line_crops(img, mask, scale, base_angle))
+        if upright + flipped:
+            confidence = abs(upright - flipped) / (upright + flipped)
+            if confidence >= CLS_MIN_CONFIDENCE:
+                return (base_angle + 180) % 360 if flipped > upright else base_angle, "cls", confidence
+        angles = (base_angle, base_angle + 180)
+    else:
+        angles = (0, 90, 180, 270)
+
+    angle, confidence = vote_orientation(ocr, img, angles)
+    return angle, "vote", confidence
+
+
+def sort_boxes(boxes):
+    """文本框按从上到下、从左到右排序"""
+    return sorted(boxes, key=lambda box: (min(point[1] for point in box), min(point[0] for point in box)))
+
+
+def crop_box(pixels, box):
+    """按文本框外接矩形从BGR数组中切出文本行"""
+    height, width = pixels.shape[:2]
+    x0, y0, x1, y1 = box_bounds(box)
+    x0, y0 = max(0, x0), max(0, y0)
+    x1, y1 = min(width, max(x0 + 1, x1)), min(height, max(y0 + 1, y1))
+    return np.ascontiguousarray(pixels[y0:y1, x0:x1])
+
+
+def recognize_pages(ocr, images, matcher=None, cls=False, batch_lines=RECOGNIZE_BATCH_LINES,
+                    min_score=EARLY_EXIT_MIN_SCORE, renderers=None):
+    """一起识别多页（PIL图像或BGR数组），返回与 images 一一对应的 [(文本框, (文本, 置信度)), ...]
+
+    各页分别检测文本框，所有页的文本行切片合并成一批交给识别模型，再按页拆分结果。
+    renderers 与 images 一一对应，不为 None 的页面只在 images 上检测，文本行切片由
+    render.ClipRenderer 从PDF中按识别分辨率重新渲染（images 为低分辨率页面）。
+    matcher（见 report_numbers.py）为 None 时一次识别各页全部文本行；否则各页按从上到下的顺序每轮只取 batch_lines 行，
+    某行以不低于 min_score 的置信度匹配到报告编号后该页不再继续识别，
+    未匹配的页面会一直识别到最后一行（编号只在页脚的续页仍按整页识别）。
+    """
+    pages = [to_ocr_array(img) for img in images]
+    boxes = [sort_boxes(page_boxes) for page_boxes in detect_pages(ocr, pages)]
+    lines = [[] for _ in pages]
+    positions = [0] * len(pages)
+    active = [index for index in range(len(pages)) if boxes[index]]
+
+    while active:
+        # 本轮各页要识别的文本行 [(页序号, 文本框), ...]
+        jobs = []
+        for index in active:
+            step = len(boxes[index]) if matcher is None else batch_lines
+            batch = boxes[index][positions[index]:positions[index] + step]
+            positions[index] += len(batch)
+            jobs.extend((index, box) for box in batch)
+
+        crops = [renderers[index].crop(box_bounds(box)) if renderers and renderers[index] is not None
+                 else crop_box(pages[index], box) for index, box in jobs]
+        # 切片列表作为一个元素传入才是一次批量识别（PaddleOCR把外层列表的每个元素当作一张图像），
+        # 结果在 result[0] 中与 crops 一一对应
+        result = ocr.ocr([crops], det=False, rec=True, cls=cls)
+
+        matched = set()
+        for (index, box), (text, score) in zip(jobs, (result[0] if result else []) or []):
+            if score < DROP_SCORE:
+                continue
+            lines[index].append([box, (text, score)])
+            if matcher is not None and score >= min_score and matcher.search(text) is not None:
+                matched.add(index)
+        active = [index for index in active
+                  if index not in matched and positions[index] < len(boxes[index])]
+    return lines
+
+
+def lines_to_text(lines):
+    """将识别结果拼接为文本"""
+    return " ".join(line[1][0] for line in lines)
+
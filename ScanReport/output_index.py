@@ -0,0 +1,88 @@
+"""输出索引
+
+在导出文件夹中记录每个已生成的报告PDF包含哪些页面（页面像素、原始压缩图像数据或原样复制的页面对象的哈希），
+后续批次遇到同一报告编号时据此只追加新页面，跳过重复扫描的页面：
+    {"reports": {报告名称: {"category": ..., "path": ..., "pages": [页面哈希, ...]}}}
+path 为相对导出文件夹的路径。
+"""
+import os
+import json
+import hashlib
+import logging
+
+# 索引文件名（位于导出文件夹中）
+INDEX_FILE_NAME = ".scanreport_index.json"
+
+
+def page_hash(image):
+    """按页面像素计算哈希（同一扫描文件在相同设置下光栅化的结果相同）"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}".encode("ascii"))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def stream_hash(image, rotate=0):
+    """按原样复制的压缩图像数据（pdf_writer.EncodedImage）计算哈希，不解码像素"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{image.filter_name}:{image.width}x{image.height}:{rotate}".encode("ascii"))
+    digest.update(image.data)
+    return digest.hexdigest()
+
+
+def objects_hash(objects):
+    """按原样复制的页面对象（render.copy_page_objects() 的对象列表）计算哈希"""
+    digest = hashlib.blake2b(digest_size=16)
+    for _, body, stream in objects:
+        digest.update(body)
+        if stream is not None:
+            digest.update(stream)
+    return digest.hexdigest()
+
+
+class OutputIndex:
+    """导出文件夹中报告PDF的页面索引"""
+
+    def __init__(self, export_folder):
+        self.export_folder = export_folder
+        self.path = os.path.join(export_folder, INDEX_FILE_NAME)
+        self.reports = {}
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.reports = json.load(f).get("reports", {})
+        except (OSError, ValueError) as e:
+            logging.error(f"读取输出索引失败 {self.path}: {str(e)}")
+            self.reports = {}
+
+    def pages(self, name, path):
+        """返回报告已包含的页面哈希；索引中没有记录或记录的文件不是 path 时返回空集合"""
+        record = self.reports.get(name)
+        if record is None or os.path.join(self.export_folder, record["path"]) != path:
+            return set()
+        return set(record["pages"])
+
+    def update(self, name, category, path, hashes, append=True):
+        """记录报告PDF新写入的页面，append 为 False 时替换原有记录"""
+        record = self.reports.get(name)
+        relative = os.path.relpath(path, self.export_folder)
+        if not append or record is None or record["path"] != relative:
+            record = {"category": category, "path": relative, "pages": []}
+            self.reports[name] = record
+        record["pages"].extend(hashes)
+        self._dirty = True
+
+    def save(self):
+        """写入索引文件（先写临时文件再替换）"""
+        if not self._dirty:
+            return
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"reports": self.reports}, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+        self._dirty = False
@@ -0,0 +1,346 @@
+"""逐页追加写入的PDF生成器
+
+每添加一页就把该页的图像、内容流和页面对象直接追加写入文件，
+内存中只保留各对象的偏移量，报告页数再多内存占用也基本不变。
+图像以JPEG（DCTDecode）或1位Flate压缩流写入，不再经过PIL整份保存；
+其他PDF的页面（数字生成的报告）可以连同其引用的对象原样复制。
+也可以打开已有的PDF，以增量更新的方式只在文件末尾追加新页面，不改写已有内容。
+"""
+import io
+import os
+import re
+import zlib
+
+from PIL import ImageChops
+
+# 页面图像的JPEG压缩质量
+JPEG_QUALITY = 85
+
+# 判断灰度图像时，各颜色通道允许的最大差值
+GRAY_TOLERANCE = 16
+
+
+class EncodedImage:
+    """已压缩、可直接写入PDF的图像流"""
+
+    def __init__(self, data, width, height, colorspace, filter_name="DCTDecode", bits=8, decode=None,
+                 decode_parms=None):
+        self.data = data                # 压缩后的图像数据
+        self.width = width              # 像素宽度
+        self.height = height            # 像素高度
+        self.colorspace = colorspace    # DeviceRGB / DeviceGray / DeviceCMYK
+        self.filter_name = filter_name  # DCTDecode / FlateDecode / CCITTFaxDecode / JPXDecode
+        self.bits = bits                # 每个颜色分量的位数
+        self.decode = decode            # 可选的 /Decode 数组
+        self.decode_parms = decode_parms  # 可选的 /DecodeParms 字典（PDF语法的 bytes，原样写入）
+
+
+def is_grayscale(img):
+    """在缩略图上判断RGB图像是否实际为灰度图像"""
+    if img.mode in ('1', 'L'):
+        return True
+    if img.mode != 'RGB':
+        return False
+    thumb = img.resize((64, 64))
+    red, green, blue = thumb.split()
+    return (ImageChops.difference(red, green).getextrema()[1] <= GRAY_TOLERANCE
+            and ImageChops.difference(green, blue).getextrema()[1] <= GRAY_TOLERANCE)
+
+
+def encode_image(img, quality=JPEG_QUALITY):
+    """将PIL图像压缩为PDF图像流
+
+    黑白图像使用1位Flate压缩，灰度图像按单通道JPEG压缩，其余按RGB JPEG压缩。
+    """
+    width, height = img.size
+    if img.mode == '1':
+        return EncodedImage(zlib.compress(img.tobytes()), width, height, "DeviceGray",
+                            filter_name="FlateDecode", bits=1)
+
+    if is_grayscale(img):
+        img = img.convert('L')
+        colorspace = "DeviceGray"
+    else:
+        img = img.convert('RGB')
+        colorspace = "DeviceRGB"
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=quality, optimize=True)
+    return EncodedImage(buffer.getvalue(), width, height, colorspace)
+
+
+# PDF对象中的间接引用 "对象号 0 R"
+_REFERENCE = re.compile(rb"(?<![\d.])(\d+)\s+0\s+R\b")
+
+# 增量追加时读取文件末尾的字节数（用于查找 startxref）
+_TAIL_SIZE = 2048
+
+
+class StreamingPdfWriter:
+    """逐页追加写入的PDF文件
+
+    新建时写入过程中使用 ".part" 临时文件，close() 成功后才替换为目标文件，
+    abort() 会删除未完成的文件。
+    append=True 时打开已有的PDF，新页面和更新后的页面树作为增量更新写在原文件末尾，
+    abort() 把文件截断回原来的长度。只支持使用传统交叉引用表的PDF（本模块生成的文件都是），
+    其他结构抛出 ValueError。
+    """
+
+    # 新建文件时对象1固定为Catalog，对象2固定为Pages，在 close() 时写入
+    _CATALOG_ID = 1
+    _PAGES_ID = 2
+
+    def __init__(self, path, append=False):
+        self.path = path
+        self.append = append
+        self.page_count = 0        # 本次写入的页数
+        self.existing_pages = 0    # 追加前文件已有的页数
+        self._offsets = {}
+        self._page_ids = []
+        self._copied = {}          # 已原样复制的对象 {(源文件, 源对象号): 本文件对象号}
+        if append:
+            self.part_path = path
+            self._open_existing()
+        else:
+            self.part_path = path + ".part"
+            self._pages_id = self._PAGES_ID
+            self._old_kids = b""
+            self._prev_xref = None
+            self._next_id = 3
+            self._position = 0
+            self._base_size = 0
+            self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n", mode='wb')
+
+    def _open_existing(self):
+        """读取已有PDF的文件尾、交叉引用表和页面树，准备增量追加"""
+        with open(self.path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - _TAIL_SIZE))
+            tail = f.read()
+            tail_start = max(0, size - _TAIL_SIZE)
+
+            # 上次追加中途崩溃时 %%EOF 之后可能残留不完整的内容，截掉
+            eof = tail.rfind(b"%%EOF")
+            if eof < 0:
+                raise ValueError(f"不是完整的PDF文件: {self.path}")
+            end = tail_start + eof + len(b"%%EOF")
+            if tail[eof + 5:eof + 6] == b"\n":
+                end += 1
+
+            match = None
+            for match in re.finditer(rb"startxref\s+(\d+)", tail[:eof]):
+                pass
+            if match is None:
+                raise ValueError(f"找不到交叉引用表: {self.path}")
+            xref_offset = int(match.group(1))
+
+            trailer = self._read_section(f, xref_offset)
+            size_match = re.search(rb"/Size\s+(\d+)", trailer)
+            root_match = re.search(rb"/Root\s+(\d+)\s+0\s+R", trailer)
+            if not size_match or not root_match:
+                raise ValueError(f"无法解析文件尾: {self.path}")
+
+            self._root_id = int(root_match.group(1))
+            catalog = self._read_object(f, xref_offset, self._root_id)
+            pages_match = re.search(rb"/Pages\s+(\d+)\s+0\s+R", catalog)
+            if not pages_match:
+                raise ValueError(f"找不到页面树: {self.path}")
+            self._pages_id = int(pages_match.group(1))
+            pages = self._read_object(f, xref_offset, self._pages_id)
+            kids_match = re.search(rb"/Kids\s*\[([^\]]*)\]", pages)
+            count_match = re.search(rb"/Count\s+(\d+)", pages)
+            if not kids_match or not count_match:
+                raise ValueError(f"无法解析页面树: {self.path}")
+
+        if end < size:
+            os.truncate(self.path, end)
+        self._old_kids = kids_match.group(1).strip()
+        self.existing_pages = int(count_match.group(1))
+        self._prev_xref = xref_offset
+        self._next_id = int(size_match.group(1))
+        self._position = end
+        self._base_size = end
+
+    def _read_until(self, f, offset, marker):
+        """从偏移量开始读取，直到出现 marker"""
+        f.seek(offset)
+        data = b""
+        while marker not in data:
+            chunk = f.read(65536)
+            if not chunk:
+                raise ValueError(f"PDF结构不完整: {self.path}")
+            data += chunk
+        return data[:data.index(marker) + len(marker)]
+
+    def _read_section(self, f, xref_offset):
+        """读取一段交叉引用表及其文件尾"""
+        section = self._read_until(f, xref_offset, b"startxref")
+        if not section.startswith(b"xref"):
+            raise ValueError(f"不支持交叉引用流: {self.path}")
+        return section
+
+    def _read_object(self, f, xref_offset, obj_id):
+        """沿交叉引用表链（/Prev）查找对象并返回其内容"""
+        while xref_offset is not None:
+            section = self._read_section(f, xref_offset)
+            table, _, trailer = section.partition(b"trailer")
+            lines = table.split(b"\n")[1:]
+            index = 0
+            while index < len(lines):
+                header = lines[index].split()
+                index += 1
+                if len(header) != 2:
+                    continue
+                first, count = int(header[0]), int(header[1])
+                if first <= obj_id < first + count:
+                    entry = lines[index + obj_id - first].split()
+                    if entry[2] != b"n":
+                        break
+                    return self._read_until(f, int(entry[0]), b"endobj")
+                index += count
+            prev = re.search(rb"/Prev\s+(\d+)", trailer)
+            xref_offset = int(prev.group(1)) if prev else None
+        raise ValueError(f"找不到对象 {obj_id}: {self.path}")
+
+    def _write(self, data, mode='ab'):
+        # 每次写入都重新以追加模式打开，同时打开大量报告时不会占用过多文件句柄
+        with open(self.part_path, mode) as f:
+            f.write(data)
+        self._position += len(data)
+
+    def _write_objects(self, objects):
+        """依次写入 [(对象号, 字典, 流数据或None), ...] 并记录各对象偏移量"""
+        chunks = []
+        position = self._position
+        for obj_id, body, stream in objects:
+            self._offsets[obj_id] = position
+            if stream is None:
+                chunk = b"%d 0 obj\n%s\nendobj\n" % (obj_id, body)
+            else:
+                chunk = b"%d 0 obj\n%s\nstream\n%s\nendstream\nendobj\n" % (obj_id, body, stream)
+            chunks.append(chunk)
+            position += len(chunk)
+        self._write(b"".join(chunks))
+
+    def _allocate(self, count):
+        first = self._next_id
+        self._next_id += count
+        return range(first, first + count)
+
+    def add_encoded(self, image, dpi, rotate=0):
+        """追加一页，image 为 EncodedImage，rotate 写入页面的 /Rotate"""
+        image_id, content_id, page_id = self._allocate(3)
+        page_width = image.width * 72.0 / dpi
+        page_height = image.height * 72.0 / dpi
+
+        image_dict = (
+            b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /%s "
+            b"/BitsPerComponent %d /Filter /%s /Length %d"
+            % (image.width, image.height, image.colorspace.encode(), image.bits,
+               image.filter_name.encode(), len(image.data))
+        )
+        if image.decode:
+            image_dict += b" /Decode [%s]" % " ".join(str(v) for v in image.decode).encode()
+        if image.decode_parms:
+            image_dict += b" /DecodeParms " + image.decode_parms
+        image_dict += b" >>"
+
+        content = b"q %.2f 0 0 %.2f 0 0 cm /Im0 Do Q" % (page_width, page_height)
+        page_dict = (
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.2f %.2f] "
+            b"/Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R"
+            % (self._pages_id, page_width, page_height, image_id, content_id)
+        )
+        if rotate % 360:
+            page_dict += b" /Rotate %d" % (rotate % 360)
+        page_dict += b" >>"
+
+        self._write_objects([
+            (image_id, image_dict, image.data),
+            (content_id, b"<< /Length %d >>" % len(content), content),
+            (page_id, page_dict, None),
+        ])
+
+        self._page_ids.append(page_id)
+        self.page_count += 1
+
+    def add_copied_page(self, source, objects, page_id, external):
+        """原样追加其他PDF的一页（objects、page_id、external 见 render.copy_page_objects()）
+
+        对象重新编号后写入，同一源文件中已复制过的对象（多页共用的字体、图像等）不再重复写入；
+        页面的 /Parent 指向本文件的页面树，external 中的对象（其他页面）的引用改为 null。
+        """
+        ids = {}
+        new_objects = []
+        for obj_id, body, stream in objects:
+            key = (source, obj_id)
+            if obj_id != page_id and key in self._copied:
+                ids[obj_id] = self._copied[key]
+            else:
+                ids[obj_id] = self._allocate(1)[0]
+                self._copied[key] = ids[obj_id]
+                new_objects.append((obj_id, body, stream))
+
+        def renumber(match):
+            obj_id = int(match.group(1))
+            return b"null" if obj_id in external else b"%d 0 R" % ids[obj_id]
+
+        written = []
+        for obj_id, body, stream in new_objects:
+            body = _REFERENCE.sub(renumber, body)
+            if obj_id == page_id:
+                body = b"<</Parent %d 0 R" % self._pages_id + body[2:]
+            written.append((ids[obj_id], body, stream))
+        self._write_objects(written)
+        self._page_ids.append(ids[page_id])
+        self.page_count += 1
+
+    def add_image(self, img, dpi, rotate=0, quality=JPEG_QUALITY):
+        """压缩PIL图像并追加为一页"""
+        self.add_encoded(encode_image(img, quality), dpi, rotate)
+
+    def close(self):
+        """写入页面树、交叉引用表和文件尾，并替换为目标文件（增量追加时写入增量更新）"""
+        kids = b" ".join([self._old_kids] + [b"%d 0 R" % page_id for page_id in self._page_ids]).strip()
+        objects = [(self._pages_id, b"<< /Type /Pages /Kids [%s] /Count %d >>"
+                    % (kids, self.existing_pages + len(self._page_ids)), None)]
+        if not self.append:
+            objects.append((self._CATALOG_ID, b"<< /Type /Catalog /Pages %d 0 R >>" % self._PAGES_ID, None))
+        self._write_objects(objects)
+
+        # 交叉引用表按连续的对象号分段，第一段总是从空闲对象0开始
+        xref_offset = self._position
+        size = self._next_id
+        sections = [[0]]
+        for obj_id in sorted(self._offsets):
+            if obj_id == sections[-1][-1] + 1:
+                sections[-1].append(obj_id)
+            else:
+                sections.append([obj_id])
+        xref = [b"xref\n"]
+        for section in sections:
+            xref.append(b"%d %d\n" % (section[0], len(section)))
+            for obj_id in section:
+                if obj_id == 0:
+                    xref.append(b"0000000000 65535 f \n")
+                else:
+                    xref.append(b"%010d 00000 n \n" % self._offsets[obj_id])
+
+        root_id = self._root_id if self.append else self._CATALOG_ID
+        trailer = b"<< /Size %d /Root %d 0 R" % (size, root_id)
+        if self._prev_xref is not None:
+            trailer += b" /Prev %d" % self._prev_xref
+        xref.append(b"trailer\n%s >>\nstartxref\n%d\n%%%%EOF\n" % (trailer, xref_offset))
+        self._write(b"".join(xref))
+        if not self.append:
+            os.replace(self.part_path, self.path)
+
+    def abort(self):
+        """放弃写入：新建时删除未完成的文件，增量追加时截断回原来的长度"""
+        try:
+            if self.append:
+                os.truncate(self.path, self._base_size)
+            else:
+                os.remove(self.part_path)
+        except OSError:
+            pass
@@ -0,0 +1,470 @@
+"""批量处理流水线
+
+光栅化、方向校正、文字识别和PDF汇总作为并发阶段运行，阶段之间用有界队列连接。
+文字识别在可配置数量的工作进程中进行，每个进程持有独立的PaddleOCR实例；
+本机OCR服务（ocr_server.py）正在运行时，主进程的OCR实例改为连接服务；小批量时（见 engine.py）
+只启动一个连接服务的识别进程，不再加载模型。
+"""
+import os
+import time
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from orientation import recognize_pages, lines_to_text, to_ocr_array
+from roi import recognize_regions
+from ocr_server import connect_ocr_server, OCR_OPTIONS
+from render import close_document
+from instrument import RunStats, CountingOCR
+from segment import LayoutTracker, HEADER_PROFILES
+from report_numbers import load_matcher
+
+# 参与分类的报告编号类型（见 report_numbers.py），分别输出到 Limis 和 协会 文件夹
+REPORT_CATEGORIES = ("limis", "association")
+
+# 每次提交给识别进程的页数，多页的文本行合并成批识别
+DEFAULT_BATCH_PAGES = 4
+
+# 阶段之间队列的默认容量（页）
+DEFAULT_QUEUE_SIZE = 8
+
+# 默认识别进程数：保留一个核心给光栅化和界面
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+# 队列阻塞时检查停止标志的间隔（秒）
+_POLL_INTERVAL = 0.2
+
+# 阶段结束标记
+_SENTINEL = object()
+
+
+def create_ocr(use_server=True, cpu_threads=None):
+    """创建OCR实例：use_server 为 True 且本机OCR服务正在运行时连接服务，否则加载PaddleOCR模型
+
+    cpu_threads 为本地模型的推理线程数，不指定时使用PaddleOCR的默认值。
+    线程数不影响识别结果，不放入 OCR_OPTIONS（服务参数比较和OCR缓存键不受影响）。
+    """
+    if use_server:
+        remote = connect_ocr_server(OCR_OPTIONS)
+        if remote is not None:
+            return remote
+    # 只在需要本地模型时才导入paddleocr（导入本身就需要数秒）
+    from paddleocr import PaddleOCR
+    options = dict(OCR_OPTIONS)
+    if cpu_threads:
+        options["cpu_threads"] = cpu_threads
+    return PaddleOCR(**options)
+
+
+class Page:
+    """流水线中传递的单页数据
+
+    页面像素始终保存在内存中，不再经过临时图片文件。
+    """
+
+    def __init__(self, seq, source, name, image, dpi, renderer=None):
+        self.seq = seq                # 页面在整个批次中的顺序号
+        self.source = source          # 来源文件路径
+        self.name = name              # 页面名称（未匹配到格式时作为文件名）
+        self.image = image            # 页面图像（RGB），方向校正后为转正后的图像；直接使用PDF文本层时为 None
+        self.dpi = dpi                # 页面图像分辨率，用于确定PDF页面尺寸
+        self.renderer = renderer      # render.ClipRenderer：image 只是检测用的低分辨率页面，
+                                      # 识别和输出时再从PDF按需渲染
+        self.native = None            # 原样复制到输出的原始扫描图像 (EncodedImage, DPI, /Rotate)
+        self.copied = None            # 原样复制到输出的PDF页面（带文本层的页面，见 render.copy_page_objects）
+        self.angle = 0                # 方向校正时旋转的角度
+        self.lines = []               # 识别结果 [(文本框, (文本, 置信度)), ...]
+        self.text = ""                # 识别文本
+        self.error = None             # 识别失败时的错误信息
+        self.cache_key = None         # OCR缓存键（按转正前的页面像素计算）
+        self.cached = False           # 识别结果是否来自缓存、作业日志或PDF文本层（不需要识别）
+        self.roi = None               # 匹配到报告编号的模板区域名称（识别了整页时为 None）
+        self.header_only = False      # 分段模式下与上一页版式相似，只识别页眉和模板区域（见 segment.py）
+
+    def rotate(self, angle):
+        """按 PIL 逆时针角度旋转页面图像"""
+        if angle % 360:
+            if self.image is not None:
+                self.image = self.image.rotate(angle, expand=True)
+            self.angle = (self.angle + angle) % 360
+            if self.renderer is not None:
+                self.renderer.angle = self.angle
+
+
+# 工作进程内的OCR实例
+_worker_ocr = None
+
+
+def _init_worker(use_server=False, cpu_threads=None):
+    """工作进程初始化：use_server 时连接OCR服务，否则加载一次OCR模型"""
+    global _worker_ocr
+    _worker_ocr = create_ocr(use_server=use_server, cpu_threads=cpu_threads)
+
+
+def create_executor(workers=DEFAULT_WORKERS, use_server=False):
+    """创建识别进程池，每个进程启动时加载一次OCR模型
+
+    use_server 时只启动一个进程，通过本机OCR服务识别，不加载模型：服务只有一个OCR实例，
+    所有请求依次执行，多个进程共用服务等于只用一个进程识别。
+    各进程的推理线程数为CPU核心数平分给各进程，避免每个进程都按PaddleOCR默认线程数运行而超额占用CPU。
+    使用spawn启动工作进程，避免在已有线程的进程中fork。
+    """
+    workers = 1 if use_server else max(1, int(workers))
+    cpu_threads = max(1, (os.cpu_count() or 1) // workers)
+    context = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                               initializer=_init_worker, initargs=(use_server, cpu_threads))
+
+
+def _recognize_in_worker(pages, mode, roi_profiles, early_exit, renderers=None, header_only=None, matcher=None):
+    """在工作进程中一起识别一批页面（BGR数组列表），返回各页的 (识别结果, 模板区域名称)
+
+    full 模式下页面已由方向校正阶段转正，只做识别；simple 模式下由方向分类器处理文字方向。
+    提供 roi_profiles 时先只识别各模板区域，都未匹配到报告编号的页面再识别整页；
+    early_exit 时逐批识别文本行，找到报告编号即停止。
+    renderers 与 pages 一一对应，不为 None 的页面只在低分辨率页面上检测，文本行从PDF重新渲染。
+    header_only 与 pages 一一对应，为 True 的页面（分段模式下的续页）只识别页眉和模板区域，
+    都未匹配到报告编号时返回空的识别结果，不识别整页。
+    matcher 为报告编号匹配器（见 report_numbers.py），为 None 时按注册表创建。
+    同时返回识别耗时（秒，不含在进程池中排队的时间）和OCR调用次数。
+    """
+    start = time.perf_counter()
+    matcher = matcher or load_matcher(REPORT_CATEGORIES)
+    ocr = CountingOCR(_worker_ocr)
+
+    def recognize_many(images, image_renderers=None):
+        return recognize_pages(ocr, images, matcher if early_exit else None, cls=(mode == "simple"),
+                               renderers=image_renderers)
+
+    def regions(indexes, profiles):
+        return recognize_regions(recognize_many, [pages[index] for index in indexes], profiles,
+                                 matcher, [renderers[index] for index in indexes] if renderers else None)
+
+    try:
+        results = [(None, None)] * len(pages)
+        header = [index for index, flag in enumerate(header_only or ()) if flag]
+        if header:
+            for index, (lines, roi) in zip(header, regions(header, HEADER_PROFILES + list(roi_profiles or ()))):
+                results[index] = (lines or [], roi)
+        rest = [index for index in range(len(pages)) if index not in header]
+        if roi_profiles and rest:
+            for index, result in zip(rest, regions(rest, roi_profiles)):
+                results[index] = result
+        todo = [index for index, (lines, _) in enumerate(results) if lines is None]
+        todo_renderers = [renderers[index] for index in todo] if renderers else None
+        for index, lines in zip(todo, recognize_many([pages[index] for index in todo], todo_renderers)):
+            results[index] = (lines, None)
+        return results, time.perf_counter() - start, ocr.calls
+    finally:
+        # 不在识别进程中长期占用PDF文件
+        for renderer in renderers or []:
+            if renderer is not None:
+                close_document(renderer.pdf_path)
+
+
+class BatchPipeline:
+    """光栅化 → 方向校正 → 识别 → 汇总 的并发流水线
+
+    rasterize(file_path) 返回该文件各页 (页面名称, 图像, DPI[, ClipRenderer]) 的可迭代对象；
+    orient(page) 在主进程中校正页面方向（simple 模式可为 None）；
+    assemble(page) 在调用 run() 的线程中按页面原始顺序依次处理每一页。
+    cache 为 OcrCache 时，命中缓存的页面跳过方向校正和识别。
+    roi_profiles 为模板区域列表时，先只识别页眉区域（见 roi.py）。
+    early_exit 为 True 时从上到下逐批识别文本行，找到报告编号即停止识别该页。
+    executor 为 create_executor() 创建的进程池时复用其中已加载模型的进程，
+    流水线结束时不关闭它；否则每次 run() 新建并在结束时关闭进程池。
+    batch_pages 为每次提交给识别进程的最大页数，不会为凑满一批而等待上游。
+    resume(page) 返回之前运行中已完成页面的 (角度, 识别文本)，这些页面跳过方向校正和识别。
+    matcher 为报告编号匹配器（见 report_numbers.py），用于页眉区域识别和找到编号即停止，为 None 时按注册表创建。
+    segment 为 True 时（分段模式）与同一文件中上一页版式相似的页面只识别页眉和模板区域（见 segment.py）。
+    stats 为 instrument.RunStats，流水线在其中记录每页 rasterize、orient、ocr 阶段的耗时和计数器
+    （pages、ocr_calls、ocr_batches、cache_hits、resumed_pages、text_layer_pages、header_only_pages），
+    assemble 中的其他阶段由调用方记录；各阶段线程在性能分析模式下通过 stats.profiled() 运行。
+    """
+
+    def __init__(self, rasterize, orient, assemble, mode="full", workers=DEFAULT_WORKERS,
+                 queue_size=DEFAULT_QUEUE_SIZE, log=None, should_stop=None, cache=None,
+                 roi_profiles=None, early_exit=False, executor=None, batch_pages=DEFAULT_BATCH_PAGES,
+                 resume=None, stats=None, segment=False, matcher=None):
+        self.rasterize = rasterize
+        self.orient = orient
+        self.assemble = assemble
+        self.mode = mode
+        self.workers = max(1, int(workers))
+        self.queue_size = max(1, int(queue_size))
+        self.log = log or (lambda message: None)
+        self.should_stop = should_stop or (lambda: False)
+        self.cache = cache
+        self.roi_profiles = roi_profiles or None
+        self.early_exit = bool(early_exit)
+        self.executor = executor
+        self.batch_pages = max(1, int(batch_pages))
+        self.resume = resume
+        self.stats = stats or RunStats()
+        self.layout = LayoutTracker() if segment else None
+        self.matcher = matcher or load_matcher(REPORT_CATEGORIES)
+
+        # 进度计数
+        self.files_done = 0
+        self.pages_produced = 0
+        self.pages_done = 0
+
+        self._stop = threading.Event()
+        self._error = None
+
+    def _stopped(self):
+        return self._stop.is_set() or self.should_stop()
+
+    def _fail(self, error):
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+    def _put(self, q, item):
+        """放入队列，队列满时等待；停止后放弃"""
+        while True:
+            try:
+                q.put(item, timeout=_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                if self._stopped():
+                    return False
+
+    def _get(self, q):
+        """从队列取出，队列空时等待；停止后返回结束标记"""
+        while True:
+            try:
+                return q.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                if self._stopped():
+                    return _SENTINEL
+
+    def _get_ready(self, q):
+        """不等待地从队列取出，队列空时返回 None"""
+        try:
+            return q.get_nowait()
+        except queue.Empty:
+            return None
+
+    def _rasterize_stage(self, files, out_q):
+        try:
+            seq = 0
+            for file_path in files:
+                if self._stopped():
+                    break
+                items = iter(self.rasterize(file_path))
+                while True:
+                    start = time.perf_counter()
+                    item = next(items, None)
+                    if item is None or self._stopped():
+                        break
+                    self.stats.add("rasterize", time.perf_counter() - start, item[0])
+                    if not self._put(out_q, Page(seq, file_path, *item)):
+                        break
+                    seq += 1
+                    self.pages_produced += 1
+                self.files_done += 1
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(out_q, _SENTINEL)
+
+    def _lookup_cache(self, page):
+        """按转正前的页面像素查找缓存，命中时直接套用缓存的方向和识别结果
+
+        缓存键包含识别设置：按需分辨率时文本行从PDF按 recognize_dpi 重新渲染后识别，
+        否则直接识别页面图像（page.dpi），两者的识别结果不能混用。
+        """
+        if page.renderer is not None:
+            recognize = ("clip", page.renderer.recognize_dpi)
+        else:
+            recognize = ("page", page.dpi)
+        page.cache_key = self.cache.key(page.image.tobytes(), page.image.size, self.mode,
+                                        self.roi_profiles, self.early_exit, self.matcher.fingerprint,
+                                        recognize)
+        hit = self.cache.get(page.cache_key)
+        if hit is None:
+            return
+        angle, lines = hit
+        page.rotate(angle)
+        page.lines = lines
+        page.text = lines_to_text(lines)
+        page.cached = True
+        self.stats.count("cache_hits")
+
+    def _resume_page(self, page):
+        """套用作业日志中该页的方向和识别文本"""
+        hit = self.resume(page)
+        if hit is None:
+            return
+        angle, text = hit
+        page.rotate(angle)
+        page.text = text
+        page.cached = True
+        self.stats.count("resumed_pages")
+
+    def _use_text_layer(self, page):
+        """直接使用PDF文本层（见 render.iter_detect_pages），不做方向校正和识别"""
+        page.text = page.renderer.text
+        page.cached = True
+        self.stats.count("text_layer_pages")
+
+    def _check_layout(self, page):
+        """分段模式：与同一文件中上一页版式相似的待识别页面只识别页眉和模板区域"""
+        if self.layout.similar_to_previous(page) and not page.cached:
+            page.header_only = True
+            self.stats.count("header_only_pages")
+
+    def _orient_stage(self, in_q, out_q):
+        try:
+            while True:
+                page = self._get(in_q)
+                if page is _SENTINEL or self._stopped():
+                    break
+                with self.stats.span("orient", page.name):
+                    if self.resume is not None:
+                        self._resume_page(page)
+                    if page.renderer is not None and page.renderer.text and not page.cached:
+                        self._use_text_layer(page)
+                    if self.cache is not None and not page.cached:
+                        self._lookup_cache(page)
+                    if self.orient is not None and not page.cached:
+                        self.orient(page)
+                    if self.layout is not None:
+                        self._check_layout(page)
+                if not self._put(out_q, page):
+                    break
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(out_q, _SENTINEL)
+
+    def _recognize_stage(self, in_q, out_q):
+        executor = self.executor or create_executor(self.workers)
+        # 同时提交给进程池和等待排序的页数上限，保证内存占用有界
+        max_in_flight = self.workers * max(2, self.batch_pages)
+        # 已提交的批次 {future: [页面, ...]}
+        in_flight = {}
+        # 已识别完成、等待前序页面的页 {顺序号: 页面}
+        pending = {}
+        next_seq = 0
+        exhausted = False
+        try:
+            while not (exhausted and not in_flight and not pending):
+                # 取到不需要识别的页面后先按顺序输出，不继续等待上游
+                ready = False
+                while (not exhausted and not ready and not self._stopped()
+                       and sum(map(len, in_flight.values())) + len(pending) < max_in_flight):
+                    batch = []
+                    while len(batch) < self.batch_pages:
+                        # 第一页等待上游，之后只取已经就绪的页面
+                        page = self._get(in_q) if not batch else self._get_ready(in_q)
+                        if page is None:
+                            break
+                        if page is _SENTINEL:
+                            exhausted = True
+                            break
+                        if page.cached:
+                            pending[page.seq] = page
+                            ready = True
+                            break
+                        batch.append(page)
+                    if batch:
+                        renderers = [page.renderer for page in batch]
+                        header_only = [page.header_only for page in batch]
+                        future = executor.submit(_recognize_in_worker,
+                                                 [to_ocr_array(page.image) for page in batch],
+                                                 self.mode, self.roi_profiles, self.early_exit,
+                                                 renderers if any(renderers) else None,
+                                                 header_only if any(header_only) else None,
+                                                 self.matcher)
+                        in_flight[future] = batch
+                if self._stopped():
+                    break
+
+                if in_flight:
+                    done, _ = wait(list(in_flight), timeout=0 if ready else _POLL_INTERVAL,
+                                   return_when=FIRST_COMPLETED)
+                    for future in done:
+                        batch = in_flight.pop(future)
+                        try:
+                            results, elapsed, calls = future.result()
+                            # 一批页面一起识别，耗时按页平均分摊
+                            for page in batch:
+                                self.stats.add("ocr", elapsed / len(batch), page.name)
+                            self.stats.count("ocr_calls", calls)
+                            self.stats.count("ocr_batches")
+                        except Exception as e:
+                            # 整批识别失败，批内各页都记录错误
+                            for page in batch:
+                                page.error = str(e)
+                                pending[page.seq] = page
+                            continue
+                        for page, (lines, roi) in zip(batch, results):
+                            try:
+                                page.lines, page.roi = lines, roi
+                                page.text = lines_to_text(page.lines)
+                                # 只识别了页眉的续页不缓存，以免其他设置下命中不完整的结果
+                                if self.cache is not None and not page.header_only:
+                                    self.cache.put(page.cache_key, page.angle, page.lines)
+                            except Exception as e:
+                                page.error = str(e)
+                            pending[page.seq] = page
+
+                # 按原始顺序向下游输出，保证报告中的页序与输入一致
+                while next_seq in pending:
+                    if not self._put(out_q, pending.pop(next_seq)):
+                        break
+                    next_seq += 1
+        except Exception as e:
+            self._fail(e)
+        finally:
+            if executor is self.executor:
+                # 共用的进程池保留给下一次运行，只取消本次未开始的批次
+                for future in in_flight:
+                    future.cancel()
+            else:
+                executor.shutdown(wait=not self._stopped(), cancel_futures=True)
+            self._put(out_q, _SENTINEL)
+
+    def _assemble_stage(self, in_q):
+        try:
+            while True:
+                page = self._get(in_q)
+                if page is _SENTINEL or self._stopped():
+                    break
+                self.assemble(page)
+                self.pages_done += 1
+                self.stats.count("pages")
+        except Exception as e:
+            self._fail(e)
+
+    def run(self, files):
+        """运行流水线，直到所有页面处理完毕或被停止"""
+        raster_q = queue.Queue(maxsize=self.queue_size)
+        orient_q = queue.Queue(maxsize=self.queue_size)
+        result_q = queue.Queue(maxsize=self.queue_size)
+
+        profiled = self.stats.profiled
+        threads = [
+            threading.Thread(target=profiled(self._rasterize_stage), args=(list(files), raster_q),
+                             name="rasterize", daemon=True),
+            threading.Thread(target=profiled(self._orient_stage), args=(raster_q, orient_q),
+                             name="orient", daemon=True),
+            threading.Thread(target=profiled(self._recognize_stage), args=(orient_q, result_q),
+                             name="recognize", daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+
+        self.log(f"启动 {self.workers} 个识别进程")
+        try:
+            profiled(self._assemble_stage)(result_q)
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+
+        if self._error is not None:
+            raise self._error
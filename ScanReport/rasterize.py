@@ -0,0 +1,37 @@
+"""PDF页面光栅化
+
+按页码区间分段调用 pdf2image，每段渲染完即逐页交给下游，
+整份文档不会同时驻留在内存中。
+"""
+import pdf2image
+
+# 默认渲染分辨率
+DEFAULT_DPI = 200
+
+# 一次渲染并驻留内存的最大页数
+MAX_PAGES_IN_MEMORY = 4
+
+
+def pdf_page_count(pdf_path):
+    """读取PDF页数"""
+    info = pdf2image.pdfinfo_from_path(pdf_path)
+    return int(info["Pages"])
+
+
+def iter_pdf_pages(pdf_path, dpi=DEFAULT_DPI, max_pages=MAX_PAGES_IN_MEMORY):
+    """逐页生成 (页码, PIL图像)，页码从1开始
+
+    内存中最多同时保留 max_pages 页已渲染的图像。
+    """
+    max_pages = max(1, int(max_pages))
+    total = pdf_page_count(pdf_path)
+    for first_page in range(1, total + 1, max_pages):
+        last_page = min(first_page + max_pages - 1, total)
+        images = pdf2image.convert_from_path(
+            pdf_path, dpi=dpi, first_page=first_page, last_page=last_page
+        )
+        for offset in range(len(images)):
+            img = images[offset]
+            # 交给下游后立即释放本段列表中的引用
+            images[offset] = None
+            yield first_page + offset, img
@@ -0,0 +1,337 @@
+"""按需分辨率渲染PDF页面（PyMuPDF）
+
+文本检测和方向检测不需要高分辨率：先以 DETECT_DPI 渲染整页，只用于检测；
+识别时只把检测到的文本框作为裁剪区域（clip）从PDF中按识别分辨率重新渲染，
+整页从不以高分辨率渲染。归档输出优先使用页面中嵌入的原始扫描图像（按其原始分辨率解码），
+没有单张整页图像的页面才按输出分辨率渲染。
+原始扫描图像的压缩格式可以直接写入PDF时，连解码也省去，压缩数据原样复制到输出文件。
+数字生成的PDF页面带有可提取的文本层，直接用文本层匹配报告编号，不渲染也不OCR，输出时原样复制页面。
+ScanReport 和 localscan 共用本模块。
+"""
+import re
+import collections
+
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image
+
+from pdf_writer import EncodedImage
+
+# 文本检测和方向检测使用的渲染分辨率
+DETECT_DPI = 100
+
+# 识别文本行时的渲染分辨率
+RECOGNIZE_DPI = 200
+
+# 嵌入图像至少覆盖页面面积的该比例，才视为整页扫描图像
+NATIVE_COVERAGE = 0.95
+
+# 可以原样复制到输出PDF的图像压缩格式
+PASSTHROUGH_FILTERS = ("DCTDecode", "JPXDecode", "CCITTFaxDecode", "FlateDecode")
+
+# 可以原样复制的颜色空间（其他颜色空间需要引用额外的对象）
+PASSTHROUGH_COLORSPACES = ("DeviceRGB", "DeviceGray", "DeviceCMYK")
+
+# 文本层至少包含这么多个非空白字符才直接使用（扫描件没有文本层或只有零星字符）
+TEXT_LAYER_MIN_CHARS = 20
+
+# 页面从页面树继承的属性（原样复制页面时写入页面字典）
+INHERITED_KEYS = ("Resources", "MediaBox", "CropBox", "Rotate")
+
+# PDF对象中的间接引用 "对象号 0 R"
+_REFERENCE = re.compile(rb"(?<![\d.])(\d+)\s+0\s+R\b")
+_PARENT = re.compile(rb"/Parent\s*\d+\s+0\s+R")
+
+# 每个进程同时保持打开的PDF数量
+_MAX_OPEN_DOCUMENTS = 4
+
+# 已打开的PDF {路径: fitz.Document}（识别进程和主进程各自持有）
+_documents = collections.OrderedDict()
+
+
+def open_document(pdf_path):
+    """打开PDF并缓存句柄，同一进程中反复裁剪渲染时不重复打开"""
+    doc = _documents.pop(pdf_path, None)
+    if doc is None:
+        doc = fitz.open(pdf_path)
+        while len(_documents) >= _MAX_OPEN_DOCUMENTS:
+            _documents.popitem(last=False)[1].close()
+    _documents[pdf_path] = doc
+    return doc
+
+
+def close_document(pdf_path):
+    """关闭缓存的PDF句柄"""
+    doc = _documents.pop(pdf_path, None)
+    if doc is not None:
+        doc.close()
+
+
+def count_pages(pdf_path):
+    """返回PDF的页数，无法打开时返回 0"""
+    try:
+        with fitz.open(pdf_path) as doc:
+            return doc.page_count
+    except Exception:
+        return 0
+
+
+def pixmap_to_array(pix):
+    """将PyMuPDF渲染结果转换为BGR数组"""
+    samples = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+    if pix.n < 3:
+        return np.ascontiguousarray(np.repeat(samples[:, :, :1], 3, axis=2))
+    return np.ascontiguousarray(samples[:, :, 2::-1])
+
+
+def pixmap_to_image(pix):
+    """将PyMuPDF渲染结果转换为PIL图像（RGB或灰度）"""
+    if pix.alpha:
+        pix = fitz.Pixmap(pix, 0)
+    mode = "L" if pix.n == 1 else "RGB"
+    return Image.frombytes(mode, (pix.width, pix.height), pix.samples)
+
+
+def inherited_attributes(doc, page_xref):
+    """返回页面字典中没有、从页面树继承的属性（PDF语法的 bytes）"""
+    result = b""
+    for key in INHERITED_KEYS:
+        if doc.xref_get_key(page_xref, key)[0] != "null":
+            continue
+        xref = page_xref
+        while True:
+            kind, parent = doc.xref_get_key(xref, "Parent")
+            if kind != "xref":
+                break
+            xref = int(parent.split()[0])
+            kind, value = doc.xref_get_key(xref, key)
+            if kind != "null":
+                result += b"/%s %s" % (key.encode("ascii"), value.encode("latin-1"))
+                break
+    return result
+
+
+def copy_page_objects(page):
+    """取出页面及其引用的所有对象（内容流、字体、图像等），用于原样复制到输出PDF
+
+    返回 (对象列表 [(对象号, 字典, 原始流数据或 None), ...], 页面对象号, 外部对象号集合)，
+    对象号为源PDF中的对象号，流数据不解码。页面字典去掉 /Parent，并写入从页面树继承的资源、
+    页面尺寸和旋转；引用的其他页面和页面树（如链接的目标页）不复制，列入外部对象号，写入时改为 null。
+    """
+    doc = page.parent
+    page_xref = page.xref
+    body = _PARENT.sub(b"", doc.xref_object(page_xref, compressed=True).encode("latin-1"))
+    objects = [(page_xref, body[:-2] + inherited_attributes(doc, page_xref) + b">>", None)]
+    external = set()
+    seen = {page_xref}
+    index = 0
+    while index < len(objects):
+        for ref in _REFERENCE.findall(objects[index][1]):
+            xref = int(ref)
+            if xref in seen:
+                continue
+            seen.add(xref)
+            if doc.xref_get_key(xref, "Type")[1] in ("/Page", "/Pages"):
+                external.add(xref)
+                continue
+            stream = doc.xref_stream_raw(xref) if doc.xref_is_stream(xref) else None
+            objects.append((xref, doc.xref_object(xref, compressed=True).encode("latin-1"), stream))
+        index += 1
+    return objects, page_xref, external
+
+
+def render_page(page, dpi):
+    """以指定分辨率渲染整页，返回 fitz.Pixmap"""
+    zoom = dpi / 72.0
+    return page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+
+
+def text_layer(page):
+    """返回页面可直接使用的文本层（空白合并为单个空格），文字太少时返回 None"""
+    words = page.get_text().split()
+    if sum(len(word) for word in words) < TEXT_LAYER_MIN_CHARS:
+        return None
+    return " ".join(words)
+
+
+def native_image(page):
+    """返回页面中覆盖整页、未旋转放置的唯一嵌入图像的 xref，没有时返回 None
+
+    页面本身的 /Rotate 不影响判断（扫描仪常把横放的图像配合 /Rotate 显示为纵向页面）。
+    """
+    images = page.get_images(full=True)
+    if len(images) != 1:
+        return None
+    infos = page.get_image_info(xrefs=True)
+    if len(infos) != 1:
+        return None
+    a, b, c, d, _, _ = infos[0]["transform"]
+    if b or c or a <= 0 or d <= 0:
+        return None
+    # 图像位置按未旋转的页面坐标给出
+    bbox = fitz.Rect(infos[0]["bbox"]) & page.cropbox
+    if bbox.get_area() < page.cropbox.get_area() * NATIVE_COVERAGE:
+        return None
+    return images[0][0]
+
+
+def native_stream(page):
+    """取出页面原始扫描图像的压缩数据，返回 (EncodedImage, DPI)
+
+    没有整页扫描图像，或图像带遮罩、使用需要额外对象的颜色空间/多重压缩时返回 None。
+    """
+    xref = native_image(page)
+    if xref is None:
+        return None
+    doc = page.parent
+
+    def key(name):
+        return doc.xref_get_key(xref, name)
+
+    filter_type, filter_value = key("Filter")
+    colorspace_type, colorspace = key("ColorSpace")
+    if filter_type != "name" or filter_value[1:] not in PASSTHROUGH_FILTERS:
+        return None
+    if colorspace_type != "name" or colorspace[1:] not in PASSTHROUGH_COLORSPACES:
+        return None
+    if key("SMask")[0] != "null" or key("Mask")[0] != "null" or key("ImageMask")[1] == "true":
+        return None
+
+    decode_type, decode_value = key("Decode")
+    decode = None
+    if decode_type == "array":
+        decode = [float(value) for value in decode_value.strip("[]").split()]
+    parms_type, parms_value = key("DecodeParms")
+    if parms_type not in ("null", "dict"):
+        return None
+    # 尺寸和位深缺失（JPXDecode 允许省略 BitsPerComponent）或是间接引用时改为解码
+    dimensions = [key(name) for name in ("Width", "Height", "BitsPerComponent")]
+    if any(kind != "int" for kind, _ in dimensions):
+        return None
+    width, height, bits = [int(value) for _, value in dimensions]
+    image = EncodedImage(
+        doc.xref_stream_raw(xref), width, height, colorspace[1:],
+        filter_name=filter_value[1:], bits=bits, decode=decode,
+        decode_parms=parms_value.encode("latin-1") if parms_type == "dict" else None,
+    )
+    return image, width * 72.0 / page.cropbox.width
+
+
+def output_image(page, dpi):
+    """取得归档输出用的整页图像，返回 (PIL图像, DPI)
+
+    页面是单张整页扫描图像时按其原始分辨率解码，不做重采样，并按页面的 /Rotate 转为显示方向；
+    否则按 dpi 渲染。
+    """
+    xref = native_image(page)
+    if xref is not None:
+        pix = fitz.Pixmap(page.parent, xref)
+        if pix.colorspace is None or pix.colorspace.n not in (1, 3):
+            pix = fitz.Pixmap(fitz.csRGB, pix)
+        native_dpi = pix.width * 72.0 / page.cropbox.width
+        image = pixmap_to_image(pix)
+        if page.rotation:
+            # /Rotate 为顺时针角度，PIL 为逆时针
+            image = image.rotate(-page.rotation, expand=True)
+        return image, native_dpi
+    return pixmap_to_image(render_page(page, dpi)), dpi
+
+
+class ClipRenderer:
+    """按低分辨率页面上的文本框，从PDF中以识别分辨率只渲染该区域
+
+    文本框坐标以低分辨率页面（按 angle 转正后，再加上 dx/dy 偏移）为准；
+    只保存路径和页码，可以传给识别进程，在进程中打开PDF。
+    """
+
+    def __init__(self, pdf_path, page_index, size, detect_dpi=DETECT_DPI, recognize_dpi=RECOGNIZE_DPI):
+        self.pdf_path = pdf_path
+        self.page_index = page_index
+        self.size = size                    # 转正前低分辨率页面的 (宽, 高)
+        self.detect_dpi = detect_dpi
+        self.recognize_dpi = recognize_dpi
+        self.angle = 0                      # 低分辨率页面已按 PIL 逆时针旋转的角度
+        self.dx = 0
+        self.dy = 0
+        self.text = None                    # 可直接使用的PDF文本层（此时不渲染低分辨率页面）
+
+    def offset(self, dx, dy):
+        """返回坐标再偏移 (dx, dy) 的渲染器（用于页面中裁出的区域）"""
+        renderer = ClipRenderer(self.pdf_path, self.page_index, self.size, self.detect_dpi, self.recognize_dpi)
+        renderer.angle = self.angle
+        renderer.text = self.text
+        renderer.dx, renderer.dy = self.dx + dx, self.dy + dy
+        return renderer
+
+    def _unrotate(self, x, y):
+        """转正后页面上的点换算回转正前的坐标"""
+        width, height = self.size
+        angle = self.angle % 360
+        if angle == 90:
+            return width - y, x
+        if angle == 180:
+            return width - x, height - y
+        if angle == 270:
+            return y, height - x
+        return x, y
+
+    def crop(self, bounds):
+        """渲染外接矩形 (x0, y0, x1, y1) 对应的区域，返回转正后的BGR数组"""
+        x0, y0, x1, y1 = bounds
+        corners = [self._unrotate(x + self.dx, y + self.dy) for x, y in ((x0, y0), (x1, y1))]
+        scale = 72.0 / self.detect_dpi
+        rect = fitz.Rect(min(x for x, _ in corners) * scale, min(y for _, y in corners) * scale,
+                         max(x for x, _ in corners) * scale, max(y for _, y in corners) * scale)
+        page = open_document(self.pdf_path)[self.page_index]
+        rect &= page.rect
+        if rect.is_empty:
+            return np.full((1, 1, 3), 255, dtype=np.uint8)
+        zoom = self.recognize_dpi / 72.0
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=rect, alpha=False)
+        # np.rot90 与 PIL 相同，正角度为逆时针
+        return np.ascontiguousarray(np.rot90(pixmap_to_array(pix), (self.angle % 360) // 90))
+
+    def native_output(self):
+        """取出原始扫描图像的压缩数据，返回 (EncodedImage, DPI, 页面 /Rotate)，不能原样复制时返回 None
+
+        图像像素不旋转，方向校正和原页面的 /Rotate 合并写入输出页面的 /Rotate。
+        """
+        page = open_document(self.pdf_path)[self.page_index]
+        native = native_stream(page)
+        if native is None:
+            return None
+        image, dpi = native
+        # /Rotate 为顺时针角度，angle 为 PIL 逆时针角度
+        return image, dpi, (page.rotation - self.angle) % 360
+
+    def page_objects(self):
+        """返回原样复制该页所需的PDF对象（见 copy_page_objects()）"""
+        return copy_page_objects(open_document(self.pdf_path)[self.page_index])
+
+    def output_image(self, dpi):
+        """取得归档输出用的整页图像并按 angle 转正，返回 (PIL图像, DPI)"""
+        image, image_dpi = output_image(open_document(self.pdf_path)[self.page_index], dpi)
+        if self.angle % 360:
+            image = image.rotate(self.angle, expand=True)
+        return image, image_dpi
+
+
+def iter_detect_pages(pdf_path, detect_dpi=DETECT_DPI, recognize_dpi=RECOGNIZE_DPI, use_text_layer=False):
+    """逐页以检测分辨率渲染PDF，生成 (页码, PIL图像, ClipRenderer)，页码从1开始
+
+    use_text_layer 为 True 时，带可用文本层的页面不渲染，图像为 None，文本在 ClipRenderer.text 中。
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        for index in range(doc.page_count):
+            page = doc[index]
+            text = text_layer(page) if use_text_layer else None
+            if text is not None:
+                renderer = ClipRenderer(pdf_path, index, None, detect_dpi, recognize_dpi)
+                renderer.text = text
+                yield index + 1, None, renderer
+                continue
+            image = pixmap_to_image(render_page(page, detect_dpi)).convert('RGB')
+            yield index + 1, image, ClipRenderer(pdf_path, index, image.size, detect_dpi, recognize_dpi)
+    finally:
+        doc.close()
@@ -0,0 +1,203 @@
+"""报告编号匹配
+
+所有报告编号格式（LIMIS、协会、SCETIA委托编号以及自定义格式）登记在同一个注册表中，
+合并为一个正则表达式，对识别文本只扫描一次。
+扫描前先规范化识别文本：全角字符转为半角，各种破折号、下划线统一为"-"并去掉其两侧的空格，
+字母数字之间（编号内部）被识别为"一"的破折号也改为"-"，正文中的"一"不变；
+编号中应为数字的位置允许OCR常见的易混字符（O/o→0，l/I/|→1 等），纠正后再按原格式校验。
+每个匹配结果带有置信度：原文直接符合格式为1，每纠正一个字符扣 CORRECTION_PENALTY。
+
+注册表可在程序目录下的 report_patterns.json 中配置，格式为
+    [{"name": "limis", "label": "LIMIS", "category": "limis",
+      "pattern": "[a-zA-Z]{2}\\d{3}-\\d{6}", "priority": 0}, ...]
+    name      格式名称，与内置格式同名的条目只需写出要修改的字段（如 {"name": "scetia_entrust", "enabled": true}），
+              其他条目作为自定义格式追加
+    label     日志中显示的名称（默认为 name）
+    category  报告类型：ScanReport 只使用 limis（Limis文件夹）和 association（协会文件夹）类型，
+              localscan 使用所有类型
+    pattern   规范化后文本上的正则表达式，破折号写作"-"；含分组时以第一个分组作为报告编号
+    priority  同一文本匹配到多种格式时优先采用数值小的（默认0），相同时取置信度高、位置靠前的
+    enabled   为 false 时不参与匹配
+ScanReport 和 localscan 共用本模块。
+"""
+import os
+import re
+import sys
+import json
+import logging
+import itertools
+import unicodedata
+
+# 注册表配置文件（与程序放在同一目录，不存在时使用内置注册表；
+# 单文件打包后模块位于临时解压目录，因此按启动程序所在目录查找）
+PATTERN_FILE = os.path.join(os.path.dirname(os.path.abspath(sys.argv[0])), "report_patterns.json")
+
+# 内置注册表
+DEFAULT_REGISTRY = [
+    # LIMIS格式: XX000-000000
+    {"name": "limis", "label": "LIMIS", "category": "limis",
+     "pattern": r"[a-zA-Z]{2}\d{3}-\d{6}", "priority": 0},
+    # 协会格式: XX00-000000000
+    {"name": "association", "label": "协会", "category": "association",
+     "pattern": r"[a-zA-Z]{2}\d{2}-\d{9}", "priority": 1},
+    # SCETIA委托编号："委托编号"后的10位数字；续页上也会印委托编号，默认不启用，以免续页与报告分开
+    {"name": "scetia_entrust", "label": "SCETIA委托编号", "category": "association",
+     "pattern": r"委托编号:?(\d{10})", "priority": 2, "enabled": False},
+    # localscan 的通用编号格式: 5位字母数字-6位数字
+    {"name": "generic", "label": "编号", "category": "other",
+     "pattern": r"\w{5}-\d{6}", "priority": 3},
+]
+
+# 规范化时统一为"-"的字符（各种破折号、下划线）
+DASHES = "_‐‑‒–—―−－~"
+
+# 数字位置上OCR常见的易混字符及其对应的数字
+DIGIT_CONFUSIONS = {
+    "O": "0", "o": "0", "D": "0", "Q": "0",
+    "I": "1", "l": "1", "i": "1", "|": "1", "!": "1",
+    "Z": "2", "z": "2",
+    "S": "5", "s": "5",
+    "G": "6",
+    "B": "8",
+}
+
+# 每纠正一个易混字符扣除的置信度
+CORRECTION_PENALTY = 0.1
+
+# 一个编号中最多纠正的字符数
+MAX_CORRECTIONS = 4
+
+_DASH_TABLE = str.maketrans({dash: "-" for dash in DASHES})
+_SPACED_DASH = re.compile(r"\s*-\s*")
+# 编号中常被识别为"一"的破折号：只替换两侧都是字母数字的"一"
+_CJK_ONE_DASH = re.compile(r"(?<=[0-9A-Za-z])\s*一\s*(?=[0-9A-Za-z])")
+_DIGIT_CLASS = "0-9" + re.escape("".join(DIGIT_CONFUSIONS))
+
+
+def normalize(text):
+    """规范化识别文本：全角转半角、统一破折号并去掉其两侧的空格"""
+    text = unicodedata.normalize("NFKC", text).translate(_DASH_TABLE)
+    text = _CJK_ONE_DASH.sub("-", text)
+    return _SPACED_DASH.sub("-", text)
+
+
+def tolerant_pattern(pattern):
+    """把正则中的 \\d 扩展为同时接受易混字符的字符类"""
+    result = []
+    in_class = False
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if char == "\\" and index + 1 < len(pattern):
+            token = pattern[index:index + 2]
+            if token == "\\d":
+                token = _DIGIT_CLASS if in_class else f"[{_DIGIT_CLASS}]"
+            result.append(token)
+            index += 2
+            continue
+        if char == "[" and not in_class:
+            in_class = True
+        elif char == "]" and in_class:
+            in_class = False
+        result.append(char)
+        index += 1
+    return "".join(result)
+
+
+class ReportMatch:
+    """一个报告编号匹配结果"""
+
+    def __init__(self, value, entry, confidence, corrections, start):
+        self.value = value                    # 报告编号（已纠正易混字符）
+        self.name = entry["name"]             # 格式名称
+        self.label = entry.get("label") or entry["name"]
+        self.category = entry["category"]     # 报告类型
+        self.priority = entry.get("priority", 0)
+        self.confidence = confidence          # 置信度（0~1）
+        self.corrections = corrections        # 纠正的字符数
+        self.start = start                    # 在规范化文本中的位置
+
+    def __repr__(self):
+        return f"ReportMatch({self.value!r}, {self.name!r}, {self.confidence:.2f})"
+
+
+class ReportMatcher:
+    """由注册表条目编译的报告编号匹配器（可以传给识别进程）"""
+
+    def __init__(self, entries):
+        self.entries = [entry for entry in entries if entry.get("enabled", True)]
+        self._strict = [re.compile(entry["pattern"]) for entry in self.entries]
+        # 所有格式合并为一个正则：每个位置用前瞻尝试各格式，匹配结果可以重叠
+        alternatives = "|".join(f"(?P<m{index}>{tolerant_pattern(entry['pattern'])})"
+                                for index, entry in enumerate(self.entries))
+        self._combined = re.compile(f"(?=(?:{alternatives}))") if self.entries else None
+        # 用于缓存键：格式变化后之前"找到编号即停止"的识别结果不再适用
+        self.fingerprint = tuple((entry["name"], entry["pattern"]) for entry in self.entries)
+
+    def _correct(self, index, candidate):
+        """按原格式校验候选文本，必要时纠正易混字符，返回 (编号, 纠正数) 或 None"""
+        strict = self._strict[index]
+        positions = [position for position, char in enumerate(candidate) if char in DIGIT_CONFUSIONS]
+        for count in range(min(len(positions), MAX_CORRECTIONS) + 1):
+            for chosen in itertools.combinations(positions, count):
+                chars = list(candidate)
+                for position in chosen:
+                    chars[position] = DIGIT_CONFUSIONS[chars[position]]
+                match = strict.fullmatch("".join(chars))
+                if match is not None:
+                    return (match.group(1) if strict.groups else match.group(0)), count
+        return None
+
+    def find_all(self, text):
+        """返回文本中的所有报告编号，按优先级、置信度和位置排序"""
+        if self._combined is None or not text:
+            return []
+        normalized = normalize(text)
+        matches = []
+        for found in self._combined.finditer(normalized):
+            index = int(found.lastgroup[1:])
+            corrected = self._correct(index, found.group(found.lastgroup))
+            if corrected is None:
+                continue
+            value, corrections = corrected
+            confidence = max(0.0, 1.0 - CORRECTION_PENALTY * corrections)
+            matches.append(ReportMatch(value, self.entries[index], confidence, corrections, found.start()))
+        matches.sort(key=lambda match: (match.priority, -match.confidence, match.start))
+        return matches
+
+    def search(self, text):
+        """返回文本中最佳的报告编号匹配，没有时返回 None"""
+        matches = self.find_all(text)
+        return matches[0] if matches else None
+
+
+def load_registry(path=PATTERN_FILE):
+    """读取注册表：配置文件中与内置格式同名的条目覆盖其字段，其他条目追加，返回条目列表"""
+    registry = [dict(entry) for entry in DEFAULT_REGISTRY]
+    if not os.path.exists(path):
+        return registry
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+        names = [entry["name"] for entry in registry]
+        for entry in entries:
+            if entry.get("name") in names:
+                registry[names.index(entry["name"])].update(entry)
+            else:
+                registry.append(dict(entry))
+        for entry in registry:
+            if not entry.get("name") or not entry.get("category") or not entry.get("pattern"):
+                raise ValueError(f"缺少格式名称、类型或正则表达式: {entry}")
+            re.compile(entry["pattern"])
+        return registry
+    except Exception as e:
+        logging.error(f"读取报告编号格式失败 {path}: {str(e)}，使用内置格式")
+        return [dict(entry) for entry in DEFAULT_REGISTRY]
+
+
+def load_matcher(categories=None, path=PATTERN_FILE):
+    """按注册表创建匹配器，categories 不为 None 时只使用这些类型的格式"""
+    entries = load_registry(path)
+    if categories is not None:
+        entries = [entry for entry in entries if entry["category"] in categories]
+    return ReportMatcher(entries)
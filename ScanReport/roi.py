@@ -0,0 +1,88 @@
+"""报告编号区域识别
+
+报告编号通常位于页眉区域。ROI模式下先按模板区域依次只识别页面的一小块，
+匹配到报告编号即结束；所有区域都未匹配时才识别整页。
+区域以页面宽高的比例 [x0, y0, x1, y1] 表示，可在 roi_profiles.json 中按模板配置。
+"""
+import os
+import sys
+import json
+import logging
+
+import numpy as np
+
+# 区域配置文件（与程序放在同一目录，不存在时使用内置配置；
+# 单文件打包后模块位于临时解压目录，因此按启动程序所在目录查找）
+PROFILE_FILE = os.path.join(os.path.dirname(os.path.abspath(sys.argv[0])), "roi_profiles.json")
+
+# 内置模板区域
+DEFAULT_PROFILES = [
+    # LIMIS报告封面：标题下方居中的"报告编号"
+    {"name": "LIMIS封面", "region": [0.1, 0.15, 0.9, 0.4]},
+    # 协会报告：右上角的"报告编号"
+    {"name": "协会报告", "region": [0.5, 0.05, 1.0, 0.25]},
+]
+
+
+def load_profiles(path=PROFILE_FILE):
+    """读取模板区域配置，返回 [{"name": 名称, "region": [x0, y0, x1, y1]}, ...]"""
+    if not os.path.exists(path):
+        return DEFAULT_PROFILES
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            profiles = json.load(f)
+        for profile in profiles:
+            x0, y0, x1, y1 = profile["region"]
+            if not (0 <= x0 < x1 <= 1 and 0 <= y0 < y1 <= 1):
+                raise ValueError(f"区域超出页面范围: {profile}")
+        return profiles
+    except Exception as e:
+        logging.error(f"读取区域配置失败 {path}: {str(e)}，使用内置配置")
+        return DEFAULT_PROFILES
+
+
+def crop_region(pixels, region):
+    """按比例区域裁剪图像数组，返回 (裁剪结果, x偏移, y偏移)"""
+    height, width = pixels.shape[:2]
+    x0, y0, x1, y1 = region
+    left, top = int(x0 * width), int(y0 * height)
+    right, bottom = max(left + 1, int(x1 * width)), max(top + 1, int(y1 * height))
+    return np.ascontiguousarray(pixels[top:bottom, left:right]), left, top
+
+
+def offset_lines(lines, dx, dy):
+    """将区域内识别结果的文本框坐标换算回整页坐标"""
+    return [
+        [[[point[0] + dx, point[1] + dy] for point in line[0]], line[1]]
+        for line in lines
+    ]
+
+
+def recognize_regions(recognize_many, pages, profiles, matcher, renderers=None):
+    """依次识别各页的模板区域，返回与 pages 一一对应的 (识别结果, 模板名称)
+
+    recognize_many(crops, renderers) 返回与 crops 一一对应的识别结果，同一模板下各页的区域一起识别；
+    matcher 为报告编号匹配器（见 report_numbers.py）；renderers 与 pages 一一对应（见 orientation.recognize_pages），
+    传给 recognize_many 时按区域位置偏移。
+    所有区域都未匹配的页面返回 (None, None)，由调用方识别整页。
+    """
+    results = [(None, None)] * len(pages)
+    todo = list(range(len(pages)))
+    for profile in profiles:
+        if not todo:
+            break
+        regions = [crop_region(pages[index], profile["region"]) for index in todo]
+        region_renderers = None
+        if renderers:
+            region_renderers = [renderers[index].offset(dx, dy) if renderers[index] is not None else None
+                                for index, (_, dx, dy) in zip(todo, regions)]
+        results_many = recognize_many([crop for crop, _, _ in regions], region_renderers)
+        remaining = []
+        for index, (_, dx, dy), lines in zip(todo, regions, results_many):
+            text = " ".join(line[1][0] for line in lines)
+            if matcher.search(text) is not None:
+                results[index] = (offset_lines(lines, dx, dy), profile["name"])
+            else:
+                remaining.append(index)
+        todo = remaining
+    return results
@@ -0,0 +1,87 @@
+"""报告分段
+
+多页报告通常只在首页或页眉中印有报告编号。分段模式下匹配到报告编号的页面作为一份报告的开始，
+同一文件中其后未匹配到编号的页面归入该报告，不再各自以临时名称归入"其他"。
+与同一文件中上一页版式相似的页面（同一模板的续页）只识别页眉和模板区域（续页检查），
+其中没有报告编号就直接作为续页，不再识别整页。
+"""
+import numpy as np
+from PIL import Image
+
+# 版式特征：页面上部该比例的区域（页眉、标题、表头）按网格取墨迹量
+LAYOUT_HEADER_FRACTION = 0.25
+# 页面上部区域的网格（列, 行）
+LAYOUT_HEADER_GRID = (32, 8)
+# 整页的列墨迹分布（页边距、表格列）的分段数
+LAYOUT_COLUMNS = 32
+# 两页宽高比相差超过该比例时视为不同版式
+LAYOUT_ASPECT_TOLERANCE = 0.05
+# 版式相似度（相关系数）达到该值时视为同一模板的续页
+MIN_LAYOUT_SIMILARITY = 0.75
+
+# 续页检查识别的页眉区域（格式同 roi.py 的模板区域），之后再识别各模板区域
+HEADER_PROFILES = [
+    {"name": "页眉", "region": [0.0, 0.0, 1.0, 0.2]},
+]
+
+
+def layout_signature(img):
+    """计算页面版式特征，返回 (宽高比, 特征向量)"""
+    gray = img.convert('L')
+    width, height = gray.size
+    header = gray.crop((0, 0, width, max(1, int(height * LAYOUT_HEADER_FRACTION))))
+    header = 255 - np.asarray(header.resize(LAYOUT_HEADER_GRID, Image.BOX), dtype=np.float64)
+    page = 255 - np.asarray(gray.resize((LAYOUT_COLUMNS, LAYOUT_COLUMNS), Image.BOX), dtype=np.float64)
+    # 列分布只是一行数据，放大后与页眉网格的权重相当
+    columns = page.mean(axis=0) * LAYOUT_HEADER_GRID[1] / 2
+    return width / height, np.concatenate([header.ravel(), columns])
+
+
+def layout_similarity(first, second):
+    """两页版式特征的相似度（相关系数，-1~1），宽高比不同时为0"""
+    (aspect1, vector1), (aspect2, vector2) = first, second
+    if abs(aspect1 - aspect2) > LAYOUT_ASPECT_TOLERANCE * max(aspect1, aspect2):
+        return 0.0
+    x = vector1 - vector1.mean()
+    y = vector2 - vector2.mean()
+    norm = np.sqrt((x * x).sum() * (y * y).sum())
+    return float((x * y).sum() / norm) if norm else 0.0
+
+
+class LayoutTracker:
+    """按页面顺序比较同一文件中相邻页面的版式"""
+
+    def __init__(self):
+        self.source = None
+        self.signature = None
+
+    def similar_to_previous(self, page):
+        """返回页面与同一文件中上一页的版式是否相似（没有页面图像时为 False）"""
+        signature = layout_signature(page.image) if page.image is not None else None
+        previous = self.signature if page.source == self.source else None
+        self.source, self.signature = page.source, signature
+        if signature is None or previous is None:
+            return False
+        return layout_similarity(previous, signature) >= MIN_LAYOUT_SIMILARITY
+
+
+class DocumentSegmenter:
+    """按页面顺序把页面划分为报告
+
+    匹配到报告编号的页面开始一份新报告；未匹配到编号的页面归入同一文件中前面最近的报告，
+    文件开头还没有报告时，以第一页的名称作为一份"其他"文件，后续未匹配的页面归入其中。
+    """
+
+    def __init__(self):
+        self.source = None
+        self.current = None    # 当前报告 (名称, 类型)
+
+    def assign(self, page, new_name, file_type):
+        """返回页面所属的 (报告名称, 类型, 是否为续页)"""
+        if page.source != self.source:
+            self.source = page.source
+            self.current = None
+        if file_type != "other" or self.current is None:
+            self.current = (new_name, file_type)
+            return new_name, file_type, False
+        return self.current + (True,)
@@ -0,0 +1,80 @@
+"""按 PaddleOCR 2.7.3 调用语义工作的OCR桩
+
+测试页面上每个文本行是一块灰度值各不相同的矩形，检测时按灰度值找出各矩形，
+识别和方向分类时按切片中心的灰度值查表。
+"""
+import numpy as np
+
+# 页面背景的灰度值
+BACKGROUND = 255
+
+
+def make_page(values, width=400, line_height=20, line_width=280):
+    """生成测试页面（BGR数组）：values 中的每个灰度值从上到下各画一个文本行"""
+    page = np.full((40 * len(values) + 40, width, 3), BACKGROUND, dtype=np.uint8)
+    for index, value in enumerate(values):
+        top = 20 + index * 40
+        page[top:top + line_height, 20:20 + line_width] = value
+    return page
+
+
+class StubOCR:
+    """模拟 PaddleOCR.ocr() 的OCR桩
+
+    texts 为 {灰度值: (文本, 置信度)}，labels 为 {灰度值: 方向标签}（默认为 "0"），
+    scorer(切片) 不为 None 时返回识别置信度，代替 texts 中的置信度。
+    与 PaddleOCR 2.7.3 相同：传入列表时外层列表的每个元素是一张图像，元素本身是列表时才作为一批识别；
+    第一次列表调用确定 page_num，之后更长的列表被截断到该长度。
+    """
+
+    def __init__(self, texts=None, labels=None, scorer=None):
+        self.texts = texts or {}
+        self.labels = labels or {}
+        self.scorer = scorer
+        self.page_num = 0
+        self.rec_batches = []     # 每批识别的切片数
+        self.recognized = []      # 已识别的切片灰度值（按识别顺序）
+
+    def ocr(self, img, det=True, rec=True, cls=True):
+        if isinstance(img, list) and det:
+            raise ValueError("When input a list of images, det must be false")
+        if det:
+            return [self.detect(img)]
+        if isinstance(img, list):
+            if self.page_num == 0 or self.page_num > len(img):
+                self.page_num = len(img)
+            images = img[:self.page_num]
+        else:
+            images = [img]
+
+        results = []
+        for image in images:
+            batch = image if isinstance(image, list) else [image]
+            values = [self.value(crop) for crop in batch]
+            if rec:
+                self.rec_batches.append(len(batch))
+                self.recognized.extend(values)
+                texts = [self.texts.get(value, ("", 0.0)) for value in values]
+                if self.scorer is not None:
+                    texts = [(text, self.scorer(np.asarray(crop))) for (text, _), crop in zip(texts, batch)]
+                results.append(texts)
+            else:
+                results.append([(self.labels.get(value, "0"), 0.99) for value in values])
+        return results
+
+    def detect(self, img):
+        """返回各文本行的四点文本框"""
+        gray = np.asarray(img)[:, :, 0]
+        boxes = []
+        for value in np.unique(gray):
+            if value == BACKGROUND:
+                continue
+            ys, xs = np.nonzero(gray == value)
+            x0, y0, x1, y1 = int(xs.min()), int(ys.min()), int(xs.max()), int(ys.max())
+            boxes.append([[x0, y0], [x1, y0], [x1, y1], [x0, y1]])
+        return boxes
+
+    def value(self, crop):
+        """切片中心的灰度值"""
+        crop = np.asarray(crop)
+        return int(crop[crop.shape[0] // 2, crop.shape[1] // 2, 0])
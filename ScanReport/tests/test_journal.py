@@ -0,0 +1,60 @@
+import os
+
+from journal import JobJournal
+
+
+class FakePage:
+    def __init__(self, source, name):
+        self.source = source
+        self.name = name
+        self.angle = 0
+        self.text = ""
+
+
+def test_pages_after_last_report_record_are_not_done(tmp_path):
+    files = [str(tmp_path / "a.pdf"), str(tmp_path / "b.pdf")]
+    report = tmp_path / "AB123-456789.pdf"
+    report.write_bytes(b"%PDF")
+    journal = JobJournal(str(tmp_path), files, {})
+    journal.record_page(FakePage(files[0], "a_page_1"), "AB123-456789", "limis")
+    journal.record_file(files[0], 1)
+    # 第一个文件处理完后补全报告，第二个文件中的续页在中断前没有补全
+    journal.record_report("AB123-456789", "limis", str(report), 1)
+    journal.record_page(FakePage(files[1], "b_page_1"), "AB123-456789", "limis")
+    journal.close()
+
+    resumed = JobJournal(str(tmp_path), files, {})
+    assert resumed.page_done(files[0], "a_page_1")
+    assert not resumed.page_done(files[1], "b_page_1")
+    assert resumed.file_done(files[0])
+    assert not resumed.file_done(files[1])
+    resumed.close()
+
+
+def test_missing_report_pdf_is_not_done(tmp_path):
+    files = [str(tmp_path / "a.pdf")]
+    journal = JobJournal(str(tmp_path), files, {})
+    journal.record_page(FakePage(files[0], "a_page_1"), "AB123-456789", "limis")
+    journal.record_report("AB123-456789", "limis", str(tmp_path / "AB123-456789.pdf"), 1)
+
+    assert not os.path.exists(tmp_path / "AB123-456789.pdf")
+    assert not journal.page_done(files[0], "a_page_1")
+    journal.close()
+
+
+def test_file_done_while_pages_are_recorded(tmp_path):
+    import threading
+
+    files = [str(tmp_path / "a.pdf")]
+    journal = JobJournal(str(tmp_path), files, {})
+    journal.record_file(files[0], 5000)
+    writer = threading.Thread(target=lambda: [
+        journal.record_page(FakePage(files[0], f"a_page_{index}"), "AB123-456789", "limis")
+        for index in range(5000)])
+    writer.start()
+    # 汇总线程写入页面记录时，光栅化线程检查文件是否完成不出错
+    while writer.is_alive():
+        journal.file_done(files[0])
+    writer.join()
+    assert len(journal.file_pages(files[0])) == 5000
+    journal.close()
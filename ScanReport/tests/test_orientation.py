@@ -0,0 +1,69 @@
+from PIL import Image
+
+from orientation import recognize_pages, lines_to_text, classify_crops, vote_orientation
+from report_numbers import ReportMatcher, DEFAULT_REGISTRY
+from stub_ocr import StubOCR, make_page
+
+TEXTS = {
+    10: ("检测报告", 0.99),
+    20: ("报告编号:AB123-456789", 0.98),
+    30: ("第1页 共2页", 0.95),
+    40: ("委托单位", 0.97),
+    50: ("样品名称", 0.96),
+    60: ("检测结论", 0.96),
+    70: ("批准人", 0.93),
+}
+
+
+def test_recognize_pages_batches_lines_of_all_pages():
+    ocr = StubOCR(TEXTS)
+    lines = recognize_pages(ocr, [make_page([10, 20, 30]), make_page([40, 50])])
+
+    assert lines_to_text(lines[0]) == "检测报告 报告编号:AB123-456789 第1页 共2页"
+    assert lines_to_text(lines[1]) == "委托单位 样品名称"
+    # 两页的文本行在一次调用中一起识别
+    assert ocr.rec_batches == [5]
+
+
+def test_recognize_pages_later_batches_are_not_truncated():
+    ocr = StubOCR(TEXTS)
+    recognize_pages(ocr, [make_page([40])])
+    lines = recognize_pages(ocr, [make_page([10, 20, 30, 40, 50])])
+
+    assert len(lines[0]) == 5
+
+
+def test_recognize_pages_stops_after_batch_with_report_number():
+    ocr = StubOCR(TEXTS)
+    matcher = ReportMatcher(DEFAULT_REGISTRY)
+    with_number = make_page([10, 30, 40, 20, 50, 60, 70])
+    without_number = make_page([10, 30, 40, 50, 60])
+    lines = recognize_pages(ocr, [with_number, without_number], matcher, batch_lines=2)
+
+    # 编号在第二批（第4行），之后的文本行不再识别
+    assert [line[1][0] for line in lines[0]] == ["检测报告", "第1页 共2页", "委托单位", "报告编号:AB123-456789"]
+    # 没有编号的页面识别到最后一行
+    assert len(lines[1]) == 5
+    assert ocr.rec_batches == [4, 4, 1]
+
+
+def test_classify_crops_votes_over_all_crops():
+    ocr = StubOCR(labels={10: "180", 20: "180", 30: "0"})
+    page = make_page([10, 20, 30])
+    crops = [page[20 + index * 40:40 + index * 40, 20:300] for index in range(3)]
+    upright, flipped = classify_crops(ocr, crops)
+
+    assert round(flipped, 2) == 1.98
+    assert round(upright, 2) == 0.99
+
+
+def test_vote_orientation_scores_every_candidate_angle():
+    # 横向的文本行切片识别置信度高，竖向的低
+    ocr = StubOCR(TEXTS, scorer=lambda crop: 0.95 if crop.shape[1] > crop.shape[0] else 0.3)
+    page = Image.fromarray(make_page([10, 20, 30, 40])[:, :, ::-1])
+    angle, confidence = vote_orientation(ocr, page, (90, 180))
+
+    assert angle == 180
+    assert confidence > 0.5
+    # 两个候选角度的切片在一次调用中一起识别
+    assert ocr.rec_batches == [8]
@@ -0,0 +1,33 @@
+import fitz
+
+from pdf_writer import StreamingPdfWriter
+from render import copy_page_objects
+
+
+def test_text_layer_pages_are_copied_unchanged(tmp_path):
+    source = str(tmp_path / "report.pdf")
+    doc = fitz.open()
+    for index in range(3):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"报告编号:AB123-45678{index}", fontname="china-s")
+    doc.save(source)
+    doc.close()
+
+    output = str(tmp_path / "out.pdf")
+    writer = StreamingPdfWriter(output)
+    doc = fitz.open(source)
+    for page in doc:
+        writer.add_copied_page(source, *copy_page_objects(page))
+    writer.close()
+
+    copied = fitz.open(output)
+    assert copied.page_count == 3
+    for index, page in enumerate(copied):
+        # 文本层保留，页面与源页面一致
+        assert page.get_text().strip() == f"报告编号:AB123-45678{index}"
+        assert page.rect == doc[index].rect
+    # 各页共用的字体只写入一次
+    def fonts(pdf):
+        return [xref for xref in range(1, pdf.xref_length()) if pdf.xref_get_key(xref, "Type")[1] == "/Font"]
+
+    assert len(fonts(copied)) == len(fonts(doc))
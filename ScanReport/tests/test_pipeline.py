@@ -0,0 +1,55 @@
+from PIL import Image
+
+from pipeline import BatchPipeline, Page
+
+
+def test_resumed_pages_are_assembled_while_rasterizing():
+    produced = []
+    first_assembled_after = []
+
+    def rasterize(file_path):
+        for index in range(300):
+            produced.append(index)
+            yield f"page_{index}", Image.new("RGB", (8, 8), "white"), 100
+
+    def assemble(page):
+        if not first_assembled_after:
+            first_assembled_after.append(len(produced))
+        assembled.append(page.seq)
+
+    assembled = []
+    pipeline = BatchPipeline(rasterize, None, assemble, mode="simple", workers=1, queue_size=4,
+                             resume=lambda page: (0, "文本"))
+    pipeline.run(["scan.pdf"])
+
+    assert assembled == list(range(300))
+    # 已完成的页面不在识别阶段积压：第一页在所有页面光栅化之前就已汇总
+    assert first_assembled_after[0] < 20
+
+
+class FakeRenderer:
+    def __init__(self, recognize_dpi):
+        self.recognize_dpi = recognize_dpi
+        self.angle = 0
+        self.text = ""
+
+
+class KeyCache:
+    def key(self, *parts):
+        return repr(parts[1:])
+
+    def get(self, key):
+        return None
+
+
+def test_cache_key_covers_recognition_settings():
+    pipeline = BatchPipeline(lambda file_path: [], None, lambda page: None, cache=KeyCache())
+    image = Image.new("RGB", (8, 8), "white")
+    keys = set()
+    for dpi, renderer in ((100, FakeRenderer(200)), (100, FakeRenderer(300)), (200, None), (300, None)):
+        page = Page(0, "scan.pdf", "scan_page_1", image, dpi, renderer)
+        pipeline._lookup_cache(page)
+        keys.add(page.cache_key)
+
+    # 识别分辨率不同、是否按需分辨率不同时缓存键都不同
+    assert len(keys) == 4
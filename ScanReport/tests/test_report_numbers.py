@@ -0,0 +1,14 @@
+from report_numbers import ReportMatcher, DEFAULT_REGISTRY, normalize
+
+
+def test_cjk_one_inside_number_is_a_dash():
+    matcher = ReportMatcher(DEFAULT_REGISTRY)
+    match = matcher.search("报告编号：AB123一456789")
+
+    assert match is not None
+    assert match.value == "AB123-456789"
+
+
+def test_cjk_one_in_text_is_kept():
+    assert normalize("第一页 共一页 统一编号") == "第一页 共一页 统一编号"
+    assert normalize("一AB123 一") == "一AB123 一"
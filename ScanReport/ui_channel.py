@@ -0,0 +1,120 @@
+"""界面消息通道
+
+处理线程不直接操作 Tk 控件（Tk 不是线程安全的），而是把日志、状态和进度交给 UiChannel，
+由 Tk 主循环按固定间隔（after）统一取出并刷新界面：
+    - 两次刷新之间的多条日志合并成一次插入
+    - 状态和进度只保留最新值
+    - 日志文本框只保留最近 MAX_LOG_LINES 行
+这样无论一批处理多少页，界面刷新的开销都是固定的，处理线程也不会被界面拖慢。
+ScanReport 和 localscan 的界面共用本模块。
+"""
+import threading
+import collections
+import tkinter as tk
+
+# 刷新界面的间隔（毫秒）
+REFRESH_INTERVAL = 100
+
+# 日志文本框保留的最大行数
+MAX_LOG_LINES = 2000
+
+
+class UiChannel:
+    """处理线程到 Tk 界面的消息通道
+
+    log() / status() / progress() / call() 可以在任意线程中调用；
+    status 和 progress 回调、call() 提交的函数都在 Tk 主线程中执行。
+    """
+
+    def __init__(self, root, log_widget, status=None, progress=None,
+                 interval=REFRESH_INTERVAL, max_lines=MAX_LOG_LINES):
+        self.root = root
+        self.log_widget = log_widget
+        self.status_callback = status
+        self.progress_callback = progress
+        self.interval = interval
+        self.max_lines = max_lines
+
+        self._lock = threading.Lock()
+        # 待插入的日志（超过 max_lines 时最早的一条会被丢弃，反正也会滚出文本框）
+        self._lines = collections.deque(maxlen=max_lines)
+        self._dropped = 0
+        # 最新的状态和进度（None 表示没有变化）
+        self._status = None
+        self._progress = None
+        # 需要在主线程中执行的函数
+        self._calls = []
+
+        self.root.after(self.interval, self._refresh)
+
+    def log(self, message):
+        """添加一条日志"""
+        with self._lock:
+            if len(self._lines) == self.max_lines:
+                self._dropped += 1
+            self._lines.append(message)
+
+    def status(self, message):
+        """更新状态文字（只保留最新一条）"""
+        with self._lock:
+            self._status = message
+
+    def progress(self, *value):
+        """更新进度（只保留最新值），参数原样传给 progress 回调"""
+        with self._lock:
+            self._progress = value
+
+    def call(self, func, *args):
+        """在主线程中执行 func(*args)（在同一次刷新的日志、状态和进度之后）"""
+        with self._lock:
+            self._calls.append((func, args))
+
+    def clear_log(self):
+        """清空日志文本框和尚未显示的日志（只能在主线程中调用）"""
+        with self._lock:
+            self._lines.clear()
+            self._dropped = 0
+        state = self.log_widget.cget("state")
+        self.log_widget.config(state=tk.NORMAL)
+        self.log_widget.delete("1.0", tk.END)
+        self.log_widget.config(state=state)
+
+    def _refresh(self):
+        try:
+            self.flush()
+        finally:
+            self.root.after(self.interval, self._refresh)
+
+    def flush(self):
+        """把积累的消息刷新到界面（只能在主线程中调用）"""
+        with self._lock:
+            lines = list(self._lines)
+            dropped = self._dropped
+            status, progress, calls = self._status, self._progress, self._calls
+            self._lines.clear()
+            self._dropped = 0
+            self._status = self._progress = None
+            self._calls = []
+
+        if lines:
+            if dropped:
+                lines.insert(0, f"...（省略 {dropped} 条日志）")
+            self._insert_lines(lines)
+        if status is not None and self.status_callback is not None:
+            self.status_callback(status)
+        if progress is not None and self.progress_callback is not None:
+            self.progress_callback(*progress)
+        for func, args in calls:
+            func(*args)
+
+    def _insert_lines(self, lines):
+        state = self.log_widget.cget("state")
+        self.log_widget.config(state=tk.NORMAL)
+        self.log_widget.insert(tk.END, "\n".join(lines) + "\n")
+
+        # 只保留最后 max_lines 行
+        line_count = int(self.log_widget.index("end-1c").split(".")[0]) - 1
+        if line_count > self.max_lines:
+            self.log_widget.delete("1.0", f"{line_count - self.max_lines + 1}.0")
+        self.log_widget.see(tk.END)
+        self.log_widget.config(state=state)
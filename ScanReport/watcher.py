@@ -0,0 +1,153 @@
+"""热文件夹监视
+
+扫描仪不断把文件放进共享文件夹时，持续监视该文件夹，
+文件写入完成后立即逐个交给 ReportEngine 处理，处理完的文件移入子文件夹。
+引擎在整个监视过程中复用已加载模型的识别进程，每个文件只花识别本身的时间。
+"""
+import os
+import time
+import shutil
+
+from engine import SUPPORTED_EXTENSIONS, ProcessingStopped
+
+# 扫描文件夹的间隔（秒）
+POLL_INTERVAL = 2.0
+
+# 文件大小和修改时间保持不变超过该时间才视为写入完成（秒）
+SETTLE_TIME = 3.0
+
+# 处理完成/失败的文件移入监视文件夹下的这两个子文件夹
+PROCESSED_FOLDER = "已处理"
+FAILED_FOLDER = "处理失败"
+
+# 各类型文件完整写入后末尾应包含的标记
+_END_MARKERS = {
+    '.pdf': b"%%EOF",
+    '.png': b"IEND",
+    '.jpg': b"\xff\xd9",
+    '.jpeg': b"\xff\xd9",
+}
+
+
+def has_end_marker(path):
+    """检查文件末尾是否已写入结束标记（扫描仪仍在写入时通常还没有）"""
+    marker = _END_MARKERS.get(os.path.splitext(path)[1].lower())
+    if marker is None:
+        return True
+    try:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - 1024))
+            return marker in f.read()
+    except OSError:
+        return False
+
+
+def move_to_folder(path, folder):
+    """把文件移入文件夹，重名时在文件名后加时间戳"""
+    os.makedirs(folder, exist_ok=True)
+    target = os.path.join(folder, os.path.basename(path))
+    if os.path.exists(target):
+        base, ext = os.path.splitext(os.path.basename(path))
+        target = os.path.join(folder, f"{base}_{time.strftime('%Y%m%d%H%M%S')}{ext}")
+    shutil.move(path, target)
+    return target
+
+
+class HotFolderWatcher:
+    """监视文件夹并逐个处理新到达的文件
+
+    run_options 原样传给 ReportEngine.run()（mode、workers、dpi 等）。
+    """
+
+    def __init__(self, engine, watch_folder, export_folder, poll_interval=POLL_INTERVAL,
+                 settle_time=SETTLE_TIME, should_stop=None, **run_options):
+        self.engine = engine
+        self.watch_folder = watch_folder
+        self.export_folder = export_folder
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.should_stop = should_stop or (lambda: False)
+        self.run_options = run_options
+        self.processed_folder = os.path.join(watch_folder, PROCESSED_FOLDER)
+        self.failed_folder = os.path.join(watch_folder, FAILED_FOLDER)
+
+        # 正在等待写入完成的文件 {路径: (大小, 修改时间, 首次观察到该状态的时间)}
+        self._pending = {}
+        # 已处理但无法移走的文件，不再重复处理
+        self._done = set()
+
+        # 统计
+        self.processed = 0
+        self.failed = 0
+
+    def scan(self):
+        """返回已写入完成、可以处理的文件（按修改时间排序）"""
+        now = time.monotonic()
+        ready = []
+        present = set()
+        try:
+            entries = list(os.scandir(self.watch_folder))
+        except OSError as e:
+            self.engine.log(f"无法读取监视文件夹: {str(e)}")
+            return []
+
+        for entry in entries:
+            if not entry.is_file() or entry.path in self._done:
+                continue
+            if os.path.splitext(entry.name)[1].lower() not in SUPPORTED_EXTENSIONS:
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            present.add(entry.path)
+
+            state = (stat.st_size, stat.st_mtime)
+            previous = self._pending.get(entry.path)
+            if previous is None or previous[:2] != state:
+                # 新文件或仍在变化，重新计时
+                self._pending[entry.path] = state + (now,)
+                continue
+            if stat.st_size > 0 and now - previous[2] >= self.settle_time and has_end_marker(entry.path):
+                ready.append((stat.st_mtime, entry.path))
+
+        # 忘记已经消失的文件
+        for path in list(self._pending):
+            if path not in present:
+                del self._pending[path]
+        return [path for _, path in sorted(ready)]
+
+    def process_file(self, path):
+        """处理一个文件并移入已处理/处理失败文件夹"""
+        self._pending.pop(path, None)
+        try:
+            self.engine.run([path], self.export_folder, **self.run_options)
+            folder = self.processed_folder
+            self.processed += 1
+        except ProcessingStopped:
+            raise
+        except Exception as e:
+            self.engine.log(f"处理失败: {os.path.basename(path)}: {str(e)}")
+            folder = self.failed_folder
+            self.failed += 1
+
+        try:
+            move_to_folder(path, folder)
+        except OSError as e:
+            self.engine.log(f"无法移动文件 {path}: {str(e)}")
+            self._done.add(path)
+
+    def run(self):
+        """持续监视，直到 should_stop() 返回 True"""
+        self.engine.log(f"开始监视文件夹: {self.watch_folder}")
+        try:
+            while not self.should_stop():
+                for path in self.scan():
+                    if self.should_stop():
+                        break
+                    self.process_file(path)
+                time.sleep(self.poll_interval)
+        except ProcessingStopped:
+            pass
+        self.engine.log(f"停止监视，已处理 {self.processed} 个文件，失败 {self.failed} 个")
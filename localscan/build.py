@@ -19,13 +19,26 @@ def build_executable():
         "--include-package=PIL",  # 包含PIL包
         "--include-package=fitz",  # 包含PyMuPDF包
         "--include-package=img2pdf",  # 包含img2pdf包
+        "--include-module=ocr_cache",  # 包含与ScanReport共用的OCR缓存模块
+        "--include-module=ocr_server",  # 包含与ScanReport共用的OCR服务客户端
+        "--include-module=orientation",  # 包含与ScanReport共用的批量识别函数
+        "--include-module=ui_channel",  # 包含与ScanReport共用的界面消息通道
+        "--include-module=render",  # 包含与ScanReport共用的按需分辨率渲染
+        "--include-module=pdf_writer",  # 包含与ScanReport共用的PDF图像流定义
+        "--include-module=instrument",  # 包含与ScanReport共用的计时和性能分析
+        "--include-module=report_numbers",  # 包含与ScanReport共用的报告编号匹配
         "--windows-icon-from-ico=icon.ico",  # 设置图标（如果有的话）
         "--output-dir=dist",  # 输出目录
         "main.py"  # 主程序文件
     ]
     
+    # 让Nuitka能找到与ScanReport共用的模块
+    env = os.environ.copy()
+    shared_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "ScanReport")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [shared_dir, env.get("PYTHONPATH")]))
+    
     # 执行编译命令
-    subprocess.run(command)
+    subprocess.run(command, env=env)
 
 if __name__ == "__main__":
     build_executable()
\ No newline at end of file
@@ -0,0 +1,102 @@
+"""文件批处理工具 - 命令行入口
+
+不加载图形界面，适合在服务器或计划任务中批量处理：
+
+    python cli.py -o 导出文件夹 "扫描件/*.pdf" 图片目录
+
+处理进度以 JSON Lines 格式逐行输出到标准输出，每行一个事件：
+    {"event": "log", "message": ...}
+    {"event": "progress", "done": ..., "total": ...}
+    {"event": "warning", "file": ..., "message": ...}
+    {"event": "done", "outputs": {"编号": 页数, ...}}
+    {"event": "error", "message": ...}
+全部成功时退出码为0，出错时为1，被中断（Ctrl+C）时为130。
+"""
+import os
+import sys
+import json
+import glob
+import signal
+import argparse
+import threading
+
+from processor import BatchProcessor, SUPPORTED_EXTENSIONS
+from instrument import PROFILE_MODES
+
+
+def emit(event, **fields):
+    """向标准输出写入一个JSON事件"""
+    sys.stdout.write(json.dumps(dict(event=event, **fields), ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+
+def expand_inputs(patterns):
+    """展开通配符和文件夹，返回按出现顺序去重后的支持文件列表"""
+    files = []
+    seen = set()
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) or [pattern]
+        for path in matches:
+            if os.path.isdir(path):
+                candidates = [os.path.join(path, name) for name in sorted(os.listdir(path))]
+            else:
+                candidates = [path]
+            for candidate in candidates:
+                if not os.path.isfile(candidate):
+                    continue
+                if os.path.splitext(candidate)[1].lower() not in SUPPORTED_EXTENSIONS:
+                    continue
+                key = os.path.abspath(candidate)
+                if key not in seen:
+                    seen.add(key)
+                    files.append(candidate)
+    return files
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="文件批处理工具（命令行）")
+    parser.add_argument("inputs", nargs="+", help="输入文件、文件夹或通配符（支持 **）")
+    parser.add_argument("-o", "--output", required=True, help="导出文件夹")
+    parser.add_argument("--render-threads", type=int, default=1, help="PDF页面渲染线程数（默认 1）")
+    parser.add_argument("--no-text-layer", action="store_true", help="PDF带文本层时也进行OCR")
+    parser.add_argument("--profile", choices=PROFILE_MODES,
+                        help="性能分析：cprofile 写入 .pstats，sample 按 py-spy 折叠栈格式采样（结果在导出文件夹中）")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    files = expand_inputs(args.inputs)
+    if not files:
+        emit("error", message="没有找到可处理的文件")
+        return 1
+    os.makedirs(args.output, exist_ok=True)
+
+    # Ctrl+C 时处理完当前页后停止，已处理的页面仍会保存
+    stop_event = threading.Event()
+    signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+
+    processor = BatchProcessor(
+        log=lambda message: emit("log", message=message),
+        progress=lambda done, total: emit("progress", done=done, total=total),
+        warn=lambda file_name, error: emit("warning", file=file_name, message=str(error)),
+        should_stop=stop_event.is_set,
+    )
+    processor.render_threads = max(1, args.render_threads)
+    processor.use_text_layer = not args.no_text_layer
+    processor.profile = args.profile
+    try:
+        outputs = processor.process(files, args.output)
+    except Exception as e:
+        emit("error", message=str(e))
+        return 1
+    finally:
+        processor.close()
+
+    emit("done", files=len(files), outputs=outputs)
+    return 130 if stop_event.is_set() else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
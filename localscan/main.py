@@ -1,20 +1,17 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-import os
 import logging
 from pdf2image import convert_from_path
-from paddleocr import PaddleOCR
 import img2pdf
-import fitz  # PyMuPDF
-import re
-import shutil
 from datetime import datetime
 import traceback
-import tempfile
 import time
 import sys
-from PIL import Image
-Image.MAX_IMAGE_PIXELS = None  # 禁用图片大小限制
+import threading
+
+from processor import BatchProcessor
+# processor 已把 ScanReport 目录加入 sys.path
+from ui_channel import UiChannel
 
 # 配置日志
 logging.basicConfig(
@@ -51,8 +48,9 @@ HELP_TEXT = """文件批处理工具使用说明
 处理流程：
 1. PDF文件会自动转换为图片
 2. 对所有图片进行OCR识别
-3. 使用正则表达式匹配文件名
-   匹配模式：\\w{5}[-_—]\\d{6}
+3. 按报告编号注册表匹配文件名（LIMIS、协会及通用的 \\w{5}-\\d{6} 格式）
+   识别中的全角字符、破折号和数字位置上的 O/0、l/1 等易混字符会自动纠正；
+   可在程序目录下的 report_patterns.json 中添加或修改格式
 4. 将匹配到的内容作为新文件名
 5. 自动合并同名文件为PDF
 
@@ -61,6 +59,9 @@ HELP_TEXT = """文件批处理工具使用说明
 2. 大文件处理可能需要较长时间
 3. 建议定期备份重要文件
 4. 如果出现错误会在日志中显示
+5. 已识别过的页面会使用缓存结果，重复处理时无需再次OCR
+6. 如果已启动ScanReport的本机OCR服务（ocr_server.py），会直接使用服务识别，无需加载模型
+7. 数字生成的PDF（带可提取文字）直接用文字匹配文件名，不再OCR，处理非常快
 """
 
 class App:
@@ -79,12 +80,21 @@ class App:
         # 创建界面元素
         self.create_widgets()
         
-        # 初始化OCR
-        self.ocr = None
+        # 处理线程通过消息通道更新日志、状态和进度，由界面定时刷新
+        self.ui = UiChannel(
+            self.root,
+            self.log_text,
+            status=lambda message: self.status_label.config(text=message),
+            progress=self.show_progress,
+        )
         
-        # 设置PDF处理参数
-        self.pdf_dpi = 200  # 降低DPI以减少内存使用
-        self.max_retries = 3  # 最大重试次数
+        # 处理引擎（OCR模型和识别缓存在多次处理之间复用）
+        self.processor = BatchProcessor(
+            log=self.update_status,
+            progress=self.update_progress,
+            warn=self.warn_file_error,
+            should_stop=lambda: self.stop_flag,
+        )
     
     def create_widgets(self):
         # 创建左右分栏
@@ -186,10 +196,9 @@ class App:
         self.help_text.configure(yscrollcommand=help_scrollbar.set)
     
     def update_status(self, message):
-        self.status_label.config(text=message)
-        self.log_text.insert(tk.END, f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - {message}\n")
-        self.log_text.see(tk.END)
-        self.root.update()
+        # 可在处理线程中调用，界面由消息通道定时刷新
+        self.ui.log(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - {message}")
+        self.ui.status(message)
     
     def select_files(self):
         filetypes = (
@@ -219,145 +228,16 @@ class App:
         self.update_status("正在停止处理...")
         self.stop_btn.config(state="disabled")
     
-    def is_valid_pdf(self, pdf_path):
-        """使用PyMuPDF检查PDF文件是否有效"""
-        try:
-            doc = fitz.open(pdf_path)
-            page_count = doc.page_count
-            doc.close()
-            return page_count > 0
-        except Exception as e:
-            logging.error(f"PDF验证失败 {pdf_path}: {str(e)}")
-            return False
-    
-    def repair_pdf(self, pdf_path, output_path):
-        """尝试修复PDF文件"""
-        try:
-            doc = fitz.open(pdf_path)
-            doc.save(output_path, clean=True, deflate=True)
-            doc.close()
-            return True
-        except Exception as e:
-            logging.error(f"PDF修复失败 {pdf_path}: {str(e)}")
-            return False
-    
-    def convert_pdf_page_to_image(self, pdf_path, page_number, output_path):
-        """使用PyMuPDF将单个PDF页面转换为图片"""
-        try:
-            doc = fitz.open(pdf_path)
-            page = doc[page_number]
-            
-            # 设置更高的分辨率
-            zoom = 2  # 增加清晰度
-            mat = fitz.Matrix(zoom, zoom)
-            pix = page.get_pixmap(matrix=mat)
-            pix.save(output_path)
-            
-            doc.close()
-            return True
-        except Exception as e:
-            logging.error(f"PDF页面转换失败 {pdf_path} 第{page_number}页: {str(e)}")
-            return False
-    
-    def convert_pdf_to_images(self, pdf_path, temp_dir):
-        """使用PyMuPDF转换PDF为图片"""
-        try:
-            if not self.is_valid_pdf(pdf_path):
-                # 尝试修复PDF
-                temp_pdf = os.path.join(temp_dir, "repaired.pdf")
-                if not self.repair_pdf(pdf_path, temp_pdf):
-                    raise ValueError(f"无法修复PDF文件: {pdf_path}")
-                pdf_path = temp_pdf
-            
-            doc = fitz.open(pdf_path)
-            image_paths = []
-            
-            for page_num in range(doc.page_count):
-                if self.stop_flag:
-                    doc.close()
-                    return []
-                
-                self.update_status(f"正在转换PDF第 {page_num + 1}/{doc.page_count} 页")
-                
-                # 使用临时文件
-                output_path = os.path.join(temp_dir, f"page_{page_num + 1}.png")
-                
-                if self.convert_pdf_page_to_image(pdf_path, page_num, output_path):
-                    image_paths.append(output_path)
-                
-                # 强制清理内存
-                import gc
-                gc.collect()
-            
-            doc.close()
-            return image_paths
-            
-        except Exception as e:
-            logging.error(f"PDF转换失败 {pdf_path}: {str(e)}")
-            logging.error(traceback.format_exc())
-            raise
-    
-    def initialize_ocr(self):
-        if self.ocr is None:
-            self.update_status("初始化OCR引擎...")
-            self.ocr = PaddleOCR(use_angle_cls=True, lang="ch", show_log=False)
-    
-    def perform_ocr(self, image_path):
-        try:
-            self.update_status(f"正在OCR识别: {os.path.basename(image_path)}")
-            result = self.ocr.ocr(image_path, cls=True)
-            if result[0]:
-                text = "\n".join([line[1][0] for line in result[0]])
-                return text
-            return ""
-        except Exception as e:
-            logging.error(f"OCR识别失败 {image_path}: {str(e)}")
-            logging.error(traceback.format_exc())
-            return ""
+    def update_progress(self, done, total):
+        self.ui.progress(done, total)
     
-    def merge_pdfs(self, pdf_paths, output_path):
-        """使用PyMuPDF合并PDF文件"""
-        try:
-            doc_output = fitz.open()
-            
-            for pdf_path in pdf_paths:
-                if self.is_valid_pdf(pdf_path):
-                    doc_input = fitz.open(pdf_path)
-                    doc_output.insert_pdf(doc_input)
-                    doc_input.close()
-                else:
-                    logging.warning(f"跳过无效的PDF文件: {pdf_path}")
-            
-            doc_output.save(output_path, clean=True, deflate=True)
-            doc_output.close()
-            
-        except Exception as e:
-            logging.error(f"PDF合并失败: {str(e)}")
-            logging.error(traceback.format_exc())
-            raise
+    def show_progress(self, done, total):
+        self.progress["maximum"] = max(total, 1)
+        self.progress["value"] = done
     
-    def convert_image_to_pdf(self, image_path, output_path):
-        try:
-            # 检查图片是否存在且可访问
-            if not os.path.exists(image_path):
-                raise FileNotFoundError(f"图片文件不存在: {image_path}")
-            
-            # 尝试打开图片以验证其有效性
-            with Image.open(image_path) as img:
-                img.verify()
-            
-            # 使用PyMuPDF转换图片为PDF
-            doc = fitz.open()
-            img_rect = fitz.Rect(0, 0, 595, 842)  # A4大小
-            page = doc.new_page(width=595, height=842)
-            page.insert_image(img_rect, filename=image_path)
-            doc.save(output_path, clean=True, deflate=True)
-            doc.close()
-            
-        except Exception as e:
-            logging.error(f"图片转PDF失败 {image_path}: {str(e)}")
-            logging.error(traceback.format_exc())
-            raise
+    def warn_file_error(self, file_name, error):
+        self.ui.call(messagebox.showwarning, "警告",
+                     f"处理文件 {file_name} 时出现错误: {str(error)}\n程序将继续处理其他文件")
     
     def process_files(self):
         if not self.selected_files:
@@ -377,115 +257,37 @@ class App:
         self.process_btn.config(state='disabled')
         self.stop_btn.config(state='normal')
         
-        # 使用临时目录
-        temp_dir = tempfile.mkdtemp()
+        # 在新线程中处理，界面保持响应
+        thread = threading.Thread(target=self.run_processing)
+        thread.daemon = True
+        thread.start()
+    
+    def run_processing(self):
         try:
-            # 初始化OCR
-            self.initialize_ocr()
-            
-            # 存储处理后的文件信息
-            processed_files = {}
-            
-            # 设置进度条
-            total_files = len(self.selected_files)
-            self.progress["maximum"] = total_files
-            self.progress["value"] = 0
-            
-            # 处理每个文件
-            for index, file_path in enumerate(self.selected_files, 1):
-                if self.stop_flag:
-                    self.update_status("处理已停止")
-                    break
-                
-                try:
-                    file_name = os.path.basename(file_path)
-                    file_ext = os.path.splitext(file_name)[1].lower()
-                    
-                    self.update_status(f"处理文件 ({index}/{total_files}): {file_name}")
-                    
-                    # 如果是PDF，先转换为图片
-                    if file_ext == '.pdf':
-                        image_paths = self.convert_pdf_to_images(file_path, temp_dir)
-                        if not image_paths:  # 如果转换被中断
-                            continue
-                    else:
-                        image_paths = [file_path]
-                    
-                    # 对每个图片进行OCR
-                    for img_path in image_paths:
-                        if self.stop_flag:
-                            break
-                        
-                        text = self.perform_ocr(img_path)
-                        
-                        # 使用正则表达式匹配
-                        matches = re.findall(r'\w{5}[-_—]\d{6}', text)
-                        if matches:
-                            new_name = matches[0]
-                            
-                            # 如果已经存在同名文件，合并为PDF
-                            if new_name in processed_files:
-                                if file_ext == '.pdf':
-                                    merged_path = os.path.join(self.export_folder, f"{new_name}.pdf")
-                                    self.merge_pdfs([processed_files[new_name], file_path], merged_path)
-                                    processed_files[new_name] = merged_path
-                                else:
-                                    # 如果是图片，转换为PDF后合并
-                                    temp_pdf = os.path.join(temp_dir, f"{new_name}_temp.pdf")
-                                    self.convert_image_to_pdf(img_path, temp_pdf)
-                                    merged_path = os.path.join(self.export_folder, f"{new_name}.pdf")
-                                    self.merge_pdfs([processed_files[new_name], temp_pdf], merged_path)
-                                    processed_files[new_name] = merged_path
-                            else:
-                                # 如果是新文件
-                                output_path = os.path.join(self.export_folder, f"{new_name}.pdf")
-                                if file_ext == '.pdf':
-                                    # 使用PyMuPDF复制PDF
-                                    doc = fitz.open(file_path)
-                                    doc.save(output_path, clean=True, deflate=True)
-                                    doc.close()
-                                else:
-                                    self.convert_image_to_pdf(img_path, output_path)
-                                processed_files[new_name] = output_path
-                    
-                    # 更新进度条
-                    self.progress["value"] = index
-                    self.root.update()
-                    
-                    # 强制垃圾回收
-                    if index % 5 == 0:  # 每处理5个文件
-                        import gc
-                        gc.collect()
-                
-                except Exception as e:
-                    logging.error(f"处理文件失败 {file_path}: {str(e)}")
-                    logging.error(traceback.format_exc())
-                    messagebox.showwarning("警告", f"处理文件 {file_name} 时出现错误: {str(e)}\n程序将继续处理其他文件")
+            self.processor.process(self.selected_files, self.export_folder)
             
             if not self.stop_flag:
                 self.update_status("处理完成！")
-                messagebox.showinfo("成功", "文件处理完成！")
+                self.ui.call(messagebox.showinfo, "成功", "文件处理完成！")
             
         except Exception as e:
             logging.error(f"处理过程中出现错误: {str(e)}")
             logging.error(traceback.format_exc())
-            messagebox.showerror("错误", f"处理过程中出现错误：{str(e)}")
+            self.ui.call(messagebox.showerror, "错误", f"处理过程中出现错误：{str(e)}")
         
         finally:
-            # 清理临时文件
-            try:
-                shutil.rmtree(temp_dir)
-            except Exception as e:
-                logging.error(f"清理临时文件失败: {str(e)}")
-            
-            # 重新启用按钮
-            self.select_files_btn.config(state='normal')
-            self.select_folder_btn.config(state='normal')
-            self.process_btn.config(state='normal')
-            self.stop_btn.config(state='disabled')
-            
-            # 重置停止标志
-            self.stop_flag = False
+            # 在界面线程中重新启用按钮
+            self.ui.call(self.finish_processing)
+    
+    def finish_processing(self):
+        # 重新启用按钮
+        self.select_files_btn.config(state='normal')
+        self.select_folder_btn.config(state='normal')
+        self.process_btn.config(state='normal')
+        self.stop_btn.config(state='disabled')
+        
+        # 重置停止标志
+        self.stop_flag = False
 
 if __name__ == "__main__":
     # 设置更大的递归限制
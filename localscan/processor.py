@@ -0,0 +1,466 @@
+"""文件批处理引擎
+
+不依赖界面：逐页OCR识别PDF和图片，按匹配到的编号把页面合并输出为PDF。
+图形界面（main.py）和命令行（cli.py）都只是它的前端，通过回调接收进度。
+"""
+import os
+import gc
+import sys
+import logging
+import shutil
+import time
+import tempfile
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image
+Image.MAX_IMAGE_PIXELS = None  # 禁用图片大小限制
+
+# 与ScanReport共用的模块
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "ScanReport"))
+from ocr_cache import OcrCache
+from ocr_server import connect_ocr_server, OCR_OPTIONS
+from orientation import recognize_pages
+from render import DETECT_DPI, RECOGNIZE_DPI, ClipRenderer, render_page, close_document, text_layer
+from instrument import RunStats, CountingOCR
+from report_numbers import load_matcher
+
+# 每批一起识别的页数，多页的文本行合并成批交给识别模型
+BATCH_PAGES = 4
+
+# 支持的输入文件扩展名
+SUPPORTED_EXTENSIONS = ('.pdf', '.png', '.jpg', '.jpeg')
+
+
+class BatchProcessor:
+    """批量识别并合并文件
+
+    log(message) 接收状态信息，progress(已处理文件数, 文件总数) 接收进度，
+    warn(file_name, error) 在单个文件处理失败时调用（随后继续处理其他文件），
+    should_stop() 返回 True 时尽快停止。OCR模型和识别缓存在多次处理之间复用。
+    """
+
+    def __init__(self, log=None, progress=None, warn=None, should_stop=None):
+        self.log = log or (lambda message: None)
+        self.progress = progress or (lambda done, total: None)
+        self.warn = warn or (lambda file_name, error: None)
+        self.should_stop = should_stop or (lambda: False)
+
+        # 初始化OCR
+        self.ocr = None
+        self.ocr_cache = None
+
+        # 设置PDF处理参数：整页只以低分辨率渲染用于检测，识别时按 pdf_dpi 只渲染文本行区域
+        self.detect_dpi = DETECT_DPI  # 检测用整页渲染分辨率
+        self.pdf_dpi = RECOGNIZE_DPI  # 识别用文本行渲染分辨率
+        self.max_retries = 3  # 最大重试次数
+        self.render_threads = 1  # PDF页面渲染线程数
+        self.batch_pages = BATCH_PAGES  # 每批一起识别的页数
+        self.use_text_layer = True  # PDF页面带文本层时直接使用，不渲染也不OCR
+        self.use_cache = True  # 使用OCR结果缓存
+        self.profile = None  # 性能分析模式（见 instrument.py）
+
+        # 最近一次 process() 的各阶段耗时和计数器
+        self.stats = RunStats()
+
+        # 报告编号匹配器（每次 process() 时按注册表重新创建，见 report_numbers.py）
+        self.matcher = load_matcher()
+
+    def open_pdf(self, pdf_path, temp_dir):
+        """使用PyMuPDF打开并验证PDF，无效时尝试修复，返回已打开的文档"""
+        try:
+            doc = fitz.open(pdf_path)
+            if doc.page_count > 0:
+                return doc
+            doc.close()
+        except Exception as e:
+            logging.error(f"PDF验证失败 {pdf_path}: {str(e)}")
+
+        # 尝试修复PDF
+        temp_pdf = os.path.join(temp_dir, "repaired.pdf")
+        if not self.repair_pdf(pdf_path, temp_pdf):
+            raise ValueError(f"无法修复PDF文件: {pdf_path}")
+        return fitz.open(temp_pdf)
+
+    def repair_pdf(self, pdf_path, output_path):
+        """尝试修复PDF文件"""
+        try:
+            doc = fitz.open(pdf_path)
+            doc.save(output_path, clean=True, deflate=True)
+            doc.close()
+            return True
+        except Exception as e:
+            logging.error(f"PDF修复失败 {pdf_path}: {str(e)}")
+            return False
+
+    def pixmap_to_array(self, pix):
+        """将PyMuPDF渲染结果转换为PaddleOCR使用的BGR数组，不经过临时文件"""
+        samples = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+        return np.ascontiguousarray(samples[:, :, 2::-1])
+
+    def render_pdf_page(self, doc, page_num):
+        """以检测分辨率渲染单个PDF页面"""
+        pix = render_page(doc[page_num], self.detect_dpi)
+        return self.pixmap_to_array(pix)
+
+    def clip_renderer(self, doc, page_num, image):
+        """为已渲染的页面创建文本行渲染器，识别时按 pdf_dpi 从PDF中只渲染文本行区域"""
+        height, width = image.shape[:2]
+        return ClipRenderer(doc.name, page_num, (width, height), self.detect_dpi, self.pdf_dpi)
+
+    def read_text_layers(self, doc):
+        """返回各页可直接使用的PDF文本层 {页码: 文本}"""
+        if not self.use_text_layer:
+            return {}
+        texts = {}
+        for page_num in range(doc.page_count):
+            text = text_layer(doc[page_num])
+            if text is not None:
+                texts[page_num] = text
+        return texts
+
+    def iter_pdf_pages(self, doc, skip=(), file_name=None):
+        """从已打开的文档逐页渲染，依次返回 (页码, 图像数组)
+
+        render_threads 大于1时由多个线程并行渲染，每个线程使用自己的文档句柄。
+        skip 中的页码不渲染，图像为 None。file_name 为记录渲染耗时使用的文件名（默认为文档的文件名）。
+        """
+        total = doc.page_count
+        file_name = file_name or os.path.basename(doc.name)
+        threads = max(1, self.render_threads)
+
+        if threads == 1:
+            for page_num in range(total):
+                if self.should_stop():
+                    return
+                if page_num in skip:
+                    yield page_num, None
+                    continue
+                self.log(f"正在转换PDF第 {page_num + 1}/{total} 页")
+                start = time.perf_counter()
+                try:
+                    image = self.render_pdf_page(doc, page_num)
+                except Exception as e:
+                    logging.error(f"PDF页面转换失败 {doc.name} 第{page_num}页: {str(e)}")
+                    continue
+                self.stats.add("rasterize", time.perf_counter() - start, f"{file_name} 第{page_num + 1}页")
+                yield page_num, image
+            return
+
+        # PyMuPDF文档对象不能跨线程共享，每个渲染线程打开一次自己的句柄
+        local = threading.local()
+        handles = []
+
+        def render(page_num):
+            handle = getattr(local, "doc", None)
+            if handle is None:
+                handle = local.doc = fitz.open(doc.name)
+                handles.append(handle)
+            return self.render_pdf_page(handle, page_num)
+
+        executor = ThreadPoolExecutor(max_workers=threads)
+        pending = deque()
+        try:
+            next_page = 0
+            while next_page < total or pending:
+                # 最多提前渲染 threads*2 页
+                while next_page < total and len(pending) < threads * 2:
+                    future = None if next_page in skip else executor.submit(render, next_page)
+                    pending.append((next_page, future))
+                    next_page += 1
+
+                page_num, future = pending.popleft()
+                if self.should_stop():
+                    return
+                if future is None:
+                    yield page_num, None
+                    continue
+                self.log(f"正在转换PDF第 {page_num + 1}/{total} 页")
+                # 多线程渲染时记录的是等待渲染结果的时间
+                start = time.perf_counter()
+                try:
+                    image = future.result()
+                except Exception as e:
+                    logging.error(f"PDF页面转换失败 {doc.name} 第{page_num}页: {str(e)}")
+                    continue
+                self.stats.add("rasterize", time.perf_counter() - start, f"{file_name} 第{page_num + 1}页")
+                yield page_num, image
+        finally:
+            for _, future in pending:
+                if future is not None:
+                    future.cancel()
+            executor.shutdown(wait=True)
+            for handle in handles:
+                handle.close()
+
+    def initialize_ocr(self):
+        if self.ocr is None:
+            self.log("初始化OCR引擎...")
+            # 本机OCR服务正在运行时直接使用，不再加载模型
+            self.ocr = connect_ocr_server(OCR_OPTIONS)
+            if self.ocr is not None:
+                self.log(f"使用本机OCR服务: {self.ocr.address[0]}:{self.ocr.address[1]}")
+            else:
+                from paddleocr import PaddleOCR
+                self.ocr = PaddleOCR(**OCR_OPTIONS)
+        if self.ocr_cache is None and self.use_cache:
+            try:
+                self.ocr_cache = OcrCache(settings=OCR_OPTIONS)
+            except Exception as e:
+                logging.error(f"无法打开OCR缓存: {str(e)}")
+
+    def close(self):
+        """释放识别缓存"""
+        if self.ocr_cache is not None:
+            self.ocr_cache.close()
+            self.ocr_cache = None
+
+    def ocr_cache_key(self, image):
+        """图像数组按像素计算缓存键，图片文件按文件内容计算"""
+        if isinstance(image, np.ndarray):
+            return self.ocr_cache.key(np.ascontiguousarray(image), image.shape)
+        with open(image, 'rb') as f:
+            return self.ocr_cache.key(f.read(), "file")
+
+    def perform_ocr_batch(self, images, names, renderers=None):
+        """一起识别多页（图片路径或图像数组），返回各页文本
+
+        已识别过的页面直接使用缓存结果，其余页面的文本行合并成批识别。
+        renderers 与 images 一一对应，PDF页面的文本行由 ClipRenderer 按识别分辨率重新渲染。
+        """
+        texts = [""] * len(images)
+        keys = [None] * len(images)
+        todo = []
+        for index, (image, name) in enumerate(zip(images, names)):
+            try:
+                if self.ocr_cache is not None:
+                    keys[index] = self.ocr_cache_key(image)
+                    hit = self.ocr_cache.get(keys[index])
+                    if hit is not None:
+                        self.log(f"使用OCR缓存: {name}")
+                        self.stats.count("cache_hits")
+                        texts[index] = "\n".join([line[1][0] for line in hit[1]])
+                        continue
+            except Exception as e:
+                logging.error(f"读取OCR缓存失败 {name}: {str(e)}")
+            todo.append(index)
+        if not todo:
+            return texts
+
+        try:
+            self.log(f"正在OCR识别: {', '.join(names[index] for index in todo)}")
+            pages = [images[index] if isinstance(images[index], np.ndarray)
+                     else Image.open(images[index]).convert('RGB') for index in todo]
+            ocr = CountingOCR(self.ocr)
+            try:
+                results = recognize_pages(ocr, pages, cls=True,
+                                          renderers=[renderers[index] for index in todo] if renderers else None)
+            finally:
+                self.stats.count("ocr_calls", ocr.calls)
+                self.stats.count("ocr_batches")
+            for index, lines in zip(todo, results):
+                if keys[index] is not None:
+                    self.ocr_cache.put(keys[index], 0, lines)
+                texts[index] = "\n".join([line[1][0] for line in lines])
+        except Exception as e:
+            logging.error(f"OCR识别失败 {', '.join(names[index] for index in todo)}: {str(e)}")
+            logging.error(traceback.format_exc())
+        return texts
+
+    def iter_batches(self, image_pages):
+        """把 (页码, 图像) 序列按 batch_pages 分批"""
+        batch = []
+        for item in image_pages:
+            batch.append(item)
+            if len(batch) >= self.batch_pages:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def insert_image_page(self, doc, image_path):
+        """将图片作为A4页面追加到已打开的PDF文档"""
+        try:
+            # 检查图片是否存在且可访问
+            if not os.path.exists(image_path):
+                raise FileNotFoundError(f"图片文件不存在: {image_path}")
+
+            # 尝试打开图片以验证其有效性
+            with Image.open(image_path) as img:
+                img.verify()
+
+            img_rect = fitz.Rect(0, 0, 595, 842)  # A4大小
+            page = doc.new_page(width=595, height=842)
+            page.insert_image(img_rect, filename=image_path)
+
+        except Exception as e:
+            logging.error(f"图片转PDF失败 {image_path}: {str(e)}")
+            logging.error(traceback.format_exc())
+            raise
+
+    def get_output_doc(self, outputs, new_name):
+        """取得报告编号对应的输出文档，第一次出现时新建"""
+        if new_name not in outputs:
+            outputs[new_name] = fitz.open()
+        return outputs[new_name]
+
+    def save_outputs(self, outputs, export_folder):
+        """批次结束时将每个报告编号的输出文档各写入一次，返回 {新名称: 页数}"""
+        start = time.perf_counter()
+        saved = {}
+        for new_name in list(outputs):
+            doc_output = outputs.pop(new_name)
+            try:
+                if doc_output.page_count > 0:
+                    output_path = os.path.join(export_folder, f"{new_name}.pdf")
+                    doc_output.save(output_path, clean=True, deflate=True)
+                    saved[new_name] = doc_output.page_count
+                    self.log(f"生成PDF: {new_name}.pdf ({doc_output.page_count} 页)")
+            except Exception as e:
+                logging.error(f"保存PDF失败 {new_name}: {str(e)}")
+                logging.error(traceback.format_exc())
+            finally:
+                doc_output.close()
+        self.stats.add("save", time.perf_counter() - start)
+        return saved
+
+    def process(self, files, export_folder):
+        """处理一批文件，返回 {新名称: 页数}
+
+        单个文件出错时调用 warn 并继续处理其他文件；被停止时只保存已处理的页面。
+        各阶段的耗时和计数器记录在 self.stats 中，结束时在导出文件夹中写入运行报告（见 instrument.py）。
+        """
+        self.matcher = load_matcher()
+        self.stats = RunStats(self.profile)
+        self.stats.start_profiling()
+        try:
+            return self.stats.profiled(self.process_batch)(list(files), export_folder)
+        finally:
+            try:
+                self.log(f"运行报告: {self.stats.write_report(export_folder)}")
+            except OSError as e:
+                logging.error(f"保存运行报告失败: {str(e)}")
+
+    def process_batch(self, files, export_folder):
+        """process() 的处理过程"""
+        stats = self.stats
+
+        # 使用临时目录
+        temp_dir = tempfile.mkdtemp()
+
+        # 每个报告编号一个输出文档，只追加匹配的页面，批次结束时统一写入 {新名称: fitz.Document}
+        outputs = {}
+        try:
+            # 初始化OCR
+            self.initialize_ocr()
+
+            total_files = len(files)
+            self.progress(0, total_files)
+
+            # 处理每个文件
+            for index, file_path in enumerate(files, 1):
+                if self.should_stop():
+                    self.log("处理已停止")
+                    break
+
+                try:
+                    file_name = os.path.basename(file_path)
+                    file_ext = os.path.splitext(file_name)[1].lower()
+
+                    self.log(f"处理文件 ({index}/{total_files}): {file_name}")
+
+                    # 如果是PDF，只打开一次，逐页渲染后直接交给OCR
+                    source_doc = None
+                    text_pages = {}
+                    if file_ext == '.pdf':
+                        source_doc = self.open_pdf(file_path, temp_dir)
+                        # 带文本层的页面（数字生成的报告）直接用文本匹配，不渲染也不OCR
+                        text_pages = self.read_text_layers(source_doc)
+                        if text_pages:
+                            self.log(f"{len(text_pages)} 页直接使用PDF文本层")
+                        stats.count("text_layer_pages", len(text_pages))
+                        image_pages = self.iter_pdf_pages(source_doc, skip=text_pages, file_name=file_name)
+                    else:
+                        image_pages = [(0, file_path)]
+
+                    try:
+                        # 当前文件中最近一次匹配到的报告编号，后续未匹配的页面视为该报告的续页；
+                        # 文件开头未匹配到编号的页面按源文件名输出（与 ScanReport 的"其他"相同）
+                        current_name = None
+
+                        # 每凑满一批页面一起OCR，再按页序依次匹配
+                        for batch in self.iter_batches(image_pages):
+                            if self.should_stop():
+                                break
+
+                            ocr_pages = [(page_num, image) for page_num, image in batch if image is not None]
+                            ocr_names = [f"{file_name} 第{page_num + 1}页" for page_num, _ in ocr_pages]
+                            start = time.perf_counter()
+                            ocr_texts = self.perform_ocr_batch(
+                                [image for _, image in ocr_pages],
+                                ocr_names,
+                                [self.clip_renderer(source_doc, page_num, image) for page_num, image in ocr_pages]
+                                if source_doc is not None else None,
+                            ) if ocr_pages else []
+                            # 一批页面一起识别，耗时按页平均分摊
+                            elapsed = time.perf_counter() - start
+                            for name in ocr_names:
+                                stats.add("ocr", elapsed / len(ocr_names), name)
+                            ocr_texts = dict(zip([page_num for page_num, _ in ocr_pages], ocr_texts))
+                            texts = [text_pages[page_num] if page_num in text_pages else ocr_texts[page_num]
+                                     for page_num, _ in batch]
+
+                            for (page_num, _), text in zip(batch, texts):
+                                page_name = f"{file_name} 第{page_num + 1}页"
+                                stats.count("pages")
+                                # 所有报告编号格式一次扫描，取最佳匹配
+                                with stats.span("match", page_name):
+                                    match = self.matcher.search(text)
+                                if match is not None:
+                                    current_name = match.value
+                                elif current_name is None:
+                                    current_name = os.path.splitext(file_name)[0]
+                                    self.log(f"{page_name} 未识别到报告编号，"
+                                             f"在第一个报告编号之前的页面按源文件名输出: {current_name}.pdf")
+
+                                # 只把当前页追加到对应报告的输出文档
+                                with stats.span("assemble", page_name):
+                                    doc_output = self.get_output_doc(outputs, current_name)
+                                    if source_doc is not None:
+                                        doc_output.insert_pdf(source_doc, from_page=page_num, to_page=page_num)
+                                    else:
+                                        self.insert_image_page(doc_output, file_path)
+                    finally:
+                        if source_doc is not None:
+                            close_document(source_doc.name)
+                            source_doc.close()
+
+                    # 更新进度
+                    self.progress(index, total_files)
+
+                    # 强制垃圾回收
+                    if index % 5 == 0:  # 每处理5个文件
+                        gc.collect()
+
+                except Exception as e:
+                    logging.error(f"处理文件失败 {file_path}: {str(e)}")
+                    logging.error(traceback.format_exc())
+                    self.warn(file_name, e)
+
+            # 每个输出文件只写入一次
+            return self.save_outputs(outputs, export_folder)
+
+        finally:
+            # 关闭未写入的输出文档
+            for doc_output in outputs.values():
+                doc_output.close()
+
+            # 清理临时文件
+            try:
+                shutil.rmtree(temp_dir)
+            except Exception as e:
+                logging.error(f"清理临时文件失败: {str(e)}")